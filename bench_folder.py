@@ -0,0 +1,203 @@
+"""
+Memory benchmark for large Pixeldrain folders.
+
+Serves a synthetic list of N files from fake_servers.FakePixeldrain and,
+in a fresh interpreter per run, downloads its last episode with
+PixeldrainDownloader in folder mode. Reports wall time, peak RSS growth
+over the interpreter's baseline (modules already imported) and the
+tracemalloc peak of the parse. `--mode legacy` runs the previous parse
+(whole page as text, BeautifulSoup DOM, decoded viewer_data, one dict per
+file) for comparison.
+
+Usage:
+    python bench_folder.py                              # 10000 files, stream and legacy
+    python bench_folder.py --files 1000,10000,50000 --mode stream --json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+
+MODES = ["stream", "legacy"]
+FILE_SIZE = 1024
+
+
+def _legacy_download(dl, base_url, list_id, path, episode, discord_regex):
+    """The folder parse as it was before streaming, kept here as the baseline."""
+    import requests
+    from bs4 import BeautifulSoup
+    import re
+
+    response = requests.get(f"{base_url}/l/{list_id}", timeout=30)
+    response.raise_for_status()
+    soup = BeautifulSoup(response.text, 'html.parser')
+    script_tag = soup.find('script', string=re.compile(r'window\.viewer_data'))
+    match = re.search(r'window\.viewer_data\s*=\s*({.*?});', script_tag.string, re.DOTALL)
+    viewer_data = json.loads(match.group(1))
+    files = viewer_data.get('api_response', {}).get('files', [])
+
+    downloader = dl.PixeldrainDownloader(base_url=base_url)
+    files_with_episodes = []
+    for file_data in files:
+        filename = file_data.get('name', '')
+        upload_date = file_data.get('date_upload', '')
+        if dl.is_file_too_old(upload_date, dl.FOLDER_FILE_MAX_AGE_DAYS):
+            continue
+        ep_num = downloader._extract_episode_from_filename(filename, None, discord_regex)
+        if ep_num is not None:
+            files_with_episodes.append({'file_data': file_data, 'episode': ep_num,
+                                        'filename': filename, 'upload_date': upload_date})
+    files_with_episodes.sort(key=lambda x: x['episode'])
+    matched = next(f for f in files_with_episodes if f['episode'] == episode)
+    return downloader._download_file_by_id(matched['file_data']['id'], matched['filename'], path,
+                                           matched['file_data'].get('size'))
+
+
+def _rss_peak():
+    """
+    Peak RSS of this process in bytes since the last _reset_rss_peak().
+    ru_maxrss is a fallback only: on Linux it includes the parent's peak
+    from before exec, here the fake server holding the whole folder.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # bytes on macOS, KiB elsewhere
+
+
+def _rss_now():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return _rss_peak()
+
+
+def _reset_rss_peak():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")  # reset VmHWM to the current RSS
+    except OSError:
+        pass
+
+
+def child(args):
+    """One measured run: print a JSON line with seconds, RSS growth and tracemalloc peak."""
+    import tracemalloc
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import downloader as dl
+    import requests  # noqa: F401  (baseline includes the HTTP stack and bs4 for both modes)
+    import bs4  # noqa: F401
+
+    def run():
+        if args.mode == "legacy":
+            return _legacy_download(dl, args.url, args.list_id, args.dir, args.episode, r"Series - (\d+)")
+        downloader = dl.PixeldrainDownloader(base_url=args.url)
+        return downloader.download(f"{args.url}/l/{args.list_id}", args.dir, "Series", args.episode,
+                                   share_type="folder", discord_regex=r"Series - (\d+)")
+
+    if args.trace:
+        tracemalloc.start()
+        result = run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(json.dumps({"success": result.success, "alloc_peak": peak}))
+        return
+
+    _reset_rss_peak()
+    baseline = _rss_now()
+    started = time.perf_counter()
+    result = run()
+    seconds = time.perf_counter() - started
+    peak = _rss_peak()
+    print(json.dumps({"success": result.success, "seconds": seconds,
+                      "rss_growth": max(0, peak - baseline), "rss_peak": peak}))
+
+
+def _spawn(args, url, list_id, episode, mode, workdir, trace=False):
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", "--url", url, "--list-id", list_id,
+           "--episode", str(episode), "--mode", mode, "--dir", workdir]
+    if trace:
+        cmd.append("--trace")
+    proc = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure memory use of Pixeldrain folder parsing.")
+    parser.add_argument("--files", default="10000", help="Comma separated folder sizes")
+    parser.add_argument("--mode", default=",".join(MODES), help=f"Comma separated subset of {MODES}")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    # Internal: one measured run in a fresh interpreter
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--trace", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    parser.add_argument("--list-id", help=argparse.SUPPRESS)
+    parser.add_argument("--episode", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        return child(args)
+
+    from fake_servers import FakePixeldrain
+
+    sizes = [int(s) for s in args.files.split(",") if s.strip()]
+    modes = [m for m in args.mode.split(",") if m.strip()]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"Unknown modes: {sorted(unknown)}")
+
+    results = []
+    with FakePixeldrain() as server, tempfile.TemporaryDirectory(prefix="autodl-bench-") as workdir:
+        now = datetime.now(timezone.utc)
+        for count in sizes:
+            ids = [server.add_file(f"Series - {i:02d} (1080p).mkv", FILE_SIZE, uploaded=now)
+                   for i in range(1, count + 1)]
+            list_id = server.add_list(ids)
+            for mode in modes:
+                run = _spawn(args, server.url, list_id, count, mode, workdir)
+                traced = _spawn(args, server.url, list_id, count, mode, workdir, trace=True)
+                for name in os.listdir(workdir):
+                    os.remove(os.path.join(workdir, name))
+                results.append({
+                    "mode": mode,
+                    "files": count,
+                    "success": run["success"] and traced["success"],
+                    "seconds": run["seconds"],
+                    "rss_growth_bytes": run["rss_growth"],
+                    "rss_peak_bytes": run["rss_peak"],
+                    "alloc_peak_bytes": traced["alloc_peak"],
+                })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    header = f"{'mode':<8}{'files':>8}{'ok':>5}{'seconds':>10}{'RSS growth MiB':>16}{'RSS peak MiB':>14}" \
+             f"{'alloc peak MiB':>16}"
+    print(header)
+    print("-" * len(header))
+    mib = 1024 * 1024
+    for r in results:
+        print(f"{r['mode']:<8}{r['files']:>8}{'yes' if r['success'] else 'no':>5}{r['seconds']:>10.3f}"
+              f"{r['rss_growth_bytes'] / mib:>16.1f}{r['rss_peak_bytes'] / mib:>14.1f}"
+              f"{r['alloc_peak_bytes'] / mib:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""
+Message-processing benchmark.
+
+Replays a JSONL corpus of Discord message payloads through
+downloader.handle_new_message (or the gateway entry point
+handle_gateway_message with real discum events, or only the matching step, either with one
+MessageProcessor per entry or with the per-channel ChannelMatcher) against
+synthetic configs of increasing size, with stub downloaders so no network
+or disk I/O is involved.
+
+Usage:
+    python bench_messages.py                         # synthetic corpus, 10/100/1000 entries
+    python bench_messages.py --corpus messages.jsonl # replay a recorded corpus
+    python bench_messages.py --write-corpus out.jsonl --messages 20000
+    python bench_messages.py --mode processor --json
+    python bench_messages.py --entries 1000 --entries-per-channel 1,10,30,100 --mode processor,matcher
+    python bench_messages.py --mode gateway-legacy,gateway --foreign-ratio 0.9 --retry-items 50
+
+Each corpus line is a Discord message object as sent by the gateway
+(at least "channel_id" and "content"). Synthetic entries are named
+"Series 0000", "Series 0001", ... with regex "Series 0000 - (\\d+)", and
+entry i listens on channel CHANNEL_BASE + i // entries_per_channel, so a
+recorded corpus can target them the same way.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+CHANNEL_BASE = 900000000000000000
+FOREIGN_CHANNEL_BASE = 800000000000000000
+PLATFORMS = ["pixeldrain", "gdrive", "mega"]
+LABELS = {"pixeldrain": "[1080p]", "gdrive": "[1080p]", "mega": "[1080p]"}
+
+
+# ============================================================================
+# SYNTHETIC CONFIG AND CORPUS
+# ============================================================================
+
+def entry_channel(index, entries_per_channel):
+    return str(CHANNEL_BASE + index // entries_per_channel)
+
+
+def build_config(num_entries, entries_per_channel, retry_items=0):
+    """Build a settings.json-shaped dict with num_entries entries and retry_items items not yet due."""
+    entries = []
+    for i in range(num_entries):
+        entries.append({
+            "channel_id": entry_channel(i, entries_per_channel),
+            "name": f"Series {i:04d}",
+            "regex": rf"Series {i:04d} - (\d+)",
+            "last_episode": 0,
+            "path": "/tmp",
+            "platforms": list(PLATFORMS),
+            "link_labels": dict(LABELS),
+            "share_type": "file",
+        })
+    next_retry = (datetime.now() + timedelta(hours=4)).isoformat()
+    retry_queue = [{
+        "entry_name": f"Series {i % num_entries:04d}",
+        "episode": 1,
+        "platform": "pixeldrain",
+        "link": "https://pixeldrain.com/u/retry",
+        "path": "/tmp",
+        "channel_id": entry_channel(i % num_entries, entries_per_channel),
+        "attempts": 1,
+        "next_retry": next_retry,
+        "reason": "quota_exceeded",
+    } for i in range(retry_items)]
+    return {"bench": {"entries": entries}, "retry_queue": retry_queue}
+
+
+def _release_content(rng, index, episode):
+    name = f"Series {index:04d}"
+    links = [
+        f"[1080p](<https://pixeldrain.com/u/{rng.getrandbits(40):010x}>)",
+        f"[1080p](<https://drive.google.com/file/d/{rng.getrandbits(64):016x}/view>)",
+        f"[1080p](<https://mega.nz/file/{rng.getrandbits(48):012x}#{rng.getrandbits(64):016x}>)",
+    ]
+    rng.shuffle(links)
+    return f"**{name} - {episode:02d} (1080p).mkv** | 1.{rng.randint(0, 9)} GB\n" + "\n".join(links)
+
+
+def _chatter_content(rng):
+    words = ["new", "batch", "tonight", "encode", "fixed", "subs", "v2", "raw", "when", "thanks",
+             "episode", "upload", "queue", "server", "mirror", "1080p", "720p", "HEVC"]
+    text = " ".join(rng.choice(words) for _ in range(rng.randint(3, 25)))
+    if rng.random() < 0.3:
+        text += f" {rng.randint(1, 2000)}"
+    if rng.random() < 0.2:
+        text += f" https://example.com/{rng.getrandbits(32):08x}"
+    return text
+
+
+def generate_corpus(num_messages, num_entries, entries_per_channel, match_ratio, foreign_ratio, seed):
+    """
+    Generate Discord message payloads: release posts for synthetic entries
+    (new episodes and reposts of old ones), chatter in monitored channels and
+    traffic from channels no entry listens on.
+    """
+    rng = random.Random(seed)
+    next_episode = [1] * num_entries
+    num_channels = (num_entries + entries_per_channel - 1) // entries_per_channel
+    timestamp = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    messages = []
+
+    for n in range(num_messages):
+        timestamp += timedelta(seconds=rng.randint(1, 30))
+        roll = rng.random()
+        if roll < foreign_ratio:
+            channel_id = str(FOREIGN_CHANNEL_BASE + rng.randint(0, 5000))
+            content = _chatter_content(rng)
+        elif roll < foreign_ratio + (1 - foreign_ratio) * match_ratio:
+            index = rng.randrange(num_entries)
+            channel_id = entry_channel(index, entries_per_channel)
+            if next_episode[index] > 1 and rng.random() < 0.3:
+                episode = rng.randint(1, next_episode[index] - 1)  # repost
+            else:
+                episode = next_episode[index]
+                next_episode[index] += 1
+            content = _release_content(rng, index, episode)
+        else:
+            channel_id = str(CHANNEL_BASE + rng.randrange(num_channels))
+            content = _chatter_content(rng)
+
+        messages.append({
+            "id": str(1300000000000000000 + n),
+            "type": 0,
+            "channel_id": channel_id,
+            "guild_id": str(700000000000000000 + int(channel_id) % 7),
+            "author": {"id": str(600000000000000000 + rng.randint(0, 50)), "username": "uploader"},
+            "content": content,
+            "timestamp": timestamp.isoformat(),
+        })
+    return messages
+
+
+def load_corpus(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_corpus(path, messages):
+    with open(path, "w", encoding="utf-8") as f:
+        for msg in messages:
+            f.write(json.dumps(msg, ensure_ascii=False) + "\n")
+
+
+# ============================================================================
+# STUBS
+# ============================================================================
+
+class StubDownloader:
+    """Stands in for a platform downloader: succeeds instantly, no I/O."""
+
+    def __init__(self, platform, DownloadResult):
+        self.platform = platform
+        self.DownloadResult = DownloadResult
+        self.calls = 0
+
+    def download(self, link, path, entry_name, episode, **kwargs):
+        self.calls += 1
+        return self.DownloadResult(success=True, filename=f"{entry_name}_EP{episode:02d}.mkv")
+
+
+# ============================================================================
+# RUNNERS
+# ============================================================================
+
+def _processor_step(dl):
+    """Only the matching work: MessageProcessor per entry of the channel."""
+    def step(message):
+        content = message.get("content", "")
+        channel_id = message["channel_id"]
+        for section, data in dl.config.items():
+            if section == "retry_queue" or "entries" not in data:
+                continue
+            for entry in data["entries"]:
+                if entry["channel_id"] != channel_id:
+                    continue
+                processor = dl.MessageProcessor(entry)
+                if processor.extract_episode(content):
+                    processor.find_platform_links(content)
+    return step
+
+
+def _matcher_step(dl):
+    """Only the matching work: one ChannelMatcher pass, links scanned once."""
+    def step(message):
+        content = message.get("content", "")
+        matcher = dl.channel_matcher(message["channel_id"])
+        if matcher is None:
+            return
+        scan = dl.MessageScan(content)
+        for entry, _ in matcher.match(content):
+            dl.get_processor(entry).find_platform_links(content, scan)
+    return step
+
+
+def _gateway_step(dl):
+    """The gateway path: raw MESSAGE_CREATE event, channel check, discum parse, handler."""
+    from discum.gateway.response import Resp
+
+    def step(message):
+        dl.handle_gateway_message(Resp({"op": 0, "s": 1, "t": "MESSAGE_CREATE", "d": message}))
+    return step
+
+
+def _gateway_legacy_step(dl):
+    """The gateway path as it was: parse every event, check the retry queue, then match."""
+    from discum.gateway.response import Resp
+
+    def step(message):
+        resp = Resp({"op": 0, "s": 1, "t": "MESSAGE_CREATE", "d": message})
+        msg = resp.parsed.auto()
+        dl.process_retry_queue()
+        dl.handle_new_message(msg)
+    return step
+
+
+STEPS = {
+    "handler": lambda dl: dl.handle_new_message,
+    "gateway": _gateway_step,
+    "gateway-legacy": _gateway_legacy_step,
+    "processor": _processor_step,
+    "matcher": _matcher_step,
+}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0
+    k = min(len(sorted_values) - 1, max(0, round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def run_one(dl, corpus, num_entries, entries_per_channel, mode, retry_items=0):
+    """Replay corpus against a fresh config of num_entries entries."""
+    stubs = {p: StubDownloader(p, dl.DownloadResult) for p in PLATFORMS}
+    dl._downloaders.clear()
+    dl._downloaders.update(stubs)
+
+    step = STEPS[mode](dl)
+
+    # Timing pass
+    dl.config = build_config(num_entries, entries_per_channel, retry_items)
+    latencies = []
+    started = time.perf_counter()
+    for message in corpus:
+        t0 = time.perf_counter_ns()
+        step(message)
+        latencies.append(time.perf_counter_ns() - t0)
+    elapsed = time.perf_counter() - started
+    downloads = sum(s.calls for s in stubs.values())
+
+    # Allocation pass (separate, tracemalloc distorts timings)
+    dl.config = build_config(num_entries, entries_per_channel, retry_items)
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    peak_deltas = 0
+    for message in corpus:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        step(message)
+        _, peak = tracemalloc.get_traced_memory()
+        peak_deltas += peak - before
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "entries": num_entries,
+        "entries_per_channel": entries_per_channel,
+        "channels": (num_entries + entries_per_channel - 1) // entries_per_channel,
+        "messages": len(corpus),
+        "msgs_per_sec": len(corpus) / elapsed if elapsed else 0.0,
+        "p50_us": percentile(latencies, 50) / 1000,
+        "p99_us": percentile(latencies, 99) / 1000,
+        "alloc_peak_bytes_per_msg": peak_deltas / len(corpus) if corpus else 0,
+        "retained_bytes": retained - baseline,
+        "downloads": downloads,
+    }
+
+
+def print_table(results):
+    header = f"{'mode':<16}{'entries':>8}{'per ch':>8}{'channels':>10}{'messages':>10}{'msg/s':>12}" \
+             f"{'p50 us':>10}{'p99 us':>10}{'alloc B/msg':>13}{'retained KiB':>14}{'downloads':>11}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['mode']:<16}{r['entries']:>8}{r['entries_per_channel']:>8}{r['channels']:>10}{r['messages']:>10}"
+              f"{r['msgs_per_sec']:>12.0f}{r['p50_us']:>10.1f}{r['p99_us']:>10.1f}"
+              f"{r['alloc_peak_bytes_per_msg']:>13.0f}{r['retained_bytes'] / 1024:>14.1f}{r['downloads']:>11}")
+
+
+def import_downloader():
+    """Import downloader.py with settings.json writes disabled."""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import downloader
+    downloader.save_config = lambda: None  # keep disk writes out of the numbers
+    downloader.platform_stats.record = lambda *args: None
+    return downloader
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Discord message processing.")
+    parser.add_argument("--corpus", help="JSONL file of Discord message payloads to replay")
+    parser.add_argument("--write-corpus", help="Write the synthetic corpus to this file and exit")
+    parser.add_argument("--entries", default="10,100,1000", help="Comma separated config sizes")
+    parser.add_argument("--entries-per-channel", default="5",
+                        help="Comma separated entries per channel; the synthetic corpus is regenerated for each")
+    parser.add_argument("--messages", type=int, default=5000, help="Synthetic corpus size")
+    parser.add_argument("--match-ratio", type=float, default=0.3,
+                        help="Share of monitored-channel messages that are release posts")
+    parser.add_argument("--foreign-ratio", type=float, default=0.5,
+                        help="Share of messages from channels no entry listens on")
+    parser.add_argument("--retry-items", type=int, default=0,
+                        help="Retry queue items (not yet due) in the synthetic config")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mode", default="handler",
+                        help=f"Comma separated subset of {sorted(STEPS)}, or 'both' (handler,processor)")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.entries.split(",") if s.strip()]
+    densities = [int(s) for s in args.entries_per_channel.split(",") if s.strip()]
+    modes = ["handler", "processor"] if args.mode == "both" else [m for m in args.mode.split(",") if m.strip()]
+    unknown = set(modes) - set(STEPS)
+    if unknown:
+        parser.error(f"Unknown modes: {sorted(unknown)}")
+
+    def corpus_for(entries_per_channel):
+        if args.corpus:
+            return load_corpus(args.corpus)
+        return generate_corpus(args.messages, max(sizes), entries_per_channel,
+                               args.match_ratio, args.foreign_ratio, args.seed)
+
+    if args.write_corpus:
+        corpus = corpus_for(densities[0])
+        write_corpus(args.write_corpus, corpus)
+        print(f"Wrote {len(corpus)} messages to {args.write_corpus}")
+        return
+
+    dl = import_downloader()
+    dl.setup_logging(args.log_level.upper())
+
+    results = []
+    for entries_per_channel in densities:
+        corpus = corpus_for(entries_per_channel)
+        results.extend(run_one(dl, corpus, size, entries_per_channel, mode, args.retry_items)
+                       for mode in modes for size in sizes)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Cold-start benchmark for `import downloader`.
+
+Spawns fresh interpreters and measures how long importing the module
+takes, on top of bare interpreter startup, and checks that none of the
+heavy dependencies (discum, requests, bs4, dotenv) get pulled in.
+
+Usage:
+    python bench_startup.py
+    python bench_startup.py --runs 30 --importtime
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+HEAVY_MODULES = ["discum", "requests", "bs4", "dotenv", "urllib3", "websocket"]
+
+_CHILD = """
+import sys, time, json
+started = time.perf_counter()
+import downloader
+elapsed = time.perf_counter() - started
+print(json.dumps({"import_ms": elapsed * 1000, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def _run(args, cwd):
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, *args], cwd=cwd, capture_output=True, text=True, check=True)
+    return (time.perf_counter() - started) * 1000, proc
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of downloader.py.")
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--importtime", action="store_true", help="Show the slowest imports (-X importtime)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    bare, wall, imports, loaded = [], [], [], set()
+    for _ in range(args.runs):
+        bare.append(_run(["-c", "pass"], here)[0])
+        ms, proc = _run(["-c", _CHILD], here)
+        data = json.loads(proc.stdout.strip().splitlines()[-1])
+        wall.append(ms)
+        imports.append(data["import_ms"])
+        loaded.update(data["loaded"])
+
+    result = {
+        "runs": args.runs,
+        "interpreter_ms": statistics.median(bare),
+        "process_ms": statistics.median(wall),
+        "import_ms": statistics.median(imports),
+        "import_ms_min": min(imports),
+        "heavy_modules_loaded": sorted(loaded),
+    }
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"runs:                  {result['runs']}")
+        print(f"bare interpreter:      {result['interpreter_ms']:.1f} ms (median)")
+        print(f"python -c 'import':    {result['process_ms']:.1f} ms (median)")
+        print(f"import downloader:     {result['import_ms']:.1f} ms (median), {result['import_ms_min']:.1f} ms (min)")
+        print(f"heavy modules loaded:  {', '.join(result['heavy_modules_loaded']) or 'none'}")
+
+    if args.importtime:
+        _, proc = _run(["-X", "importtime", "-c", "import downloader"], here)
+        rows = []
+        for line in proc.stderr.splitlines():
+            parts = line.split("|")
+            if len(parts) == 3 and parts[1].strip().isdigit():
+                rows.append((int(parts[1]), parts[2].rstrip()))
+        print("\nslowest imports (cumulative us):")
+        for cumulative, name in sorted(rows, reverse=True)[:15]:
+            print(f"{cumulative:>10}  {name}")
+
+    if loaded:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
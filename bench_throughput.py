@@ -0,0 +1,156 @@
+"""
+Download throughput benchmark against the local fake servers.
+
+Runs PixeldrainDownloader (single file, folder, and a whole folder's new
+episodes one request each or as one zip archive), GoogleDriveDownloader
+(direct, confirm=t and legacy-token flows) and MegaDownloader's in-process
+engine (public file link, needs pycryptodome) against fake_servers.py at
+configurable file sizes, per-request latency and bandwidth caps, and
+reports wall time and MB/s per case.
+
+Usage:
+    python bench_throughput.py
+    python bench_throughput.py --sizes 1M,64M,512M --latency 0.05 --bandwidth 50M --repeat 3
+    python bench_throughput.py --cases pixeldrain_file,gdrive_legacy --json
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import datetime, timezone
+
+from bench_messages import import_downloader
+from fake_servers import FakePixeldrain, FakeGoogleDrive, FakeMega, SIZE_FORMAT, parse_size
+
+CASES = ["pixeldrain_file", "pixeldrain_folder", "pixeldrain_multi", "pixeldrain_archive", "gdrive_direct",
+         "gdrive_confirm_t", "gdrive_legacy", "mega_file"]
+FOLDER_FILES = 50
+
+
+def run_case(dl, case, size, latency, bandwidth, workdir):
+    """Download one file of `size` bytes for `case`. Returns (seconds, DownloadResult, requests)."""
+    if case.startswith("pixeldrain"):
+        server = FakePixeldrain(latency=latency, bandwidth=bandwidth)
+        with server:
+            downloader = dl.PixeldrainDownloader(base_url=server.url)
+            if case == "pixeldrain_file":
+                file_id = server.add_file("Series - 01 (1080p).mkv", size)
+                started = time.perf_counter()
+                result = downloader.download(f"{server.url}/u/{file_id}", workdir, "Series", 1)
+            elif case in ("pixeldrain_multi", "pixeldrain_archive"):
+                # `size` split over the folder, all of it new
+                now = datetime.now(timezone.utc)
+                ids = [server.add_file(f"Series - {i:02d} (1080p).mkv", size // FOLDER_FILES, uploaded=now)
+                       for i in range(1, FOLDER_FILES + 1)]
+                list_id = server.add_list(ids)
+                min_files = dl.PIXELDRAIN_ARCHIVE_MIN_FILES
+                dl.PIXELDRAIN_ARCHIVE_MIN_FILES = 1 if case == "pixeldrain_archive" else 0
+                try:
+                    started = time.perf_counter()
+                    result = downloader.download(f"{server.url}/l/{list_id}", workdir, "Series", FOLDER_FILES,
+                                                 share_type="folder", download_multiple=True,
+                                                 discord_regex=r"Series - (\d+)")
+                finally:
+                    dl.PIXELDRAIN_ARCHIVE_MIN_FILES = min_files
+            else:
+                now = datetime.now(timezone.utc)
+                ids = [server.add_file(f"Series - {i:02d} (1080p).mkv", size if i == FOLDER_FILES else 1024,
+                                       uploaded=now)
+                       for i in range(1, FOLDER_FILES + 1)]
+                list_id = server.add_list(ids)
+                started = time.perf_counter()
+                result = downloader.download(f"{server.url}/l/{list_id}", workdir, "Series", FOLDER_FILES,
+                                             share_type="folder", discord_regex=r"Series - (\d+)")
+            return time.perf_counter() - started, result, server.requests
+
+    if case == "mega_file":
+        server = FakeMega(latency=latency, bandwidth=bandwidth)
+        with server:
+            downloader = dl.MegaDownloader(api_url=server.url)
+            link = server.add_file("Series - 01 (1080p).mkv", size)
+            started = time.perf_counter()
+            result = downloader.download(link, workdir, "Series", 1)
+            return time.perf_counter() - started, result, server.requests
+
+    mode = case[len("gdrive_"):]
+    server = FakeGoogleDrive(latency=latency, bandwidth=bandwidth)
+    with server:
+        downloader = dl.GoogleDriveDownloader(usercontent_url=server.url, drive_url=server.url)
+        file_id = server.add_file("Series - 01 (1080p).mkv", size, mode=mode)
+        started = time.perf_counter()
+        result = downloader.download(f"https://drive.google.com/file/d/{file_id}/view", workdir, "Series", 1)
+        return time.perf_counter() - started, result, server.requests
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark downloaders against local fake servers.")
+    parser.add_argument("--sizes", default="1M,16M,128M", help=f"Comma separated file sizes: {SIZE_FORMAT}")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each response")
+    parser.add_argument("--bandwidth", default="0", help="Per-response bytes/sec cap (same format as --sizes), "
+                                                           "0 = unlimited")
+    parser.add_argument("--cases", help=f"Comma separated subset of {CASES} (default: all; mega_file only "
+                                        "with pycryptodome installed)")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--dir", help="Download directory (default: a temp dir, removed afterwards)")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    dl = import_downloader()
+    dl.setup_logging(args.log_level.upper())
+
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    if args.cases:
+        cases = [c for c in args.cases.split(",") if c.strip()]
+    else:
+        cases = [c for c in CASES if c != "mega_file" or dl.load_aes() is not None]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"Unknown cases: {sorted(unknown)}")
+    if "mega_file" in cases and dl.load_aes() is None:
+        parser.error("mega_file needs pycryptodome (pip install pycryptodome)")
+    bandwidth = parse_size(args.bandwidth)
+    workdir = args.dir or tempfile.mkdtemp(prefix="autodl-bench-")
+
+    results = []
+    try:
+        for case in cases:
+            for size in sizes:
+                for attempt in range(args.repeat):
+                    seconds, result, requests_made = run_case(dl, case, size, args.latency, bandwidth, workdir)
+                    downloaded = (result.files or [(None, result.filename)]) if result.success else []
+                    for _, filename in downloaded:
+                        path = os.path.join(workdir, filename or "")
+                        if os.path.isfile(path):
+                            os.remove(path)
+                    results.append({
+                        "case": case,
+                        "size": size,
+                        "run": attempt + 1,
+                        "success": result.success,
+                        "reason": result.reason,
+                        "seconds": seconds,
+                        "mb_per_sec": size / seconds / (1024 * 1024) if seconds else 0.0,
+                        "requests": requests_made,
+                    })
+    finally:
+        if not args.dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    header = f"{'case':<20}{'size MiB':>10}{'run':>5}{'ok':>5}{'seconds':>10}{'MB/s':>10}{'requests':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['case']:<20}{r['size'] / (1024 * 1024):>10.1f}{r['run']:>5}{'yes' if r['success'] else 'no':>5}"
+              f"{r['seconds']:>10.3f}{r['mb_per_sec']:>10.1f}{r['requests']:>10}")
+
+
+if __name__ == "__main__":
+    main()
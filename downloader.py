@@ -1,22 +1,231 @@
-import discum
 import os
 import re
+import sys
 import json
 import time
+import errno
+import shutil
+import struct
+import queue
+import logging
+import logging.handlers
+import zlib
+import itertools
+import functools
+import codecs
+import signal
+import atexit
+import threading
+import contextlib
 import subprocess
-import requests
 from datetime import datetime, timedelta
-from bs4 import BeautifulSoup
-from dotenv import load_dotenv
 
-# LOAD DISCORD_TOKEN and MAX_RETRY from .env
+# discum, requests and bs4 are imported where they are used so that
+# importing this module (benchmarks, tools, MessageProcessor users) stays
+# fast and never touches the network, settings.json or the gateway.
+
+# LOAD DISCORD_TOKEN and MAX_RETRY from .env (main() loads .env)
 # DISCORD_TOKEN=XXXXXXXXXXXXXXXXXXXXXXXXXXX
 # MAX_RETRY=10
+# LOG_LEVEL=INFO      (DEBUG shows per-file folder matching)
+# LOG_FORMAT=text     (or "json" for one JSON object per line)
+# SETTINGS_PATH=...   (defaults to settings.json next to this file)
+# CONFIG_WATCH=auto   (reload settings.json on change: auto = inotify/polling, poll, off)
+# CONFIG_POLL_INTERVAL=2
+# WORKERS=0           (worker processes for downloads, 0 = download in the gateway process)
+# SHARD_BY=channel    (assign entries to workers by channel or section)
+# HEDGE_MIN_SPEED_KBPS=0   (start the next platform in parallel when slower than this, 0 = off)
+# HEDGE_WARMUP_SECONDS=30
+# PLATFORM_STATS_PATH=...  (defaults to platform_stats.json next to settings.json)
+# MIN_FREE_SPACE_MB=0      (space to keep free on download volumes on top of the file)
+# POST_DOWNLOAD_WORKERS=2  (threads running post_download steps)
+# RETRY_CHECK_SECONDS=60   (how often the retry queue is checked)
+# STALL_MIN_SPEED_KBPS=0   (abort HTTP transfers slower than this over the window, 0 = off)
+# STALL_WINDOW_SECONDS=60
+# STALL_MAX_RESTARTS=2     (resumes/restarts of a stalled transfer before giving up)
+# GATEWAY_SUBSCRIBE=off    (monitored = subscribe only to guilds with monitored channels)
+# MEGA_ENGINE=auto         (auto = in-process for file links when pycryptodome is installed, mega-get = always CLI)
+# PIXELDRAIN_ARCHIVE_MIN_FILES=10  (fetch a folder as one zip when at least this many files are new, 0 = off)
+# PIXELDRAIN_ARCHIVE_MIN_SHARE=0.75  (... and they make up at least this share of the folder's bytes)
+# MAX_ACTIVE_DOWNLOADS=0   (downloads per process, more wait in a priority queue, 0 = no limit)
+# CONTROL_ADDR=            (control API: 127.0.0.1:8765 or unix:/path/autodl.sock, unset = off)
+# PROFILE_DIR=             (write cProfile/tracemalloc reports of message, sync and retry handling here, unset = off)
+# PROFILE_EVERY=1          (profile one call in N of each function)
+# PROFILE_MAX_MB=100       (delete the oldest reports beyond this)
+# MESSAGE_BATCH_SECONDS=0  (collect a channel's messages this long and download each episode once, 0 = off)
+# MESSAGE_BATCH_MAX=50     (hand a channel's batch over early once it holds this many messages)
+# STAGING_DIR=             (download to this fast local directory, then move files to the entry's path, unset = off)
+# MOVE_WORKERS=1           (threads moving staged files to their final path)
+
+def load_env():
+    """(Re)read environment settings into the module-level constants."""
+    global DISCORD_TOKEN, MAX_RETRY, FOLDER_FILE_MAX_AGE_DAYS, LOG_LEVEL, LOG_FORMAT, CONFIG_PATH
+    global CONFIG_WATCH, CONFIG_POLL_INTERVAL, WORKERS, SHARD_BY, HEDGE_MIN_SPEED_KBPS, HEDGE_WARMUP_SECONDS
+    global PLATFORM_STATS_PATH, MIN_FREE_SPACE_MB, POST_DOWNLOAD_WORKERS, RETRY_CHECK_SECONDS, GATEWAY_SUBSCRIBE
+    global STALL_MIN_SPEED_KBPS, STALL_WINDOW_SECONDS, STALL_MAX_RESTARTS, MAX_ACTIVE_DOWNLOADS, CONTROL_ADDR
+    global MEGA_ENGINE, PIXELDRAIN_ARCHIVE_MIN_FILES, PIXELDRAIN_ARCHIVE_MIN_SHARE
+    global PROFILE_DIR, PROFILE_EVERY, PROFILE_MAX_MB, MESSAGE_BATCH_SECONDS, MESSAGE_BATCH_MAX
+    global STAGING_DIR, MOVE_WORKERS
+    DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
+    MAX_RETRY = int(os.getenv("MAX_RETRY", "10"))
+    FOLDER_FILE_MAX_AGE_DAYS = int(os.getenv("FOLDER_FILE_MAX_AGE_DAYS", "30"))
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+    CONFIG_PATH = os.getenv("SETTINGS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "settings.json"))
+    CONFIG_WATCH = os.getenv("CONFIG_WATCH", "auto").lower()
+    CONFIG_POLL_INTERVAL = float(os.getenv("CONFIG_POLL_INTERVAL", "2"))
+    WORKERS = int(os.getenv("WORKERS", "0"))
+    SHARD_BY = os.getenv("SHARD_BY", "channel").lower()
+    HEDGE_MIN_SPEED_KBPS = float(os.getenv("HEDGE_MIN_SPEED_KBPS", "0"))
+    HEDGE_WARMUP_SECONDS = float(os.getenv("HEDGE_WARMUP_SECONDS", "30"))
+    PLATFORM_STATS_PATH = os.getenv("PLATFORM_STATS_PATH")
+    MIN_FREE_SPACE_MB = int(os.getenv("MIN_FREE_SPACE_MB", "0"))
+    POST_DOWNLOAD_WORKERS = int(os.getenv("POST_DOWNLOAD_WORKERS", "2"))
+    RETRY_CHECK_SECONDS = float(os.getenv("RETRY_CHECK_SECONDS", "60"))
+    GATEWAY_SUBSCRIBE = os.getenv("GATEWAY_SUBSCRIBE", "off").lower()
+    STALL_MIN_SPEED_KBPS = float(os.getenv("STALL_MIN_SPEED_KBPS", "0"))
+    STALL_WINDOW_SECONDS = float(os.getenv("STALL_WINDOW_SECONDS", "60"))
+    STALL_MAX_RESTARTS = int(os.getenv("STALL_MAX_RESTARTS", "2"))
+    MAX_ACTIVE_DOWNLOADS = int(os.getenv("MAX_ACTIVE_DOWNLOADS", "0"))
+    CONTROL_ADDR = os.getenv("CONTROL_ADDR")
+    MEGA_ENGINE = os.getenv("MEGA_ENGINE", "auto").lower()
+    PIXELDRAIN_ARCHIVE_MIN_FILES = int(os.getenv("PIXELDRAIN_ARCHIVE_MIN_FILES", "10"))
+    PIXELDRAIN_ARCHIVE_MIN_SHARE = float(os.getenv("PIXELDRAIN_ARCHIVE_MIN_SHARE", "0.75"))
+    PROFILE_DIR = os.getenv("PROFILE_DIR")
+    PROFILE_EVERY = max(int(os.getenv("PROFILE_EVERY", "1")), 1)
+    PROFILE_MAX_MB = float(os.getenv("PROFILE_MAX_MB", "100"))
+    MESSAGE_BATCH_SECONDS = float(os.getenv("MESSAGE_BATCH_SECONDS", "0"))
+    MESSAGE_BATCH_MAX = max(int(os.getenv("MESSAGE_BATCH_MAX", "50")), 1)
+    STAGING_DIR = os.getenv("STAGING_DIR")
+    MOVE_WORKERS = int(os.getenv("MOVE_WORKERS", "1"))
+
+
+load_env()
+
+# ============================================================================
+# LOGGING
+# ============================================================================
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class TextFormatter(logging.Formatter):
+    """Human readable lines: `2025-01-01 12:00:00 INFO    [PIXELDRAIN] message`."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s [%(component)s] %(message)s",
+                         datefmt="%Y-%m-%d %H:%M:%S")
+
+    def format(self, record):
+        record.component = record.name.rsplit(".", 1)[-1].upper()
+        return super().format(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, `extra=` fields are included as top-level keys."""
+
+    def format(self, record):
+        data = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "component": record.name.rsplit(".", 1)[-1],
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key != "component":
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class _InProcessQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that renders the message and traceback before queueing,
+    as its arguments (a job or retry item dict) may change before the
+    listener thread gets to them, and leaves the layout (text or JSON
+    fields) and the write to the listener.
+    """
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None  # tracebacks keep frames (and their locals) alive
+        return record
+
+
+_exception_formatter = logging.Formatter()
+
+
+_log_listener = None
+
+
+def setup_logging(level=None, fmt=None):
+    """
+    Route all `autodl.*` loggers through a queue to a background thread
+    that lays out the lines and does the (possibly slow) stdout writes.
+    Defaults to LOG_LEVEL / LOG_FORMAT.
+    """
+    global _log_listener
+    level = level or LOG_LEVEL
+    fmt = fmt or LOG_FORMAT
+    stop_logging()
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    log_queue = queue.SimpleQueue()
+    _log_listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _log_listener.start()
 
-load_dotenv()
-DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
-MAX_RETRY = int(os.getenv("MAX_RETRY", "10"))
-FOLDER_FILE_MAX_AGE_DAYS = int(os.getenv("FOLDER_FILE_MAX_AGE_DAYS", "30"))
+    root = logging.getLogger("autodl")
+    root.handlers[:] = [_InProcessQueueHandler(log_queue)]
+    root.setLevel(level)
+    root.propagate = False
+
+
+def flush_logging():
+    """Wait until every queued record is written, e.g. before printing to stdout directly."""
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener.start()
+
+
+@atexit.register
+def stop_logging():
+    """
+    Write out everything still queued and stop the listener thread; later
+    records are written directly. Runs at exit, as the listener is a
+    daemon thread and would otherwise take the last lines down with it.
+    """
+    global _log_listener
+    listener, _log_listener = _log_listener, None
+    if listener is not None:
+        listener.stop()
+        logging.getLogger("autodl").handlers[:] = list(listener.handlers)
+
+
+mega_log = logging.getLogger("autodl.mega")
+pixeldrain_log = logging.getLogger("autodl.pixeldrain")
+gdrive_log = logging.getLogger("autodl.gdrive")
+queue_log = logging.getLogger("autodl.queue")
+match_log = logging.getLogger("autodl.match")
+download_log = logging.getLogger("autodl.download")
+sync_log = logging.getLogger("autodl.sync")
+gateway_log = logging.getLogger("autodl.gateway")
+post_log = logging.getLogger("autodl.post")
+config_log = logging.getLogger("autodl.config")
+backfill_log = logging.getLogger("autodl.backfill")
+control_log = logging.getLogger("autodl.control")
+profile_log = logging.getLogger("autodl.profile")
+move_log = logging.getLogger("autodl.move")
 
 # ============================================================================
 # DOWNLOAD RESULT CLASS
@@ -24,16 +233,555 @@ FOLDER_FILE_MAX_AGE_DAYS = int(os.getenv("FOLDER_FILE_MAX_AGE_DAYS", "30"))
 
 class DownloadResult:
     """Return object from downloader.download() methods."""
-    def __init__(self, success, reason=None, filename=None):
+    def __init__(self, success, reason=None, filename=None, files=None):
         self.success = success
         self.reason = reason  # "quota_exceeded", "invalid_link", "network_error", etc.
         self.filename = filename  # Actual downloaded filename
+        self.files = files  # [(episode, filename), ...] for folder multi-downloads
+        self.path = None  # Directory the file was written to (set by the caller)
+        self.target = None  # What the link resolved to, kept in retry items (set by the caller)
+        self.staged = False  # `path` is a staging directory, StagingMover moves the files on (set by the caller)
+        self.platform = None  # Platform that produced this result (set by the caller)
+
+
+# ============================================================================
+# IN-FLIGHT DOWNLOADS
+# ============================================================================
+
+class _InFlightJob:
+    __slots__ = ("done", "result", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.waiters = 0
+
+
+class InFlightDownloads:
+    """
+    Registry of running downloads. run(key, func) calls func() unless a job
+    with the same key is already running, in which case it waits for that
+    job and returns its DownloadResult instead of starting a second transfer.
+    
+    Keys used: ("episode", section, entry_name, episode) around each episode,
+    ("pixeldrain", file_id, path) around each Pixeldrain file transfer,
+    so a folder item is fetched once even when two episodes' jobs need it,
+    and ("pixeldrain", "list:<id>", path) around a folder's zip archive.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+    
+    def run(self, key, func):
+        with self._lock:
+            job = self._jobs.get(key)
+            owner = job is None
+            if owner:
+                job = self._jobs[key] = _InFlightJob()
+            else:
+                job.waiters += 1
+        
+        if not owner:
+            download_log.info("Already downloading %s, waiting for that transfer", self._label(key),
+                              extra={"key": list(key)})
+            job.done.wait()
+            return job.result
+        
+        try:
+            job.result = func()
+            return job.result
+        finally:
+            if job.result is None:  # func raised, waiters still need an answer
+                job.result = DownloadResult(success=False, reason="download_error")
+            with self._lock:
+                del self._jobs[key]
+            if job.waiters:
+                download_log.info("%s finished, %d waiting trigger(s) get its result", self._label(key), job.waiters)
+            job.done.set()
+    
+    @staticmethod
+    def _label(key):
+        if key[0] == "episode":
+            return f"{key[2]} EP{key[3]}"
+        return f"{key[0]} file {key[1]}"
+    
+    def active(self):
+        """Keys of the downloads running right now."""
+        with self._lock:
+            return list(self._jobs)
+
+
+in_flight = InFlightDownloads()
+
+
+# ============================================================================
+# TRANSFER PROGRESS
+# ============================================================================
+
+class DownloadCancelled(Exception):
+    """Raised inside a streaming loop once its Transfer has been cancelled."""
+
+
+class TransferStalled(Exception):
+    """Raised from Transfer.iter_content() once the stall watchdog gave up on the connection."""
+
+
+class TransferPaused(Exception):
+    """Raised from Transfer.iter_content() after pause() dropped the connection."""
+
+class Transfer:
+    """
+    Progress of one download attempt. Streaming loops report every chunk
+    through update(); after cancel() the next update() raises
+    DownloadCancelled so the downloader can clean up and return. pause()
+    drops the connection, stream_to_file() reopens it after resume().
+    """
+    
+    def __init__(self, label="", platform=None):
+        self.label = label
+        self.platform = platform
+        self.bytes = 0
+        self.total = None  # expected bytes once a response said so
+        self.started = time.monotonic()
+        self.first_byte = None
+        self.finished = None
+        self.measured = True  # False for downloaders that cannot report bytes (mega-get)
+        self.stalled = False  # set by the stall watchdog, cleared when the stream is reopened
+        self.target = None  # set through resolved_target() once the downloader knows what to fetch
+        self._cancelled = threading.Event()
+        self._running = threading.Event()  # cleared while paused
+        self._running.set()
+        self._response = None
+    
+    def update(self, nbytes):
+        if self._cancelled.is_set():
+            raise DownloadCancelled(self.label)
+        if not self._running.is_set():
+            raise TransferPaused(self.label)
+        if self.stalled:
+            raise TransferStalled(self.label)
+        if self.first_byte is None:
+            self.first_byte = time.monotonic()
+        self.bytes += nbytes
+    
+    def rewind(self, nbytes):
+        """Forget nbytes already counted (the server sent the file again from the start)."""
+        self.bytes = max(self.bytes - nbytes, 0)
+    
+    def iter_content(self, response, chunk_size=65536):
+        """
+        response.iter_content() under the stall watchdog, reporting every
+        chunk through update(). Raises DownloadCancelled, TransferPaused or
+        TransferStalled when cancel(), pause() or the watchdog cut the
+        connection, including when that made the stream end early.
+        """
+        length = response.headers.get("Content-Length")
+        expected = int(length) if length and length.isdigit() else None
+        if expected is not None:
+            self.total = self.bytes + expected
+        received = 0
+        self._response = response
+        try:
+            with stall_watchdog.watch(self, response):
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    if chunk:
+                        self.update(len(chunk))
+                        received += len(chunk)
+                        yield chunk
+        except (DownloadCancelled, TransferPaused, TransferStalled):
+            raise
+        except Exception:
+            self._raise_if_interrupted()
+            raise
+        finally:
+            self._response = None
+        if expected is None or received < expected:
+            self._raise_if_interrupted()
+    
+    def _raise_if_interrupted(self):
+        if self._cancelled.is_set():
+            raise DownloadCancelled(self.label) from None
+        if not self._running.is_set():
+            raise TransferPaused(self.label) from None
+        if self.stalled:
+            raise TransferStalled(self.label) from None
+    
+    def cancel(self):
+        self._cancelled.set()
+        if self._response is not None:
+            _shutdown_socket(self._response)
+    
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+    
+    def pause(self):
+        self._running.clear()
+        if self._response is not None:
+            _shutdown_socket(self._response)
+    
+    def resume(self):
+        self._running.set()
+    
+    @property
+    def paused(self):
+        return not self._running.is_set()
+    
+    def wait_resumed(self):
+        """Block while paused. Raises DownloadCancelled if cancelled meanwhile."""
+        while not self._running.wait(0.5):
+            if self._cancelled.is_set():
+                break
+        if self._cancelled.is_set():
+            raise DownloadCancelled(self.label)
+    
+    def speed(self):
+        """Average bytes/sec since the attempt started (time to first byte included)."""
+        elapsed = time.monotonic() - self.started
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+    
+    def part_path(self, filepath):
+        """Where to stream `filepath` until it is complete (per platform, so hedged legs never collide)."""
+        return f"{filepath}.{self.platform or 'download'}.part"
+    
+    def snapshot(self):
+        speed = self.speed() if self.measured else None
+        eta = None
+        if speed and self.total is not None:
+            eta = max(self.total - self.bytes, 0) / speed
+        return {
+            "platform": self.platform,
+            "bytes": self.bytes if self.measured else None,
+            "total": self.total,
+            "speed": speed,
+            "eta": eta,
+            "paused": self.paused,
+        }
+
+
+def _shutdown_socket(response):
+    """Shut down the socket under a streaming requests response, waking a read blocked in another thread."""
+    import socket
+    raw = getattr(response, "raw", None)
+    connection = getattr(raw, "_connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is None:  # urllib3 1.x keeps it only on the file object
+        fp = getattr(getattr(getattr(raw, "_fp", None), "fp", None), "raw", None)
+        sock = getattr(fp, "_sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class StallWatchdog:
+    """
+    Samples the byte counters of streaming HTTP transfers every few
+    seconds. One that moved less than STALL_MIN_SPEED_KBPS over the last
+    STALL_WINDOW_SECONDS is marked stalled and its socket is shut down:
+    requests' read timeout only bounds the gap between single reads, so a
+    server trickling a few bytes every 20 seconds never trips it.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._watched = {}  # Transfer -> (response, deque of (monotonic time, bytes))
+        self._thread = None
+    
+    @contextlib.contextmanager
+    def watch(self, transfer, response):
+        if STALL_MIN_SPEED_KBPS <= 0:
+            yield
+            return
+        import collections
+        with self._lock:
+            self._watched[transfer] = (response, collections.deque([(time.monotonic(), transfer.bytes)]))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stall-watchdog", daemon=True)
+                self._thread.start()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._watched.pop(transfer, None)
+    
+    def _run(self):
+        while True:
+            time.sleep(max(0.5, min(5.0, STALL_WINDOW_SECONDS / 6)))
+            now = time.monotonic()
+            floor = STALL_MIN_SPEED_KBPS * 1024 * STALL_WINDOW_SECONDS
+            with self._lock:
+                watched = list(self._watched.items())
+            for transfer, (response, samples) in watched:
+                samples.append((now, transfer.bytes))
+                # Keep the newest sample that is at least a full window old as the baseline
+                while len(samples) > 1 and samples[1][0] <= now - STALL_WINDOW_SECONDS:
+                    samples.popleft()
+                since, baseline = samples[0]
+                if now - since < STALL_WINDOW_SECONDS or transfer.bytes - baseline >= floor:
+                    continue
+                download_log.warning("⚠ %s: %d bytes in the last %.0fs (floor %.0f KB/s), aborting connection",
+                                     transfer.label or "transfer", transfer.bytes - baseline, now - since,
+                                     STALL_MIN_SPEED_KBPS, extra={"platform": transfer.platform})
+                transfer.stalled = True
+                with self._lock:
+                    self._watched.pop(transfer, None)
+                _shutdown_socket(response)
+
+
+stall_watchdog = StallWatchdog()
+
+
+def stream_to_file(transfer, response, f, reopen, log):
+    """
+    Write a streaming response into the open part file `f`. When the stall
+    watchdog aborts it, or after the transfer was paused and resumed,
+    reopen(offset) must return a new response for the same file with
+    `Range: bytes=offset-`: a matching 206 continues where the file
+    stopped, anything else (the server ignored the range) starts it over.
+    Raises TransferStalled after STALL_MAX_RESTARTS stalls.
+    Returns the number of bytes in the file.
+    """
+    restarts = 0
+    while True:
+        try:
+            for chunk in transfer.iter_content(response):
+                f.write(chunk)
+            return f.tell()
+        except TransferStalled:
+            response.close()
+            if restarts >= STALL_MAX_RESTARTS:
+                raise
+            restarts += 1
+            transfer.stalled = False
+            log.info("Reconnecting after stall (restart %d/%d)", restarts, STALL_MAX_RESTARTS)
+        except TransferPaused:
+            response.close()
+            log.info("Paused at byte %d", f.tell())
+            transfer.wait_resumed()
+        
+        offset = f.tell()
+        response = reopen(offset)
+        content_range = response.headers.get("Content-Range", "")
+        if offset and response.status_code == 206 and content_range.startswith(f"bytes {offset}-"):
+            log.info("Resuming at byte %d", offset)
+        else:
+            log.info("Server cannot resume, starting over")
+            f.seek(0)
+            f.truncate()
+            transfer.rewind(offset)
+
+
+_transfer_local = threading.local()
+
+
+def current_transfer():
+    """The Transfer of the download running in this thread, or a throwaway one."""
+    transfer = getattr(_transfer_local, "transfer", None)
+    return transfer if transfer is not None else Transfer()
+
+
+@contextlib.contextmanager
+def tracking(transfer):
+    """Make `transfer` the current_transfer() of this thread for the duration."""
+    previous = getattr(_transfer_local, "transfer", None)
+    _transfer_local.transfer = transfer
+    try:
+        yield transfer
+    finally:
+        _transfer_local.transfer = previous
+
+
+# How long resolved download URLs (Google Drive, Mega) are reused by retries.
+# File IDs do not expire; any cached target is resolved again once it 404s.
+RESOLVED_URL_TTL = timedelta(hours=12)
+
+
+def resolved_target(url_ttl=None, **fields):
+    """
+    Record on the current transfer what the link resolved to (file ID,
+    direct URL, name, size), so a retry can skip the lookup. Fields that
+    are None are left out; url_ttl stamps an expiry for direct URLs.
+    """
+    target = {key: value for key, value in fields.items() if value is not None}
+    target["resolved"] = datetime.now().isoformat(timespec="seconds")
+    if url_ttl:
+        target["expires"] = (datetime.now() + url_ttl).isoformat(timespec="seconds")
+    current_transfer().target = target
+    return target
+
+
+def usable_target(target, *required):
+    """`target` if it has all `required` fields and has not expired, else None."""
+    if not target or any(target.get(field) is None for field in required):
+        return None
+    if "expires" in target and datetime.fromisoformat(target["expires"]) <= datetime.now():
+        return None
+    return target
+
+
+# ============================================================================
+# DOWNLOAD JOBS
+# ============================================================================
+
+class Job:
+    """
+    One episode download (all its platform attempts) as seen by the control
+    API. pause(), resume() and cancel() apply to every attached Transfer,
+    including ones attached later.
+    """
+    
+    _ids = itertools.count(1)
+    
+    def __init__(self, entry_name, episode, channel_id=None, source="message", priority=0):
+        self.id = next(Job._ids)
+        self.entry_name = entry_name
+        self.episode = episode
+        self.channel_id = channel_id
+        self.source = source  # message, retry
+        self.priority = priority
+        self.state = None  # queued, running (None until acquired)
+        self.queued = None
+        self.started = None
+        self.transfers = []
+        self._paused = False
+        self._cancelled = False
+    
+    def attach(self, transfer):
+        self.transfers.append(transfer)
+        if self._paused:
+            transfer.pause()
+        if self._cancelled:
+            transfer.cancel()
+        return transfer
+    
+    def pause(self):
+        self._paused = True
+        for transfer in list(self.transfers):
+            transfer.pause()
+    
+    def resume(self):
+        self._paused = False
+        for transfer in list(self.transfers):
+            transfer.resume()
+    
+    def cancel(self):
+        self._cancelled = True
+        for transfer in list(self.transfers):
+            transfer.cancel()
+    
+    @property
+    def paused(self):
+        return self._paused
+    
+    @property
+    def cancelled(self):
+        return self._cancelled
+    
+    def snapshot(self):
+        now = time.monotonic()
+        legs = [transfer.snapshot() for transfer in self.transfers if transfer.finished is None]
+        lead = max(legs, key=lambda leg: leg["bytes"] or 0, default={})
+        state = self.state
+        if self._cancelled:
+            state = "cancelling"
+        elif self._paused:
+            state = "paused" if state == "running" else "queued"
+        return {
+            "id": self.id,
+            "entry": self.entry_name,
+            "episode": self.episode,
+            "channel_id": self.channel_id,
+            "source": self.source,
+            "state": state,
+            "priority": self.priority,
+            "waiting": (self.started or now) - self.queued if self.queued else 0.0,
+            "running": now - self.started if self.started else 0.0,
+            "platform": lead.get("platform"),
+            "bytes": lead.get("bytes"),
+            "total": lead.get("total"),
+            "speed": lead.get("speed"),
+            "eta": lead.get("eta"),
+            "transfers": legs,
+        }
+
+
+class JobBoard:
+    """
+    Downloads of this process. A job registers in acquire() and waits there
+    while MAX_ACTIVE_DOWNLOADS others are running (highest priority first,
+    then oldest; paused jobs do not start), and leaves in release().
+    """
+    
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._jobs = {}
+    
+    def acquire(self, job):
+        with self._cond:
+            if job.state is not None:
+                return  # already holds a slot
+            job.state = "queued"
+            job.queued = time.monotonic()
+            self._jobs[job.id] = job
+            if not self._may_start(job):
+                download_log.info("%s EP%s queued (%d downloads active)", job.entry_name, job.episode,
+                                  self._running(), extra={"entry": job.entry_name, "episode": job.episode})
+                while not job.cancelled and not self._may_start(job):
+                    self._cond.wait()
+            job.state = "running"
+            job.started = time.monotonic()
+    
+    def release(self, job):
+        with self._cond:
+            if self._jobs.pop(job.id, None) is not None:
+                self._cond.notify_all()
+    
+    def changed(self):
+        """Wake queued jobs after a priority, pause or cancel change."""
+        with self._cond:
+            self._cond.notify_all()
+    
+    def _running(self):
+        return sum(1 for job in self._jobs.values() if job.state == "running")
+    
+    def _may_start(self, job):
+        if job.paused:
+            return False
+        if MAX_ACTIVE_DOWNLOADS <= 0:
+            return True
+        if self._running() >= MAX_ACTIVE_DOWNLOADS:
+            return False
+        waiting = [queued for queued in self._jobs.values()
+                   if queued.state == "queued" and not queued.paused and not queued.cancelled]
+        return min(waiting, key=lambda queued: (-queued.priority, queued.id)) is job
+    
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+    
+    def list(self):
+        with self._cond:
+            return sorted(self._jobs.values(), key=lambda job: (job.state != "running", -job.priority, job.id))
+
+
+jobs = JobBoard()
 
 
 # ============================================================================
 # MESSAGE PROCESSOR CLASS
 # ============================================================================
 
+# Platform URL patterns used to pick links out of messages
+PLATFORM_URL_PATTERNS = {
+    "mega": r"https://mega\.nz/\S+",
+    "pixeldrain": r"https://pixeldrain\.com/[ul]/[a-zA-Z0-9]+",  # Support both /u/ (file) and /l/ (list/folder)
+    "gdrive": r"https://drive\.(?:google\.com|usercontent\.google\.com)/[^\s>)]+",  # Support both domains
+}
+
+
 class MessageProcessor:
     """Handles message analysis independent of download platform."""
     
@@ -47,6 +795,8 @@ class MessageProcessor:
         self.folder_regex = entry.get("folder_regex", None)  # Optional regex for folder files
         self.download_multiple = entry.get("download_multiple", False)
         self.platform_config = entry.get("platform_config", {})  # Per-platform overrides
+        self._pattern = re.compile(self.regex)
+        self._link_patterns = {}  # (label, platform) -> (markdown pattern, url pattern)
     
     def get_platform_share_type(self, platform):
         """Get share type for specific platform (with per-platform override)."""
@@ -68,7 +818,7 @@ class MessageProcessor:
     
     def extract_episode(self, message_content):
         """Returns episode number or None if no match or already downloaded."""
-        match = re.search(self.regex, message_content)
+        match = self._pattern.search(message_content)
         if not match:
             return None
         try:
@@ -77,9 +827,11 @@ class MessageProcessor:
         except (IndexError, ValueError):
             return None
     
-    def find_platform_links(self, message_content):
+    def find_platform_links(self, message_content, scan=None):
         """
         Find links for all configured platforms respecting priority order.
+        `scan` is an optional MessageScan of the same content, shared by all
+        entries of a channel so the message is only tokenised once.
         Returns: dict like {"pixeldrain": "url", "gdrive": "url", "mega": "url"}
         """
         found = {}
@@ -89,42 +841,176 @@ class MessageProcessor:
             if not label:
                 continue
             
-            link = self._extract_link_by_label(message_content, label, platform)
+            if scan is not None:
+                link = self._extract_link_from_scan(scan, label, platform)
+            else:
+                link = self._extract_link_by_label(message_content, label, platform)
             if link:
                 found[platform] = link
         
         return found
     
+    def _get_link_patterns(self, label, platform):
+        """Compiled (markdown, url) patterns for a label/platform pair, built once per processor."""
+        patterns = self._link_patterns.get((label, platform))
+        if patterns is None:
+            # Normalize the label to handle markdown bold or italic
+            label_pattern = re.escape(label).replace(r'\[', r'[\*\s]*\[').replace(r'\]', r'\][\*\s]*')
+            url_pattern = PLATFORM_URL_PATTERNS.get(platform, r"https://\S+")
+            
+            # Match [Label](<link>) or [**[Label]**](<link>)
+            md_pattern = re.compile(
+                rf"\[\s*\**\s*{label_pattern}\s*\**\s*\]\s*\(<({url_pattern})>\)", 
+                re.IGNORECASE
+            )
+            patterns = self._link_patterns[(label, platform)] = (md_pattern, re.compile(rf"({url_pattern})"))
+        return patterns
+    
     def _extract_link_by_label(self, content, label, platform):
         """Extract platform-specific link based on label with markdown support."""
-        # Normalize the label to handle markdown bold or italic
-        label_pattern = re.escape(label).replace(r'\[', r'[\*\s]*\[').replace(r'\]', r'\][\*\s]*')
-        
-        # Define platform URL patterns
-        platform_patterns = {
-            "mega": r"https://mega\.nz/\S+",
-            "pixeldrain": r"https://pixeldrain\.com/[ul]/[a-zA-Z0-9]+",  # Support both /u/ (file) and /l/ (list/folder)
-            "gdrive": r"https://drive\.(?:google\.com|usercontent\.google\.com)/[^\s>)]+",  # Support both domains
-        }
-        
-        url_pattern = platform_patterns.get(platform, r"https://\S+")
-        
-        # Match [Label](<link>) or [**[Label]**](<link>)
-        md_pattern = re.compile(
-            rf"\[\s*\**\s*{label_pattern}\s*\**\s*\]\s*\(<({url_pattern})>\)", 
-            re.IGNORECASE
-        )
+        md_pattern, url_re = self._get_link_patterns(label, platform)
         match = md_pattern.search(content)
         if match:
             return match.group(1)
         
         # Fallback: look for label and any platform link nearby
         if label in content:
-            link_match = re.search(rf"({url_pattern})", content)
+            link_match = url_re.search(content)
             if link_match:
                 return link_match.group(1)
         
         return None
+    
+    def _extract_link_from_scan(self, scan, label, platform):
+        """Same result as _extract_link_by_label, checking only the markdown links found by the scan."""
+        md_pattern, _ = self._get_link_patterns(label, platform)
+        for text in scan.markdown_links:
+            match = md_pattern.fullmatch(text)
+            if match:
+                return match.group(1)
+        
+        if label in scan.content:
+            return scan.first_url(platform)
+        
+        return None
+
+
+# Every "[label](<url>)" in a message; the label may contain one level of [brackets]
+MARKDOWN_LINK_RE = re.compile(r"\[(?:[^\[\]\n]|\[[^\[\]\n]*\])*\]\s*\(<\S+?>\)")
+
+
+class MessageScan:
+    """
+    One message tokenised once for every entry of its channel: the markdown
+    links in it and the first URL per platform, computed on first use.
+    """
+    
+    def __init__(self, content):
+        self.content = content
+        self._markdown_links = None
+        self._first_urls = {}
+    
+    @property
+    def markdown_links(self):
+        if self._markdown_links is None:
+            self._markdown_links = MARKDOWN_LINK_RE.findall(self.content)
+        return self._markdown_links
+    
+    def first_url(self, platform):
+        if platform not in self._first_urls:
+            match = re.search(PLATFORM_URL_PATTERNS.get(platform, r"https://\S+"), self.content)
+            self._first_urls[platform] = match.group(0) if match else None
+        return self._first_urls[platform]
+
+
+def _required_literal(regex, min_length=3):
+    """
+    Longest run of plain characters that every match of `regex` contains
+    (top level only), or None if there is no usable one (too short, or the
+    pattern is case-insensitive).
+    """
+    try:
+        import re._parser as sre_parse
+    except ImportError:  # Python < 3.11
+        import sre_parse
+    try:
+        parsed = sre_parse.parse(regex)
+    except re.error:
+        return None
+    if parsed.state.flags & re.IGNORECASE:
+        return None
+    best = current = ""
+    for op, value in parsed:
+        if op is sre_parse.LITERAL:
+            current += chr(value)
+        else:
+            best = max(best, current, key=len)
+            current = ""
+    best = max(best, current, key=len)
+    return best if len(best) >= min_length else None
+
+
+def _trie_regex(words):
+    """A regex matching any of `words`, factored into a trie so its cost does not grow with len(words)."""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+    
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+    
+    return build(trie)
+
+
+class ChannelMatcher:
+    """
+    All entries of one channel, matched in one pass. Each entry's regex
+    contributes its longest required literal to a single trie regex; a
+    message is scanned once for those literals and only entries whose
+    literal occurs are checked with their own regex. Entries without a
+    usable literal are always checked.
+    """
+    
+    def __init__(self, entries):
+        self.entries = list(entries)
+        self._always = []
+        by_literal = {}
+        for index, entry in enumerate(self.entries):
+            literal = _required_literal(entry["regex"])
+            if literal is None:
+                self._always.append(index)
+            else:
+                by_literal.setdefault(literal, []).append(index)
+        
+        # The scan reports the longest literal starting at each position, so
+        # remember which shorter literals are prefixes of it
+        self._candidates = {
+            literal: sorted({i for other, indexes in by_literal.items() if literal.startswith(other) for i in indexes})
+            for literal in by_literal
+        }
+        self._scanner = re.compile(f"(?=({_trie_regex(by_literal)}))") if by_literal else None
+    
+    def match(self, content):
+        """[(entry, episode), ...] for entries with a new episode in `content`, in config order."""
+        candidates = set(self._always)
+        if self._scanner is not None:
+            for literal in set(self._scanner.findall(content)):
+                candidates.update(self._candidates[literal])
+        
+        matches = []
+        for index in sorted(candidates):
+            entry = self.entries[index]
+            episode = get_processor(entry).extract_episode(content)
+            if episode:
+                matches.append((entry, episode))
+        return matches
 
 
 # ============================================================================
@@ -168,87 +1054,958 @@ def is_file_too_old(date_string, max_age_days=FOLDER_FILE_MAX_AGE_DAYS):
     Returns:
         True if file is too old, False otherwise
     """
-    if not date_string:
-        return False  # If no date, don't filter
+    file_date = parse_upload_date(date_string)
+    if file_date is None:
+        return False  # If no date or parsing fails, don't filter
     
+    from datetime import timezone
+    now = datetime.now(timezone.utc)
+    age_days = (now - file_date).days
+    return age_days > max_age_days
+
+
+def parse_upload_date(date_string):
+    """Aware datetime of an ISO upload date like "2025-12-12T23:03:01.681Z", or None."""
+    if not date_string:
+        return None
     try:
-        from datetime import datetime, timezone
-        file_date = datetime.fromisoformat(date_string.replace('Z', '+00:00'))
-        now = datetime.now(timezone.utc)
-        age_days = (now - file_date).days
-        return age_days > max_age_days
-    except Exception:
-        return False  # If parsing fails, don't filter
+        return datetime.fromisoformat(date_string.replace('Z', '+00:00'))
+    except (TypeError, ValueError):
+        return None
 
 
 # ============================================================================
-# PLATFORM DOWNLOADERS
+# DISK SPACE
 # ============================================================================
 
-class MegaDownloader:
-    """Downloads from Mega.nz via mega-get CLI."""
+class _Reservation:
+    """Space promised to one download; shrinks as the download writes."""
     
-    def download(self, link, path, entry_name, episode):
-        """
-        Args:
-            link: Mega.nz URL
-            path: Absolute directory path
-            entry_name: Series name for logging
-            episode: Episode number for logging
-        Returns:
-            DownloadResult
-        """
-        print(f"[MEGA] Downloading to {path}")
-        os.chdir(path)
-        result = subprocess.run(
-            ["mega-get", "--ignore-quota-warn", link],
-            capture_output=True,
-            text=True
-        )
-        
-        if result.returncode == 0:
-            subprocess.run("chmod 754 *", shell=True)
-            print(f"[MEGA] ✓ Download successful")
-            return DownloadResult(success=True, filename="unknown")
-        else:
-            error_msg = result.stderr.lower()
-            if "quota" in error_msg or "limit" in error_msg:
-                print(f"[MEGA] ✗ Quota exceeded")
-                return DownloadResult(success=False, reason="quota_exceeded")
-            else:
-                print(f"[MEGA] ✗ Download failed: {result.stderr}")
-                return DownloadResult(success=False, reason="download_error")
+    def __init__(self, owner, device, size, transfer):
+        self.owner = owner
+        self.device = device
+        self.size = size
+        self.transfer = transfer
+        self._written_before = transfer.bytes
+    
+    def remaining(self):
+        return max(self.size - (self.transfer.bytes - self._written_before), 0)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.owner._release(self)
 
 
-class PixeldrainDownloader:
-    """Downloads from Pixeldrain via API with folder/list support."""
+class DiskReservations:
+    """
+    Bytes promised to running downloads, per filesystem. reserve() admits a
+    download only if the destination has room for it on top of what the
+    other running downloads still have to write there (plus MIN_FREE_SPACE_MB).
+    """
     
-    def download(self, link, path, entry_name, episode, share_type=None, 
-                 folder_regex=None, download_multiple=False, last_episode=0, discord_regex=None):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = []
+    
+    def reserve(self, path, size, log=download_log):
         """
-        Args:
-            link: Pixeldrain URL
-            path: Absolute directory path
-            entry_name: Series name
+        Returns a _Reservation to hold (as a context manager) while writing,
+        or None if `size` bytes do not fit in `path`. Unknown sizes (None)
+        only check MIN_FREE_SPACE_MB.
+        """
+        device = os.stat(path).st_dev
+        free = shutil.disk_usage(path).free
+        with self._lock:
+            reserved = sum(r.remaining() for r in self._active if r.device == device)
+            needed = (size or 0) + MIN_FREE_SPACE_MB * 1024 * 1024
+            if free - reserved < needed:
+                log.warning("✗ Not enough space in %s: need %.1f MB, %.1f MB free (%.1f MB reserved by running downloads)",
+                            path, needed / (1024 * 1024), free / (1024 * 1024), reserved / (1024 * 1024),
+                            extra={"path": path, "needed": needed, "free": free, "reserved": reserved})
+                return None
+            reservation = _Reservation(self, device, size or 0, current_transfer())
+            self._active.append(reservation)
+            return reservation
+    
+    def _release(self, reservation):
+        with self._lock:
+            self._active.remove(reservation)
+
+
+disk_space = DiskReservations()
+
+
+def _is_disk_full(error):
+    return isinstance(error, OSError) and error.errno in (errno.ENOSPC, errno.EDQUOT)
+
+
+# ============================================================================
+# PLATFORM STATS
+# ============================================================================
+
+@contextlib.contextmanager
+def _exclusive_file_lock(lock_path):
+    """flock on lock_path for the duration (no-op where fcntl is unavailable)."""
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+class PlatformStats:
+    """
+    Persistent download statistics per platform and per platform@host:
+    attempts, success rate, time to first byte, throughput and duration,
+    as moving averages so weeks-old behaviour fades out. Every record() is a
+    locked read-modify-write of the JSON file, so worker processes share it.
+    
+    Used by entries with "platform_order": "adaptive" to sort platforms by
+    expected completion time.
+    """
+    
+    ALPHA = 0.2         # weight of the newest sample
+    MIN_SAMPLES = 3     # attempts before a platform's estimate is trusted
+    
+    def __init__(self, path=None):
+        self._path = path
+        self._lock = threading.Lock()
+        self._data = {}
+        self._stamp = None
+    
+    @property
+    def path(self):
+        return (self._path or PLATFORM_STATS_PATH
+                or os.path.join(os.path.dirname(os.path.abspath(CONFIG_PATH)), "platform_stats.json"))
+    
+    def _read(self):
+        """Current file contents, re-read only when the file changed."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return self._data
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp != self._stamp:
+            try:
+                with open(self.path, "r") as f:
+                    self._data = json.load(f)
+                self._stamp = stamp
+            except (OSError, ValueError):
+                download_log.warning("⚠ Could not read %s, starting fresh stats", self.path)
+        return self._data
+    
+    def record(self, platform, link, transfer, result):
+        """Add one finished attempt (`transfer` timing, `result` outcome)."""
+        from urllib.parse import urlparse
+        host = urlparse(link).hostname or "unknown"
+        now = time.monotonic()
+        sample = {
+            "success": 1.0 if result.success else 0.0,
+            "seconds": now - transfer.started,
+            "ttfb_ms": (transfer.first_byte - transfer.started) * 1000 if transfer.first_byte else None,
+            "bytes": transfer.bytes if transfer.measured else 0,
+            "bytes_per_sec": (transfer.bytes / (now - transfer.first_byte)
+                              if transfer.measured and transfer.first_byte and now > transfer.first_byte else None),
+        }
+        try:
+            with self._lock, _exclusive_file_lock(f"{self.path}.lock"):
+                self._stamp = None  # another process may have written since
+                data = self._read()
+                for key in (platform, f"{platform}@{host}"):
+                    self._update(data.setdefault(key, {}), sample, result)
+                if result.success and sample["bytes"]:
+                    self._update(data.setdefault("_all", {}), sample, result)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(data, f, indent=2, sort_keys=True)
+                os.replace(tmp_path, self.path)
+                self._data = data
+        except OSError as e:
+            download_log.warning("⚠ Could not update %s: %s", self.path, e)
+    
+    def _update(self, stats, sample, result):
+        def average(field, value):
+            if value is None:
+                return
+            old = stats.get(field)
+            stats[field] = value if old is None else old + self.ALPHA * (value - old)
+        
+        stats["attempts"] = stats.get("attempts", 0) + 1
+        average("success_rate", sample["success"])
+        average("ttfb_ms", sample["ttfb_ms"])
+        if result.success:
+            average("seconds", sample["seconds"])
+            if sample["bytes"]:
+                average("bytes", sample["bytes"])
+                average("bytes_per_sec", sample["bytes_per_sec"])
+        else:
+            outcomes = stats.setdefault("failures", {})
+            outcomes[result.reason or "unknown"] = outcomes.get(result.reason or "unknown", 0) + 1
+        stats["updated"] = datetime.now().isoformat(timespec="seconds")
+    
+    def expected_seconds(self, platform, link):
+        """
+        Expected time to get the file from `platform`: TTFB plus a typical
+        file at the recorded throughput (or the recorded duration for
+        downloaders that cannot measure bytes), divided by the success rate.
+        None if there are not enough samples yet.
+        """
+        from urllib.parse import urlparse
+        with self._lock:
+            data = self._read()
+        stats = data.get(f"{platform}@{urlparse(link).hostname or 'unknown'}", {})
+        if stats.get("attempts", 0) < self.MIN_SAMPLES:
+            stats = data.get(platform, {})
+        if stats.get("attempts", 0) < self.MIN_SAMPLES:
+            return None
+        
+        typical_bytes = data.get("_all", {}).get("bytes")
+        if stats.get("bytes_per_sec") and typical_bytes:
+            seconds = stats.get("ttfb_ms", 0) / 1000 + typical_bytes / stats["bytes_per_sec"]
+        elif stats.get("seconds"):
+            seconds = stats["seconds"]
+        else:
+            return float("inf")  # never succeeded
+        return seconds / max(stats.get("success_rate", 0), 0.05)
+    
+    def order(self, platforms, platform_links):
+        """
+        Sort platforms by expected completion time. Platforms without enough
+        samples go first so they get measured; the static order breaks ties.
+        """
+        def key(item):
+            index, platform = item
+            expected = self.expected_seconds(platform, platform_links[platform])
+            return (0, 0, index) if expected is None else (1, expected, index)
+        return [platform for _, platform in sorted(enumerate(platforms), key=key)]
+
+
+platform_stats = PlatformStats()
+
+
+def _remove_partial(part_path):
+    """Delete an unfinished download, ignoring files that are already gone."""
+    try:
+        os.remove(part_path)
+    except OSError:
+        pass
+
+
+def _file_size(filepath):
+    """Size of a regular file, None if there is none."""
+    try:
+        return os.path.getsize(filepath) if os.path.isfile(filepath) else None
+    except OSError:
+        return None
+
+
+# ============================================================================
+# PLATFORM DOWNLOADERS
+# ============================================================================
+
+# Public file links: mega.nz/file/<handle>#<key> and the older mega.nz/#!<handle>!<key>
+MEGA_FILE_LINK_RE = re.compile(r"mega\.(?:nz|co\.nz)/(?:file/([\w-]+)#([\w-]+)|#!([\w-]+)!([\w-]+))")
+
+# Mega API error codes -> DownloadResult reasons
+MEGA_API_ERRORS = {
+    -2: "invalid_link",    # EARGS
+    -4: "quota_exceeded",  # ERATELIMIT
+    -9: "invalid_link",    # ENOENT
+    -11: "invalid_link",   # EACCESS
+    -16: "invalid_link",   # EBLOCKED
+    -17: "quota_exceeded", # EOVERQUOTA
+}
+
+# Reasons after which the native engine hands the link to mega-get
+MEGA_FALLBACK_REASONS = ("download_error", "timeout")
+
+
+class MegaApiError(Exception):
+    """Negative error code returned by the Mega API."""
+    
+    def __init__(self, code):
+        super().__init__(f"Mega API error {code}")
+        self.code = code
+
+
+def load_aes():
+    """pycryptodome's (or pycryptodomex's) AES module, None when neither is installed."""
+    try:
+        from Crypto.Cipher import AES
+    except ImportError:
+        try:
+            from Cryptodome.Cipher import AES
+        except ImportError:
+            return None
+    return AES
+
+
+def mega_b64decode(text):
+    """Mega's base64: URL-safe alphabet, no padding."""
+    import base64
+    text = text.replace("-", "+").replace("_", "/").replace(",", "")
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def parse_mega_file_link(link):
+    """(handle, 32-byte key) of a public file link, None for folders and anything else."""
+    match = MEGA_FILE_LINK_RE.search(link)
+    if match is None:
+        return None
+    handle = match.group(1) or match.group(3)
+    try:
+        key = mega_b64decode(match.group(2) or match.group(4))
+    except ValueError:
+        return None
+    return (handle, key) if len(key) == 32 else None
+
+
+def _xor(a, b):
+    return bytes(x ^ y for x, y in zip(a, b))
+
+
+class MegaStream:
+    """
+    File wrapper for stream_to_file(). Decrypts Mega's AES-CTR stream into
+    `f` and feeds the plaintext through Mega's chunked CBC-MAC on the way,
+    so verify() needs no second pass over the file. Resumed ranges continue
+    the same cipher state; seek(0) (the server ignored Range) starts over.
+    """
+    
+    def __init__(self, f, key, aes):
+        self._f = f
+        self._aes = aes
+        self._key = _xor(key[:16], key[16:])
+        self._nonce = key[16:24]
+        self._meta_mac = key[24:32]
+        self._restart()
+    
+    def _restart(self):
+        self._ctr = self._aes.new(self._key, self._aes.MODE_CTR, nonce=self._nonce, initial_value=0)
+        self._file_mac = self._aes.new(self._key, self._aes.MODE_CBC, iv=bytes(16))
+        self._mac = bytes(16)
+        self._chunks = 0
+        self._next_chunk()
+    
+    def _next_chunk(self):
+        # 128 KiB, 256 KiB, ... 1 MiB, then 1 MiB chunks
+        self._chunks += 1
+        self._chunk_left = 0x20000 * min(self._chunks, 8)
+        self._chunk_mac = self._aes.new(self._key, self._aes.MODE_CBC, iv=self._nonce * 2)
+        self._chunk_last = None
+        self._pending = b""
+    
+    def write(self, data):
+        plain = self._ctr.decrypt(data)
+        self._f.write(plain)
+        view = memoryview(plain)
+        while view:
+            take = min(len(view), self._chunk_left)
+            block, view = view[:take], view[take:]
+            self._chunk_left -= take
+            if self._pending:
+                block = self._pending + block
+            aligned = len(block) - len(block) % 16
+            if aligned:
+                self._chunk_last = self._chunk_mac.encrypt(block[:aligned])[-16:]
+            self._pending = bytes(block[aligned:])
+            if self._chunk_left == 0:
+                self._end_chunk()
+    
+    def _end_chunk(self):
+        if self._pending:
+            self._chunk_last = self._chunk_mac.encrypt(self._pending.ljust(16, b"\0"))
+        if self._chunk_last is not None:
+            self._mac = self._file_mac.encrypt(self._chunk_last)
+        self._next_chunk()
+    
+    def tell(self):
+        return self._f.tell()
+    
+    def seek(self, offset):
+        if offset:
+            raise ValueError("MegaStream can only rewind to the start")
+        self._f.seek(0)
+        self._restart()
+    
+    def truncate(self):
+        return self._f.truncate()
+    
+    def verify(self):
+        """Whether everything written matches the MAC carried in the link's key."""
+        self._end_chunk()
+        return _xor(self._mac[0:4], self._mac[4:8]) + _xor(self._mac[8:12], self._mac[12:16]) == self._meta_mac
+
+
+class MegaDownloader:
+    """
+    Downloads from Mega.nz. Public file links are fetched in-process (API
+    lookup, then the encrypted stream decrypted as it arrives) when
+    pycryptodome is installed; folder links, MEGA_ENGINE=mega-get and
+    unexpected errors of the native engine go through the mega-get CLI.
+    """
+    
+    def __init__(self, api_url="https://g.api.mega.co.nz"):
+        # api_url is overridable so benchmarks can point at fake_servers.py
+        self.api_url = api_url.rstrip("/")
+        self._sequence = itertools.count(int(time.time()))
+        self._warned_no_aes = False
+    
+    def download(self, link, path, entry_name, episode, target=None):
+        """
+        Args:
+            link: Mega.nz URL
+            path: Absolute directory path
+            entry_name: Series name for logging
+            episode: Episode number for logging
+            target: Resolved target from an earlier attempt (handle, url, filename, size)
+        Returns:
+            DownloadResult
+        """
+        parsed = parse_mega_file_link(link) if MEGA_ENGINE != "mega-get" else None
+        aes = load_aes() if parsed else None
+        if parsed and aes is None and not self._warned_no_aes:
+            self._warned_no_aes = True
+            mega_log.warning("⚠ pycryptodome is not installed, using mega-get for Mega links")
+        
+        if parsed and aes is not None:
+            result = self._download_native(parsed[0], parsed[1], path, aes, target)
+            if result.reason not in MEGA_FALLBACK_REASONS or shutil.which("mega-get") is None:
+                return result
+            mega_log.warning("⚠ In-process download failed (%s), retrying with mega-get", result.reason)
+            current_transfer().bytes = 0
+        return self._download_cli(link, path)
+    
+    def _api(self, command):
+        """One Mega API command. Returns its result (dict) or raises MegaApiError."""
+        import requests
+        response = requests.post(f"{self.api_url}/cs", params={"id": next(self._sequence)},
+                                 json=[command], timeout=30)
+        response.raise_for_status()
+        data = response.json()
+        if isinstance(data, list):
+            data = data[0] if data else -1
+        if isinstance(data, int):
+            raise MegaApiError(data)
+        return data
+    
+    def _file_name(self, attributes, key, aes):
+        """Decrypt a node's `at` attributes (AES-CBC, zero IV) and return its name."""
+        cipher = aes.new(_xor(key[:16], key[16:]), aes.MODE_CBC, iv=bytes(16))
+        raw = cipher.decrypt(mega_b64decode(attributes))
+        if not raw.startswith(b"MEGA{"):
+            raise ValueError("attributes do not decrypt, wrong key")
+        return json.loads(raw[4:].rstrip(b"\0").decode("utf-8"))["n"]
+    
+    def _download_native(self, handle, key, path, aes, target=None):
+        import requests
+        transfer = current_transfer()
+        part_path = None
+        try:
+            cached = usable_target(target, "url", "filename", "size")
+            if cached and cached.get("handle") == handle:
+                mega_log.info("Reusing resolved download URL for %s", handle)
+                filename, size, url = cached["filename"], cached["size"], cached["url"]
+                transfer.target = cached
+            else:
+                cached = None
+                try:
+                    info = self._api({"a": "g", "g": 1, "ssl": 2, "p": handle})
+                except MegaApiError as e:
+                    reason = MEGA_API_ERRORS.get(e.code, "download_error")
+                    mega_log.error("✗ Mega API error %d for %s (%s)", e.code, handle, reason)
+                    return DownloadResult(success=False, reason=reason)
+                if "g" not in info:
+                    mega_log.error("✗ No download URL for %s (taken down?)", handle)
+                    return DownloadResult(success=False, reason="invalid_link")
+                
+                filename = os.path.basename(self._file_name(info["at"], key, aes))
+                size = int(info["s"])
+                url = info["g"]
+                resolved_target(RESOLVED_URL_TTL, handle=handle, url=url, filename=filename, size=size)
+            filepath = os.path.join(path, filename)
+            part_path = transfer.part_path(filepath)
+            mega_log.info("Downloading %s (%d bytes)...", filename, size)
+            
+            with requests.get(url, stream=True, timeout=30) as response:
+                if cached and response.status_code in (403, 404, 410):
+                    mega_log.info("Resolved URL is gone (HTTP %d), resolving %s again", response.status_code, handle)
+                    return self._download_native(handle, key, path, aes)
+                if response.status_code == 509:
+                    mega_log.warning("✗ Quota exceeded")
+                    return DownloadResult(success=False, reason="quota_exceeded")
+                response.raise_for_status()
+                
+                reservation = disk_space.reserve(path, size, mega_log)
+                if reservation is None:
+                    return DownloadResult(success=False, reason="insufficient_space")
+                
+                def reopen(offset):
+                    resumed = requests.get(url, stream=True, timeout=30,
+                                           headers={"Range": f"bytes={offset}-"} if offset else None)
+                    resumed.raise_for_status()
+                    return resumed
+                
+                with reservation, open(part_path, "wb") as f:
+                    stream = MegaStream(f, key, aes)
+                    written = stream_to_file(transfer, response, stream, reopen, mega_log)
+            
+            if written != size or not stream.verify():
+                _remove_partial(part_path)
+                mega_log.error("✗ %s failed verification (%d of %d bytes, MAC mismatch or short read)",
+                               filename, written, size)
+                return DownloadResult(success=False, reason="download_error")
+            
+            os.replace(part_path, filepath)
+            os.chmod(filepath, 0o754)
+            mega_log.info("✓ Downloaded: %s", filename)
+            return DownloadResult(success=True, filename=filename)
+        
+        except DownloadCancelled:
+            if part_path:
+                _remove_partial(part_path)
+            mega_log.info("Download cancelled")
+            return DownloadResult(success=False, reason="cancelled")
+        except TransferStalled:
+            if part_path:
+                _remove_partial(part_path)
+            mega_log.error("✗ Download stalled")
+            return DownloadResult(success=False, reason="stalled")
+        except requests.exceptions.Timeout:
+            mega_log.error("✗ Download timeout")
+            return DownloadResult(success=False, reason="timeout")
+        except OSError as e:
+            if not _is_disk_full(e):
+                mega_log.exception("✗ Download failed")
+                return DownloadResult(success=False, reason="download_error")
+            if part_path:  # None if the disk filled up before the file name was known
+                _remove_partial(part_path)
+            mega_log.error("✗ Disk full while writing to %s", path)
+            return DownloadResult(success=False, reason="insufficient_space")
+        except Exception:
+            if part_path:
+                _remove_partial(part_path)
+            mega_log.exception("✗ Download failed")
+            return DownloadResult(success=False, reason="download_error")
+    
+    def _download_cli(self, link, path):
+        """Run mega-get in `path`. The file name it wrote is not known, so it is reported as "unknown"."""
+        mega_log.info("Downloading to %s", path)
+        transfer = current_transfer()
+        transfer.measured = False  # mega-get does not report progress
+        # cwd instead of os.chdir: other downloads may be running in other threads
+        process = subprocess.Popen(
+            ["mega-get", "--ignore-quota-warn", link],
+            cwd=path,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+        stopped = False
+        while True:
+            try:
+                _, stderr = process.communicate(timeout=1)
+                break
+            except subprocess.TimeoutExpired:
+                if transfer.cancelled:
+                    process.kill()
+                    process.communicate()
+                    mega_log.info("Download cancelled")
+                    return DownloadResult(success=False, reason="cancelled")
+                if transfer.paused != stopped and hasattr(signal, "SIGSTOP"):
+                    stopped = transfer.paused
+                    process.send_signal(signal.SIGSTOP if stopped else signal.SIGCONT)
+                    mega_log.info("Download %s", "paused" if stopped else "resumed")
+        
+        if process.returncode == 0:
+            subprocess.run("chmod 754 *", shell=True, cwd=path)
+            mega_log.info("✓ Download successful")
+            return DownloadResult(success=True, filename="unknown")
+        else:
+            error_msg = stderr.lower()
+            if "quota" in error_msg or "limit" in error_msg:
+                mega_log.warning("✗ Quota exceeded")
+                return DownloadResult(success=False, reason="quota_exceeded")
+            else:
+                mega_log.error("✗ Download failed: %s", stderr.strip())
+                return DownloadResult(success=False, reason="download_error")
+
+
+class FolderFile:
+    """One file of a Pixeldrain list, reduced to what folder downloads use."""
+    __slots__ = ("id", "name", "size", "episode", "uploaded")
+    
+    def __init__(self, id, name, size, episode, uploaded):
+        self.id = id
+        self.name = name
+        self.size = size
+        self.episode = episode
+        self.uploaded = uploaded  # epoch seconds, or None if the page had no date
+
+
+_VIEWER_DATA_RE = re.compile(r'window\.viewer_data\s*=\s*\{')
+_OBJECT_KEY_RE = re.compile(r'[\s,]*"((?:[^"\\]|\\.)*)"\s*:\s*')
+_OBJECT_END_RE = re.compile(r'[\s,]*\}')
+_ARRAY_SEPARATOR_RE = re.compile(r'[\s,]*')
+_VIEWER_FILES_PATH = ("api_response", "files")
+
+
+def iter_viewer_files(chunks):
+    """
+    Yield the objects of window.viewer_data.api_response.files from a list
+    page given as text chunks, one at a time. Only the unparsed tail of the
+    page and the current file object are held in memory, never the whole
+    page, a DOM or the decoded viewer_data.
+    
+    The key path is followed one object level at a time: values beside it
+    are decoded and dropped, so a "files" key anywhere else is never taken
+    for the file list.
+    
+    Raises ValueError if the page has no such array or ends before it does.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    found = False  # past "window.viewer_data = {"
+    depth = 0      # keys of _VIEWER_FILES_PATH entered so far
+    for chunk in chunks:
+        buf += chunk
+        if not found:
+            match = _VIEWER_DATA_RE.search(buf)
+            if not match:
+                buf = buf[-64:]  # keep enough to find the marker split across chunks
+                continue
+            buf = buf[match.end():]
+            found = True
+        
+        pos = 0
+        while depth < len(_VIEWER_FILES_PATH):
+            match = _OBJECT_KEY_RE.match(buf, pos)
+            if not match:
+                if _OBJECT_END_RE.match(buf, pos):
+                    raise ValueError("viewer_data files list not found")
+                break  # key continues in the next chunk
+            end = match.end()
+            if end == len(buf):
+                break
+            if match.group(1) == _VIEWER_FILES_PATH[depth]:
+                depth += 1
+                if buf[end] != ("[" if depth == len(_VIEWER_FILES_PATH) else "{"):
+                    raise ValueError("viewer_data files list not found")
+                pos = end + 1
+                continue
+            try:
+                _, end = decoder.raw_decode(buf, end)
+            except json.JSONDecodeError:
+                break  # value continues in the next chunk
+            if end == len(buf):
+                break  # a number could go on in the next chunk
+            pos = end
+        if depth < len(_VIEWER_FILES_PATH):
+            buf = buf[pos:]
+            continue
+        
+        while True:
+            pos = _ARRAY_SEPARATOR_RE.match(buf, pos).end()
+            if pos == len(buf):
+                break
+            if buf[pos] == "]":
+                return
+            try:
+                obj, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # object continues in the next chunk
+            yield obj
+        buf = buf[pos:]
+    
+    raise ValueError("viewer_data files list not found" if depth < len(_VIEWER_FILES_PATH) else "viewer_data truncated")
+
+
+_ZIP_LOCAL_HEADER = b"PK\x03\x04"
+_ZIP_DESCRIPTOR = b"PK\x07\x08"
+_ZIP_DIRECTORY = (b"PK\x01\x02", b"PK\x06\x06", b"PK\x05\x06")  # central directory, zip64 end, end
+_ZIP_RECORD_RE = re.compile(b"|".join(re.escape(sig) for sig in (_ZIP_DESCRIPTOR, _ZIP_LOCAL_HEADER, *_ZIP_DIRECTORY)))
+
+
+class _ZipMember:
+    __slots__ = ("name", "method", "crc", "left", "read", "checksum", "written", "inflater", "out",
+                 "part_path", "filepath")
+    
+    def __init__(self, name, method, crc, size):
+        self.name = name
+        self.method = method  # 0 stored, 8 deflated, None to skip
+        self.crc = crc
+        self.left = size  # stored/compressed bytes still to read, None if a descriptor follows the data
+        self.read = 0
+        self.checksum = 0
+        self.written = 0
+        self.inflater = zlib.decompressobj(-15) if method == 8 else None
+        self.out = None
+
+
+class ZipExtractor:
+    """
+    File wrapper for stream_to_file() that unpacks a zip archive while it
+    streams, so the archive itself never touches the disk. Members whose
+    name is in `wanted` (name -> expected size or None) are written to
+    `path` through part_path(filepath) and kept if their CRC and size
+    check out; the rest are read past. Stored and deflated members, data
+    descriptors and zip64 sizes are handled, as archives generated on the
+    fly use them. seek(0) (the server restarted the archive) reads it
+    again from the top but keeps the members already extracted.
+    """
+    
+    def __init__(self, path, wanted, part_path, log):
+        self._path = path
+        self._wanted = wanted
+        self._part_path = part_path
+        self._log = log
+        self.extracted = set()  # member names
+        self._member = None
+        self._restart()
+    
+    def _restart(self):
+        self.close()
+        self._buf = b""
+        self._offset = 0
+        self.complete = False  # reached the central directory
+    
+    def write(self, data):
+        self._offset += len(data)
+        self._buf = self._buf + data if self._buf else bytes(data)
+        while self._buf and not self.complete:
+            if self._member is None:
+                if not self._read_header():
+                    break
+            elif not self._read_data():
+                break
+    
+    def tell(self):
+        return self._offset
+    
+    def seek(self, offset):
+        if offset:
+            raise ValueError("ZipExtractor can only rewind to the start")
+        self._restart()
+    
+    def truncate(self):
+        pass
+    
+    def close(self):
+        """Drop the member being extracted, if any."""
+        member, self._member = self._member, None
+        if member is not None and member.out is not None:
+            member.out.close()
+            _remove_partial(member.part_path)
+    
+    def _read_header(self):
+        buf = self._buf
+        if len(buf) < 4:
+            return False
+        if buf[:4] in _ZIP_DIRECTORY:
+            self.complete = True
+            self._buf = b""
+            return False
+        if buf[:4] != _ZIP_LOCAL_HEADER:
+            raise ValueError(f"bad zip header at byte {self._offset - len(buf)}")
+        if len(buf) < 30:
+            return False
+        flags, method, crc, csize, usize, name_length, extra_length = struct.unpack_from("<6xHH4xIIIHH", buf)
+        end = 30 + name_length + extra_length
+        if len(buf) < end:
+            return False
+        name = buf[30:30 + name_length].decode("utf-8" if flags & 0x800 else "cp437", errors="replace")
+        extra = buf[30 + name_length:end]
+        self._buf = buf[end:]
+        
+        # zip64: the real sizes are in extra field 1, for each of the two that is 0xFFFFFFFF
+        pos = 0
+        while pos + 4 <= len(extra):
+            field, length = struct.unpack_from("<HH", extra, pos)
+            if field == 1:
+                values = iter(struct.unpack_from(f"<{length // 8}Q", extra, pos + 4))
+                if usize == 0xFFFFFFFF:
+                    usize = next(values, usize)
+                if csize == 0xFFFFFFFF:
+                    csize = next(values, csize)
+            pos += 4 + length
+        
+        name = name.replace("\\", "/").rsplit("/", 1)[-1]
+        deferred = bool(flags & 0x08)
+        member = self._member = _ZipMember(name, method, crc, None if deferred else csize)
+        if flags & 0x01 or method not in (0, 8):
+            if deferred:
+                raise ValueError(f"cannot read past {name!r} (method {method}, flags {flags:#x})")
+            if name in self._wanted:
+                self._log.warning("⚠ Cannot extract %s from the archive (method %d, flags %#x)", name, method, flags)
+            member.method = None  # skip the bytes
+            return True
+        if name in self._wanted and name not in self.extracted:
+            member.filepath = os.path.join(self._path, name)
+            member.part_path = self._part_path(member.filepath)
+            member.out = open(member.part_path, "wb")
+        return True
+    
+    def _read_data(self):
+        member = self._member
+        buf = self._buf
+        if member.left is not None:
+            data = buf[:member.left]
+            self._buf = buf[len(data):]
+            member.left -= len(data)
+            self._consume(data)
+            return not member.left and self._end_member(member.crc)
+        
+        if member.method == 8:
+            if not member.inflater.eof:
+                self._consume(buf)
+                self._buf = member.inflater.unused_data
+                member.read -= len(self._buf)
+            return member.inflater.eof and self._read_descriptor()
+        
+        # Stored with the size in a trailing descriptor: the data ends at the first
+        # descriptor whose CRC and size match everything before it. The descriptor's
+        # signature is optional, so an unsigned one is looked for in front of the
+        # next record's signature.
+        pos = 0
+        while True:
+            found = _ZIP_RECORD_RE.search(buf, pos)
+            if found is None:
+                keep = min(len(buf), 23)  # a signature, and an unsigned descriptor before it, may straddle chunks
+                self._consume(buf[:len(buf) - keep])
+                self._buf = buf[len(buf) - keep:]
+                return False
+            at = found.start()
+            starts = [at] if found.group() == _ZIP_DESCRIPTOR else [start for start in (at - 20, at - 12) if start >= 0]
+            for start in starts:
+                descriptor = self._parse_descriptor(buf[start:], member.read + start)
+                if descriptor is None:
+                    self._consume(buf[:start])
+                    self._buf = buf[start:]
+                    return False
+                if descriptor and descriptor[1] == zlib.crc32(buf[:start], member.checksum):
+                    self._consume(buf[:start])
+                    self._buf = buf[start + descriptor[0]:]
+                    return self._end_member(descriptor[1])
+            pos = at + 1
+    
+    def _consume(self, data):
+        member = self._member
+        if not data:
+            return
+        member.read += len(data)
+        if member.method == 8:
+            data = member.inflater.decompress(data)
+        elif member.method is None:
+            return
+        member.checksum = zlib.crc32(data, member.checksum)
+        member.written += len(data)
+        if member.out is not None:
+            member.out.write(data)
+    
+    def _read_descriptor(self):
+        parsed = self._parse_descriptor(self._buf, self._member.read)
+        if parsed is None:
+            return False
+        if not parsed:
+            raise ValueError(f"bad data descriptor after {self._member.name!r}")
+        length, crc = parsed
+        self._buf = self._buf[length:]
+        return self._end_member(crc)
+    
+    @staticmethod
+    def _parse_descriptor(buf, size):
+        """
+        (length, crc) of the data descriptor at the start of `buf` for a
+        member of `size` stored bytes, () if it is not one, None if more
+        bytes are needed to tell. The signature is optional and the sizes
+        are 4 or 8 bytes each, so a form counts only if its size matches
+        and the next record's signature follows it.
+        """
+        if len(buf) < 4:
+            return None
+        start = 4 if buf[:4] == _ZIP_DESCRIPTOR else 0
+        for fmt, length in (("<III", 12), ("<IQQ", 20)):
+            end = start + length
+            if len(buf) < end + 4:
+                return None
+            crc, csize, _ = struct.unpack_from(fmt, buf, start)
+            if csize == size and (buf[end:end + 4] == _ZIP_LOCAL_HEADER or buf[end:end + 4] in _ZIP_DIRECTORY):
+                return end, crc
+        return ()
+    
+    def _end_member(self, crc):
+        member, self._member = self._member, None
+        if member.out is None:
+            return True
+        member.out.close()
+        if member.checksum != crc:
+            _remove_partial(member.part_path)
+            self._log.error("✗ CRC mismatch for %s in the archive", member.name)
+            return True
+        expected = self._wanted.get(member.name)
+        if expected is not None and member.written != expected:
+            _remove_partial(member.part_path)
+            self._log.error("✗ %s in the archive has %d bytes, expected %d", member.name, member.written, expected)
+            return True
+        os.replace(member.part_path, member.filepath)
+        os.chmod(member.filepath, 0o754)
+        self.extracted.add(member.name)
+        self._log.info("✓ Extracted: %s", member.name)
+        return True
+
+
+class PixeldrainDownloader:
+    """Downloads from Pixeldrain via API with folder/list support."""
+
+    def __init__(self, base_url="https://pixeldrain.com"):
+        # base_url is overridable so benchmarks can point at fake_servers.py
+        self.base_url = base_url.rstrip("/")
+    
+    def download(self, link, path, entry_name, episode, share_type=None, 
+                 folder_regex=None, download_multiple=False, last_episode=0, discord_regex=None, target=None):
+        """
+        Args:
+            link: Pixeldrain URL
+            path: Absolute directory path
+            entry_name: Series name
             episode: Episode number from Discord message
             share_type: "file" or "folder" (auto-detected if None)
             folder_regex: Regex to match episodes in folder filenames
             download_multiple: Download all new episodes from folder
             last_episode: Last downloaded episode number
             discord_regex: Original Discord regex for fallback matching
+            target: Resolved target from an earlier attempt (file_id, filename, size)
         Returns:
             DownloadResult
         """
+        # A retry of a single file (or one folder item) goes straight to the file it resolved to
+        cached = None if download_multiple else usable_target(target, "file_id", "filename")
+        if cached:
+            pixeldrain_log.info("Reusing resolved file %s (%s)", cached["file_id"], cached["filename"])
+            current_transfer().target = cached
+            result = self._download_file_by_id(cached["file_id"], cached["filename"], path, cached.get("size"))
+            if result.reason != "not_found":
+                return result
+            pixeldrain_log.info("Resolved file is gone, resolving %s again", link)
+        
         # Auto-detect share type if not specified
         if share_type is None:
             share_type = detect_share_type_from_url(link, "pixeldrain")
-            print(f"[PIXELDRAIN] Auto-detected share type: {share_type}")
+            pixeldrain_log.info("Auto-detected share type: %s", share_type)
         else:
             # Verify config matches URL
             detected = detect_share_type_from_url(link, "pixeldrain")
             if detected != share_type:
-                print(f"[PIXELDRAIN] ⚠ Warning: Config says '{share_type}' but URL looks like '{detected}'")
-                print(f"[PIXELDRAIN] Using config value: {share_type}")
+                pixeldrain_log.warning("⚠ Config says '%s' but URL looks like '%s', using config value",
+                                       share_type, detected)
         
         if share_type == "folder":
             return self._download_from_folder(
@@ -261,87 +2018,79 @@ class PixeldrainDownloader:
     def _download_from_folder(self, link, path, entry_name, episode, 
                               folder_regex, download_multiple, last_episode, discord_regex):
         """Download episode(s) from a Pixeldrain folder with smart matching."""
-        list_id = link.replace("https://pixeldrain.com/l/", "").split("/")[0].split("?")[0]
-        print(f"[PIXELDRAIN] Folder ID: {list_id}")
+        import requests
+        list_id = link.split("/l/", 1)[-1].split("/")[0].split("?")[0]
+        pixeldrain_log.info("Folder ID: %s", list_id)
         
         try:
-            # Fetch folder data
-            response = requests.get(link, timeout=30)
-            response.raise_for_status()
-            
-            from bs4 import BeautifulSoup
-            soup = BeautifulSoup(response.text, 'html.parser')
-            script_tag = soup.find('script', string=re.compile(r'window\.viewer_data'))
-            
-            if not script_tag:
-                print("[PIXELDRAIN] ✗ Could not find viewer_data in page")
-                return DownloadResult(success=False, reason="folder_parse_error")
-            
-            script_content = script_tag.string
-            match = re.search(r'window\.viewer_data\s*=\s*({.*?});', script_content, re.DOTALL)
-            
-            if not match:
-                print("[PIXELDRAIN] ✗ Could not extract viewer_data JSON")
-                return DownloadResult(success=False, reason="folder_parse_error")
-            
-            viewer_data = json.loads(match.group(1))
-            files = viewer_data.get('api_response', {}).get('files', [])
+            # Stream the folder page and keep one compact record per usable file
+            files_with_episodes = []
+            total = 0
+            folder_bytes = 0
+            skipped_old = 0
+            # Same whole-day rule as is_file_too_old(): more than N full days old
+            too_old = time.time() - (FOLDER_FILE_MAX_AGE_DAYS + 1) * 86400
+            with requests.get(f"{self.base_url}/l/{list_id}", stream=True, timeout=30) as response:
+                response.raise_for_status()
+                text_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+                chunks = (text_decoder.decode(chunk) for chunk in response.iter_content(chunk_size=65536))
+                try:
+                    for file_data in iter_viewer_files(chunks):
+                        total += 1
+                        folder_bytes += file_data.get('size') or 0
+                        filename = file_data.get('name', '')
+                        upload_date = parse_upload_date(file_data.get('date_upload'))
+                        uploaded = upload_date.timestamp() if upload_date else None
+                        
+                        # Check if file is too old
+                        if uploaded is not None and uploaded <= too_old:
+                            skipped_old += 1
+                            pixeldrain_log.debug("⏭ Skipping (too old, uploaded %s): %s",
+                                                 file_data.get('date_upload'), filename)
+                            continue
+                        
+                        # Try to extract episode number with fallback chain
+                        ep_num = self._extract_episode_from_filename(
+                            filename, folder_regex, discord_regex
+                        )
+                        
+                        if ep_num is not None:
+                            files_with_episodes.append(FolderFile(
+                                file_data.get('id', ''), filename, file_data.get('size'), ep_num, uploaded
+                            ))
+                except ValueError as e:
+                    pixeldrain_log.error("✗ Could not extract viewer_data from page: %s", e)
+                    return DownloadResult(success=False, reason="folder_parse_error")
             
-            if not files:
-                print("[PIXELDRAIN] ✗ No files found in folder")
+            if not total:
+                pixeldrain_log.warning("✗ No files found in folder")
                 return DownloadResult(success=False, reason="no_files")
             
-            print(f"[PIXELDRAIN] Found {len(files)} files in folder")
-            
-            # Extract episode numbers from filenames with age filtering
-            files_with_episodes = []
-            for file_data in files:
-                filename = file_data.get('name', '')
-                upload_date = file_data.get('date_upload', '')
-                
-                # Check if file is too old
-                if is_file_too_old(upload_date, FOLDER_FILE_MAX_AGE_DAYS):
-                    from datetime import timezone
-                    age_days = (datetime.now(timezone.utc) - 
-                               datetime.fromisoformat(upload_date.replace('Z', '+00:00'))).days
-                    print(f"[PIXELDRAIN] ⏭ Skipping (too old: {age_days} days): {filename}")
-                    continue
-                
-                # Try to extract episode number with fallback chain
-                ep_num = self._extract_episode_from_filename(
-                    filename, folder_regex, discord_regex
-                )
-                
-                if ep_num is not None:
-                    files_with_episodes.append({
-                        'file_data': file_data,
-                        'episode': ep_num,
-                        'filename': filename,
-                        'upload_date': upload_date
-                    })
+            pixeldrain_log.info("Found %d files in folder", total)
             
+            if skipped_old:
+                pixeldrain_log.info("⏭ Skipped %d files older than %d days", skipped_old, FOLDER_FILE_MAX_AGE_DAYS)
+
             if not files_with_episodes:
-                print("[PIXELDRAIN] ✗ No files with valid episode numbers found")
+                pixeldrain_log.warning("✗ No files with valid episode numbers found")
                 return DownloadResult(success=False, reason="no_episodes_found")
             
             # Sort by episode number
-            files_with_episodes.sort(key=lambda x: x['episode'])
+            files_with_episodes.sort(key=lambda f: f.episode)
             
-            print(f"[PIXELDRAIN] Found {len(files_with_episodes)} files with episode numbers")
+            pixeldrain_log.info("Found %d files with episode numbers", len(files_with_episodes))
             
             if download_multiple:
                 return self._download_multiple_episodes(
-                    files_with_episodes, path, last_episode
+                    files_with_episodes, path, last_episode, list_id, folder_bytes
                 )
             else:
                 return self._download_single_episode_from_folder(
                     files_with_episodes, path, episode
                 )
             
-        except Exception as e:
-            print(f"[PIXELDRAIN] ✗ Folder processing failed: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            pixeldrain_log.exception("✗ Folder processing failed")
             return DownloadResult(success=False, reason="folder_error")
     
     def _extract_episode_from_filename(self, filename, folder_regex, discord_regex):
@@ -357,7 +2106,7 @@ class PixeldrainDownloader:
             if match:
                 try:
                     ep_num = int(match.group(1))
-                    print(f"[PIXELDRAIN] Matched (folder_regex): EP{ep_num} - {filename}")
+                    pixeldrain_log.debug("Matched (folder_regex): EP%d - %s", ep_num, filename)
                     return ep_num
                 except (ValueError, IndexError):
                     pass
@@ -368,7 +2117,7 @@ class PixeldrainDownloader:
             if match:
                 try:
                     ep_num = int(match.group(1))
-                    print(f"[PIXELDRAIN] Matched (discord_regex): EP{ep_num} - {filename}")
+                    pixeldrain_log.debug("Matched (discord_regex): EP%d - %s", ep_num, filename)
                     return ep_num
                 except (ValueError, IndexError):
                     pass
@@ -376,10 +2125,10 @@ class PixeldrainDownloader:
         # Try common patterns third
         ep_num = self._extract_episode_common_patterns(filename)
         if ep_num is not None:
-            print(f"[PIXELDRAIN] Matched (common pattern): EP{ep_num} - {filename}")
+            pixeldrain_log.debug("Matched (common pattern): EP%d - %s", ep_num, filename)
             return ep_num
         
-        print(f"[PIXELDRAIN] No match: {filename}")
+        pixeldrain_log.debug("No match: %s", filename)
         return None
     
     def _extract_episode_common_patterns(self, filename):
@@ -407,100 +2156,200 @@ class PixeldrainDownloader:
         
         return None
     
-    def _download_multiple_episodes(self, files_with_episodes, path, last_episode):
-        """Download all episodes > last_episode from folder."""
-        print(f"[PIXELDRAIN] Multiple download mode: episodes > {last_episode}")
+    def _download_multiple_episodes(self, files_with_episodes, path, last_episode, list_id=None, folder_bytes=0):
+        """
+        Download all episodes > last_episode from folder. When enough of the
+        folder is new (PIXELDRAIN_ARCHIVE_MIN_FILES/_MIN_SHARE) it is fetched
+        as one zip first; episodes the archive did not deliver fall back to
+        one request each, in the same order and with the same stop on fail.
+        Files already in `path` with the listed size (delivered by an archive
+        of an earlier attempt that stopped before them) are not fetched again.
+        """
+        pixeldrain_log.info("Multiple download mode: episodes > %s", last_episode)
         
-        to_download = [f for f in files_with_episodes if f['episode'] > last_episode]
+        to_download = [f for f in files_with_episodes if f.episode > last_episode]
         
         if not to_download:
-            print(f"[PIXELDRAIN] ✗ No new episodes (all <= {last_episode})")
+            pixeldrain_log.info("✗ No new episodes (all <= %s)", last_episode)
             return DownloadResult(success=False, reason="no_new_episodes")
         
-        print(f"[PIXELDRAIN] Found {len(to_download)} new episodes to download")
+        pixeldrain_log.info("Found %d new episodes to download", len(to_download))
+        
+        on_disk = {f.name for f in to_download if f.size and _file_size(os.path.join(path, f.name)) == f.size}
+        missing = [f for f in to_download if f.name not in on_disk]
+        extracted = set()
+        selected_bytes = sum(f.size or 0 for f in missing)
+        if (list_id and PIXELDRAIN_ARCHIVE_MIN_FILES and len(missing) >= PIXELDRAIN_ARCHIVE_MIN_FILES
+                and selected_bytes >= PIXELDRAIN_ARCHIVE_MIN_SHARE * folder_bytes):
+            archive = in_flight.run(("pixeldrain", f"list:{list_id}", path),
+                                    lambda: self._download_archive(list_id, missing, path))
+            extracted = set(archive.files or ())
         
         highest_episode = last_episode
         successful_count = 0
+        downloaded = []
         
         for idx, file_info in enumerate(to_download, 1):
-            ep_num = file_info['episode']
-            file_id = file_info['file_data'].get('id', '')
-            filename = file_info['filename']
+            ep_num = file_info.episode
             
-            print(f"\n[PIXELDRAIN] Downloading {idx}/{len(to_download)}: EP{ep_num}")
-            result = self._download_file_by_id(file_id, filename, path)
+            if file_info.name in extracted:
+                result = DownloadResult(success=True, filename=file_info.name)
+            elif file_info.name in on_disk:
+                pixeldrain_log.info("EP%d is already in %s, not downloading it again", ep_num, path)
+                result = DownloadResult(success=True, filename=file_info.name)
+            else:
+                pixeldrain_log.info("Downloading %d/%d: EP%d", idx, len(to_download), ep_num)
+                result = self._download_file_by_id(file_info.id, file_info.name, path, file_info.size)
             
             if result.success:
                 highest_episode = ep_num
                 successful_count += 1
-                print(f"[PIXELDRAIN] ✓ EP{ep_num} downloaded, updating last_episode")
+                downloaded.append((ep_num, result.filename))
+                pixeldrain_log.info("✓ EP%d downloaded, updating last_episode", ep_num)
                 # Note: last_episode will be updated by caller after each success
             else:
-                print(f"[PIXELDRAIN] ✗ EP{ep_num} failed: {result.reason}")
-                print(f"[PIXELDRAIN] Stopping multiple download (stop on fail)")
+                pixeldrain_log.warning("✗ EP%d failed: %s, stopping multiple download (stop on fail)",
+                                       ep_num, result.reason)
+                # Later episodes the archive already delivered and checked stay on disk unreported,
+                # so last_episode does not skip this one; the next attempt finds them in `path`
+                kept = [later.name for later in to_download[idx:] if later.name in extracted]
+                if kept:
+                    pixeldrain_log.info("Keeping %d later episode(s) from the archive for the next attempt",
+                                        len(kept))
                 break
         
         if successful_count > 0:
             return DownloadResult(
                 success=True,
                 filename=f"EP{highest_episode}",  # Caller will parse this
-                reason=None
+                reason=None,
+                files=downloaded
             )
+        elif result.reason == "insufficient_space":
+            return result  # let the caller defer or reroute
         else:
             return DownloadResult(success=False, reason="all_downloads_failed")
     
+    def _download_archive(self, list_id, to_download, path):
+        """
+        Stream the whole list as one zip (/api/list/{id}/zip) and extract the
+        members in `to_download` into `path` as they arrive. The result's
+        `files` are the member names extracted, even on failure; whatever is
+        missing is left to per-file downloads.
+        """
+        import requests
+        transfer = current_transfer()
+        url = f"{self.base_url}/api/list/{list_id}/zip"
+        wanted = {f.name: f.size for f in to_download}
+        extractor = ZipExtractor(path, wanted, transfer.part_path, pixeldrain_log)
+        known = [size for size in wanted.values() if size]
+        try:
+            pixeldrain_log.info("Downloading %d files as one archive...", len(wanted))
+            with requests.get(url, stream=True, timeout=30) as response:
+                response.raise_for_status()
+                
+                reservation = disk_space.reserve(path, sum(known) or None, pixeldrain_log)
+                if reservation is None:
+                    return DownloadResult(success=False, reason="insufficient_space")
+                
+                def reopen(offset):
+                    # Archives are built on the fly; a restart reads past what is already extracted
+                    resumed = requests.get(url, stream=True, timeout=30)
+                    resumed.raise_for_status()
+                    return resumed
+                
+                with reservation:
+                    stream_to_file(transfer, response, extractor, reopen, pixeldrain_log)
+            
+            if not extractor.complete:
+                pixeldrain_log.warning("⚠ Archive ended early, %d/%d files extracted",
+                                       len(extractor.extracted), len(wanted))
+                return DownloadResult(success=False, reason="download_error", files=list(extractor.extracted))
+            pixeldrain_log.info("✓ Archive done, %d/%d files extracted", len(extractor.extracted), len(wanted))
+            return DownloadResult(success=True, files=list(extractor.extracted))
+        
+        except DownloadCancelled:
+            pixeldrain_log.info("Archive download cancelled")
+            return DownloadResult(success=False, reason="cancelled", files=list(extractor.extracted))
+        except TransferStalled:
+            pixeldrain_log.error("✗ Archive download stalled")
+            return DownloadResult(success=False, reason="stalled", files=list(extractor.extracted))
+        except requests.exceptions.Timeout:
+            pixeldrain_log.error("✗ Archive download timeout")
+            return DownloadResult(success=False, reason="timeout", files=list(extractor.extracted))
+        except OSError as e:
+            if _is_disk_full(e):
+                pixeldrain_log.error("✗ Disk full while extracting into %s", path)
+                return DownloadResult(success=False, reason="insufficient_space", files=list(extractor.extracted))
+            pixeldrain_log.exception("✗ Archive download failed")
+            return DownloadResult(success=False, reason="download_error", files=list(extractor.extracted))
+        except Exception:
+            pixeldrain_log.exception("✗ Archive download failed")
+            return DownloadResult(success=False, reason="download_error", files=list(extractor.extracted))
+        finally:
+            extractor.close()
+    
     def _download_single_episode_from_folder(self, files_with_episodes, path, episode):
         """Download specific episode from folder."""
-        print(f"[PIXELDRAIN] Single download mode: looking for EP{episode}")
+        pixeldrain_log.info("Single download mode: looking for EP%s", episode)
         
         matched = None
         for file_info in files_with_episodes:
-            if file_info['episode'] == episode:
+            if file_info.episode == episode:
                 matched = file_info
                 break
         
         if not matched:
-            print(f"[PIXELDRAIN] ✗ EP{episode} not found in folder")
+            pixeldrain_log.warning("✗ EP%s not found in folder", episode)
             return DownloadResult(success=False, reason="episode_not_found")
         
-        print(f"[PIXELDRAIN] ✓ Found EP{episode}: {matched['filename']}")
+        pixeldrain_log.info("✓ Found EP%s: %s", episode, matched.name)
+        resolved_target(file_id=matched.id, filename=matched.name, size=matched.size)
         
-        file_id = matched['file_data'].get('id', '')
-        filename = matched['filename']
-        
-        return self._download_file_by_id(file_id, filename, path)
+        return self._download_file_by_id(matched.id, matched.name, path, matched.size)
     
     def _download_single_file(self, link, path, entry_name, episode):
         """Download a single file from Pixeldrain."""
+        import requests
         # Extract file ID
-        file_id = link.replace("https://pixeldrain.com/u/", "").split("/")[0].split("?")[0]
-        print(f"[PIXELDRAIN] File ID: {file_id}")
+        file_id = link.split("/u/", 1)[-1].split("/")[0].split("?")[0]
+        pixeldrain_log.info("File ID: %s", file_id)
         
         # Get filename from API
         try:
             info_response = requests.get(
-                f"https://pixeldrain.com/api/file/{file_id}/info",
+                f"{self.base_url}/api/file/{file_id}/info",
                 timeout=10
             )
             info_response.raise_for_status()
             info = info_response.json()
             filename = info.get('name', f"{entry_name}_EP{episode:02d}.mkv")
-            print(f"[PIXELDRAIN] Original filename: {filename}")
+            size = info.get('size')
+            pixeldrain_log.info("Original filename: %s", filename)
         except Exception as e:
-            print(f"[PIXELDRAIN] ⚠ Failed to get info: {e}, using fallback name")
+            pixeldrain_log.warning("⚠ Failed to get info: %s, using fallback name", e)
             filename = f"{entry_name}_EP{episode:02d}.mkv"
+            size = None
+        resolved_target(file_id=file_id, filename=filename, size=size)
         
-        return self._download_file_by_id(file_id, filename, path)
+        return self._download_file_by_id(file_id, filename, path, size)
+    
+    def _download_file_by_id(self, file_id, filename, path, size=None):
+        """Common download logic for both single files and list items (size from /info, if known)."""
+        return in_flight.run(("pixeldrain", file_id, path),
+                             lambda: self._transfer_file(file_id, filename, path, size))
     
-    def _download_file_by_id(self, file_id, filename, path):
-        """Common download logic for both single files and list items."""
+    def _transfer_file(self, file_id, filename, path, size=None):
+        import requests
+        transfer = current_transfer()
+        filepath = os.path.join(path, filename)
+        part_path = transfer.part_path(filepath)
         try:
-            print(f"[PIXELDRAIN] Downloading {filename}...")
-            filepath = os.path.join(path, filename)
+            pixeldrain_log.info("Downloading %s...", filename)
             
             # Stream download to avoid loading entire file in memory
             with requests.get(
-                f"https://pixeldrain.com/api/file/{file_id}",
+                f"{self.base_url}/api/file/{file_id}",
                 stream=True,
                 timeout=30
             ) as response:
@@ -511,173 +2360,273 @@ class PixeldrainDownloader:
                 if 'application/json' in content_type:
                     error_data = response.json()
                     if 'quota' in str(error_data).lower():
-                        print(f"[PIXELDRAIN] ✗ Quota exceeded")
+                        pixeldrain_log.warning("✗ Quota exceeded")
                         return DownloadResult(success=False, reason="quota_exceeded")
                 
+                # Make sure it fits before writing anything
+                size = size or int(response.headers.get('Content-Length') or 0) or None
+                reservation = disk_space.reserve(path, size, pixeldrain_log)
+                if reservation is None:
+                    return DownloadResult(success=False, reason="insufficient_space")
+                
+                def reopen(offset):
+                    resumed = requests.get(f"{self.base_url}/api/file/{file_id}", stream=True, timeout=30,
+                                           headers={"Range": f"bytes={offset}-"} if offset else None)
+                    resumed.raise_for_status()
+                    return resumed
+                
                 # Stream to file in chunks
-                with open(filepath, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
+                with reservation, open(part_path, 'wb') as f:
+                    stream_to_file(transfer, response, f, reopen, pixeldrain_log)
             
+            os.replace(part_path, filepath)
             os.chmod(filepath, 0o754)
-            print(f"[PIXELDRAIN] ✓ Downloaded: {filename}")
+            pixeldrain_log.info("✓ Downloaded: %s", filename)
             return DownloadResult(success=True, filename=filename)
             
+        except DownloadCancelled:
+            _remove_partial(part_path)
+            pixeldrain_log.info("Download of %s cancelled", filename)
+            return DownloadResult(success=False, reason="cancelled")
+        except TransferStalled:
+            _remove_partial(part_path)
+            pixeldrain_log.error("✗ Download of %s stalled", filename)
+            return DownloadResult(success=False, reason="stalled")
         except requests.exceptions.Timeout:
-            print(f"[PIXELDRAIN] ✗ Download timeout")
+            pixeldrain_log.error("✗ Download timeout")
             return DownloadResult(success=False, reason="timeout")
-        except Exception as e:
-            print(f"[PIXELDRAIN] ✗ Download failed: {e}")
-            import traceback
-            traceback.print_exc()
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                pixeldrain_log.error("✗ Pixeldrain file %s not found", file_id)
+                return DownloadResult(success=False, reason="not_found")
+            pixeldrain_log.exception("✗ Download failed")
+            return DownloadResult(success=False, reason="download_error")
+        except OSError as e:
+            if not _is_disk_full(e):
+                pixeldrain_log.exception("✗ Download failed")
+                return DownloadResult(success=False, reason="download_error")
+            _remove_partial(part_path)
+            pixeldrain_log.error("✗ Disk full while writing %s", filepath)
+            return DownloadResult(success=False, reason="insufficient_space")
+        except Exception:
+            pixeldrain_log.exception("✗ Download failed")
             return DownloadResult(success=False, reason="download_error")
 
 
 class GoogleDriveDownloader:
     """Downloads from Google Drive without external libraries."""
     
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+    def __init__(self, usercontent_url="https://drive.usercontent.google.com",
+                 drive_url="https://drive.google.com"):
+        # Both hosts are overridable so benchmarks can point at fake_servers.py
+        self.usercontent_url = usercontent_url.rstrip("/")
+        self.drive_url = drive_url.rstrip("/")
+        self._session = None
+
+    @property
+    def session(self):
+        """requests.Session, created on first use."""
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+            self._session.headers.update({
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            })
+        return self._session
     
-    def download(self, link, path, entry_name, episode):
+    def download(self, link, path, entry_name, episode, target=None):
         """
         Args:
             link: Google Drive URL (any format)
             path: Absolute directory path
             entry_name: Series name for fallback naming
             episode: Episode number for fallback naming
+            target: Resolved target from an earlier attempt (file_id, url, filename, size)
         Returns:
             DownloadResult
         """
+        import requests
         file_id = self._extract_file_id(link)
         if not file_id:
-            print("[GDRIVE] ✗ Could not extract file ID from URL")
+            gdrive_log.error("✗ Could not extract file ID from URL")
             return DownloadResult(success=False, reason="invalid_link")
         
-        print(f"[GDRIVE] File ID: {file_id}")
+        gdrive_log.info("File ID: %s", file_id)
+        transfer = current_transfer()
+        part_path = None
         
         try:
-            # Try the usercontent.google.com domain first (direct download)
-            download_url = f"https://drive.usercontent.google.com/download?id={file_id}&export=download&authuser=0"
+            cached = usable_target(target, "url")
+            response = None
+            if cached and cached.get("file_id") == file_id:
+                gdrive_log.info("Reusing resolved download URL")
+                response = self.session.get(cached["url"], stream=True, timeout=30)
+                if not response.ok or 'text/html' in response.headers.get('Content-Type', ''):
+                    gdrive_log.info("Resolved URL no longer serves the file (HTTP %d), resolving again",
+                                    response.status_code)
+                    response.close()
+                    response = None
+            if response is None:
+                response = self._open(file_id)
+                if isinstance(response, DownloadResult):
+                    return response
             
-            print(f"[GDRIVE] Attempting direct download from usercontent.google.com...")
-            response = self.session.get(download_url, stream=True, timeout=30, allow_redirects=True)
+            # Determine filename
+            filename = self._determine_filename(response, file_id, entry_name, episode)
+            gdrive_log.info("Filename: %s", filename)
             
-            # Check content type
-            content_type = response.headers.get('Content-Type', '')
-            
-            # If we got HTML, try the traditional drive.google.com URL
-            if 'text/html' in content_type:
-                print(f"[GDRIVE] Got HTML from usercontent, trying drive.google.com...")
-                
-                # Read a bit to check for errors
-                first_chunk = next(response.iter_content(chunk_size=4096), b'')
-                html_preview = first_chunk.decode('utf-8', errors='ignore').lower()
-                
-                # Check for quota
-                if 'quota' in html_preview or 'download quota' in html_preview:
-                    print("[GDRIVE] ✗ Quota exceeded")
-                    return DownloadResult(success=False, reason="quota_exceeded")
-                
-                # Try alternative approach with confirm=t
-                print(f"[GDRIVE] Trying with confirm=t parameter...")
-                download_url = f"https://drive.usercontent.google.com/download?id={file_id}&export=download&authuser=0&confirm=t"
-                response = self.session.get(download_url, stream=True, timeout=30, allow_redirects=True)
-                
-                content_type = response.headers.get('Content-Type', '')
-                
-                # Still HTML? This means it really needs the old-style confirmation
-                if 'text/html' in content_type:
-                    print(f"[GDRIVE] Still HTML, trying legacy confirmation method...")
-                    
-                    # Get the full HTML to parse
-                    legacy_url = f"https://drive.google.com/uc?id={file_id}&export=download"
-                    response = self.session.get(legacy_url, timeout=30)
-                    
-                    # Check for quota in HTML
-                    html_content = response.text
-                    if 'quota' in html_content.lower() or 'download quota' in html_content.lower():
-                        print("[GDRIVE] ✗ Quota exceeded")
-                        return DownloadResult(success=False, reason="quota_exceeded")
-                    
-                    # Try to extract confirm token
-                    confirm_token = self._extract_confirm_token(html_content)
-                    
-                    if confirm_token:
-                        print(f"[GDRIVE] Found confirm token: {confirm_token[:20]}...")
-                        
-                        # Try multiple confirmation URL formats
-                        confirm_urls = [
-                            f"https://drive.usercontent.google.com/download?id={file_id}&export=download&authuser=0&confirm={confirm_token}",
-                            f"https://drive.google.com/uc?export=download&id={file_id}&confirm={confirm_token}",
-                        ]
-                        
-                        for confirm_url in confirm_urls:
-                            print(f"[GDRIVE] Trying confirmation URL...")
-                            response = self.session.get(confirm_url, stream=True, timeout=30, allow_redirects=True)
-                            content_type = response.headers.get('Content-Type', '')
-                            
-                            if 'text/html' not in content_type:
-                                print(f"[GDRIVE] ✓ Confirmation successful")
-                                break
-                        else:
-                            print("[GDRIVE] ✗ All confirmation attempts failed")
-                            return DownloadResult(success=False, reason="confirmation_failed")
-                    else:
-                        print("[GDRIVE] ✗ Could not find confirmation token")
-                        return DownloadResult(success=False, reason="confirmation_failed")
+            # Stream download to file
+            filepath = os.path.join(path, filename)
+            part_path = transfer.part_path(filepath)
+            gdrive_log.info("Downloading to %s...", filepath)
             
-            # At this point we should have the actual file stream
-            # Verify we didn't get HTML
-            content_type = response.headers.get('Content-Type', '')
-            if 'text/html' in content_type:
-                print(f"[GDRIVE] ✗ Still receiving HTML, cannot download")
-                return DownloadResult(success=False, reason="html_response")
+            size = int(response.headers.get('Content-Length') or 0) or None
+            file_url = response.url  # after redirects, the URL that serves the bytes
+            resolved_target(RESOLVED_URL_TTL, file_id=file_id, url=file_url, filename=filename, size=size)
             
-            # Determine filename
-            filename = self._determine_filename(response, file_id, entry_name, episode)
-            print(f"[GDRIVE] Filename: {filename}")
+            reservation = disk_space.reserve(path, size, gdrive_log)
+            if reservation is None:
+                response.close()
+                return DownloadResult(success=False, reason="insufficient_space")
             
-            # Stream download to file
-            filepath = os.path.join(path, filename)
-            print(f"[GDRIVE] Downloading to {filepath}...")
+            def reopen(offset):
+                resumed = self.session.get(file_url, stream=True, timeout=30,
+                                           headers={"Range": f"bytes={offset}-"} if offset else None)
+                resumed.raise_for_status()
+                return resumed
             
-            total_size = 0
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        total_size += len(chunk)
+            with reservation, open(part_path, 'wb') as f:
+                total_size = stream_to_file(transfer, response, f, reopen, gdrive_log)
             
-            print(f"[GDRIVE] Downloaded {total_size} bytes ({total_size / (1024*1024):.2f} MB)")
+            gdrive_log.info("Downloaded %d bytes (%.2f MB)", total_size, total_size / (1024*1024))
             
             # Verify we got a real file (not tiny HTML error page)
             if total_size < 10000:
-                print(f"[GDRIVE] ⚠ Warning: File size is very small ({total_size} bytes), checking content...")
-                with open(filepath, 'r', errors='ignore') as f:
+                gdrive_log.warning("⚠ File size is very small (%d bytes), checking content...", total_size)
+                with open(part_path, 'r', errors='ignore') as f:
                     content_preview = f.read(500).lower()
                     if 'html' in content_preview or '<html' in content_preview:
-                        print(f"[GDRIVE] ✗ Downloaded HTML instead of file")
-                        os.remove(filepath)
+                        gdrive_log.error("✗ Downloaded HTML instead of file")
+                        os.remove(part_path)
                         return DownloadResult(success=False, reason="html_instead_of_file")
             
+            os.replace(part_path, filepath)
             os.chmod(filepath, 0o754)
-            print(f"[GDRIVE] ✓ Downloaded: {filename}")
+            gdrive_log.info("✓ Downloaded: %s", filename)
             return DownloadResult(success=True, filename=filename)
             
+        except DownloadCancelled:
+            if part_path:
+                _remove_partial(part_path)
+            gdrive_log.info("Download cancelled")
+            return DownloadResult(success=False, reason="cancelled")
+        except TransferStalled:
+            if part_path:
+                _remove_partial(part_path)
+            gdrive_log.error("✗ Download stalled")
+            return DownloadResult(success=False, reason="stalled")
         except requests.exceptions.Timeout:
-            print("[GDRIVE] ✗ Download timeout")
+            gdrive_log.error("✗ Download timeout")
             return DownloadResult(success=False, reason="timeout")
-        except Exception as e:
-            print(f"[GDRIVE] ✗ Download failed: {e}")
-            import traceback
-            traceback.print_exc()
+        except OSError as e:
+            if not _is_disk_full(e):
+                gdrive_log.exception("✗ Download failed")
+                return DownloadResult(success=False, reason="download_error")
+            if part_path:
+                _remove_partial(part_path)
+            gdrive_log.error("✗ Disk full while writing to %s", path)
+            return DownloadResult(success=False, reason="insufficient_space")
+        except Exception:
+            if part_path:
+                _remove_partial(part_path)
+            gdrive_log.exception("✗ Download failed")
             return DownloadResult(success=False, reason="download_error")
     
+    def _open(self, file_id):
+        """
+        Walk Drive's download chain (usercontent, confirm=t, legacy confirm
+        token) to the response that streams the file. Returns that response,
+        or a failed DownloadResult.
+        """
+        # Try the usercontent.google.com domain first (direct download)
+        download_url = f"{self.usercontent_url}/download?id={file_id}&export=download&authuser=0"
+        
+        gdrive_log.debug("Attempting direct download from usercontent.google.com...")
+        response = self.session.get(download_url, stream=True, timeout=30, allow_redirects=True)
+        
+        # Check content type
+        content_type = response.headers.get('Content-Type', '')
+        
+        # If we got HTML, try the traditional drive.google.com URL
+        if 'text/html' in content_type:
+            gdrive_log.debug("Got HTML from usercontent, trying drive.google.com...")
+            
+            # Read a bit to check for errors
+            first_chunk = next(response.iter_content(chunk_size=4096), b'')
+            html_preview = first_chunk.decode('utf-8', errors='ignore').lower()
+            
+            # Check for quota
+            if 'quota' in html_preview or 'download quota' in html_preview:
+                gdrive_log.warning("✗ Quota exceeded")
+                return DownloadResult(success=False, reason="quota_exceeded")
+            
+            # Try alternative approach with confirm=t
+            gdrive_log.debug("Trying with confirm=t parameter...")
+            download_url = f"{self.usercontent_url}/download?id={file_id}&export=download&authuser=0&confirm=t"
+            response = self.session.get(download_url, stream=True, timeout=30, allow_redirects=True)
+            
+            content_type = response.headers.get('Content-Type', '')
+            
+            # Still HTML? This means it really needs the old-style confirmation
+            if 'text/html' in content_type:
+                gdrive_log.debug("Still HTML, trying legacy confirmation method...")
+                
+                # Get the full HTML to parse
+                legacy_url = f"{self.drive_url}/uc?id={file_id}&export=download"
+                response = self.session.get(legacy_url, timeout=30)
+                
+                # Check for quota in HTML
+                html_content = response.text
+                if 'quota' in html_content.lower() or 'download quota' in html_content.lower():
+                    gdrive_log.warning("✗ Quota exceeded")
+                    return DownloadResult(success=False, reason="quota_exceeded")
+                
+                # Try to extract confirm token
+                confirm_token = self._extract_confirm_token(html_content)
+                
+                if confirm_token:
+                    gdrive_log.debug("Found confirm token: %s...", confirm_token[:20])
+                    
+                    # Try multiple confirmation URL formats
+                    confirm_urls = [
+                        f"{self.usercontent_url}/download?id={file_id}&export=download&authuser=0&confirm={confirm_token}",
+                        f"{self.drive_url}/uc?export=download&id={file_id}&confirm={confirm_token}",
+                    ]
+                    
+                    for confirm_url in confirm_urls:
+                        gdrive_log.debug("Trying confirmation URL...")
+                        response = self.session.get(confirm_url, stream=True, timeout=30, allow_redirects=True)
+                        content_type = response.headers.get('Content-Type', '')
+                        
+                        if 'text/html' not in content_type:
+                            gdrive_log.info("✓ Confirmation successful")
+                            break
+                    else:
+                        gdrive_log.error("✗ All confirmation attempts failed")
+                        return DownloadResult(success=False, reason="confirmation_failed")
+                else:
+                    gdrive_log.error("✗ Could not find confirmation token")
+                    return DownloadResult(success=False, reason="confirmation_failed")
+        
+        # At this point we should have the actual file stream
+        # Verify we didn't get HTML
+        content_type = response.headers.get('Content-Type', '')
+        if 'text/html' in content_type:
+            gdrive_log.error("✗ Still receiving HTML, cannot download")
+            return DownloadResult(success=False, reason="html_response")
+        
+        return response
+    
     def _extract_file_id(self, url):
         """Parse various Google Drive URL formats."""
         # Handle drive.usercontent.google.com format
@@ -719,13 +2668,14 @@ class GoogleDriveDownloader:
     
     def _determine_filename(self, response, file_id, entry_name, episode):
         """Multi-strategy filename detection."""
+        from urllib.parse import unquote
         # Strategy 1: Content-Disposition header (most reliable)
         content_disp = response.headers.get('Content-Disposition', '')
         if content_disp:
             # Try UTF-8 encoded filename first
             match = re.search(r"filename\*=UTF-8''([^;]+)", content_disp)
             if match:
-                filename = requests.utils.unquote(match.group(1))
+                filename = unquote(match.group(1))
                 if filename and filename != "download":
                     return filename
             
@@ -761,8 +2711,14 @@ def get_downloader(platform):
 # RETRY QUEUE MANAGEMENT
 # ============================================================================
 
-def add_to_retry_queue(entry_name, episode, platform, link, path, channel_id, reason):
-    """Add failed download to retry queue."""
+def add_to_retry_queue(entry_name, episode, platform, link, path, channel_id, reason, hours=4,
+                       target=None, folder=None, section=None):
+    """
+    Add failed download to retry queue, first retry after `hours`. `target`
+    is what the link resolved to (see resolved_target()), reused by the
+    retry; `folder` the folder arguments from folder_context(); `section`
+    the settings.json section of the entry (names are only unique per section).
+    """
     retry_item = {
         "entry_name": entry_name,
         "episode": episode,
@@ -771,19 +2727,27 @@ def add_to_retry_queue(entry_name, episode, platform, link, path, channel_id, re
         "path": path,
         "channel_id": channel_id,
         "attempts": 1,
-        "next_retry": (datetime.now() + timedelta(hours=4)).isoformat(),
+        "next_retry": (datetime.now() + timedelta(hours=hours)).isoformat(),
         "reason": reason
     }
+    if section is not None:
+        retry_item["section"] = section
+    if target:
+        retry_item["target"] = target
+    if folder:
+        retry_item["folder"] = folder
     
-    if "retry_queue" not in config:
-        config["retry_queue"] = []
-    
-    config["retry_queue"].append(retry_item)
-    save_config()
+    with config_lock:
+        if "retry_queue" not in config:
+            config["retry_queue"] = []
+        
+        config["retry_queue"].append(retry_item)
+        save_config()
     
-    print(f"[QUEUE] Added to retry queue: {entry_name} EP{episode} ({platform})")
-    print(f"[QUEUE] Channel: {channel_id}, URL: {link}")
-    print(f"[QUEUE] Reason: {reason}, Next retry: {retry_item['next_retry']}")
+    queue_log.info("Added to retry queue: %s EP%s (%s), reason: %s, next retry: %s",
+                   entry_name, episode, platform, reason, retry_item["next_retry"],
+                   extra={"entry": entry_name, "episode": episode, "platform": platform,
+                          "channel_id": channel_id, "link": link, "reason": reason})
 
 
 def process_retry_queue():
@@ -793,419 +2757,2449 @@ def process_retry_queue():
     
     now = datetime.now()
     items_to_remove = []
+    changed = False  # any item's state (target, attempts, next_retry) to save
     
-    print(f"[QUEUE] Processing retry queue ({len(config['retry_queue'])} items)...")
+    queue_log.debug("Processing retry queue (%d items)...", len(config["retry_queue"]))
     
-    for i, item in enumerate(config["retry_queue"]):
+    # Iterate over a copy: a settings.json reload may replace the queue meanwhile.
+    # Higher priority (set through the control API) first.
+    for item in sorted(config["retry_queue"], key=lambda queued: -queued.get("priority", 0)):
+        if not owns_retry_item(item):
+            continue  # another worker's shard
+        
+        if item.get("paused"):
+            continue
+        
         next_retry = datetime.fromisoformat(item["next_retry"])
         
         if now < next_retry:
             continue  # Not time yet
         
-        print(f"\n[QUEUE] Retrying: {item['entry_name']} EP{item['episode']} ({item['platform']})")
-        print(f"[QUEUE] Attempt {item['attempts']}/{MAX_RETRY}")
-        print(f"[QUEUE] Channel: {item['channel_id']}, URL: {item['link']}")
+        item_fields = {"entry": item["entry_name"], "episode": item["episode"], "platform": item["platform"],
+                       "channel_id": item["channel_id"], "link": item["link"]}
+        queue_log.info("Retrying: %s EP%s (%s), attempt %d/%d",
+                       item["entry_name"], item["episode"], item["platform"], item["attempts"], MAX_RETRY,
+                       extra=item_fields)
         
         # Attempt download
         downloader = get_downloader(item["platform"])
         if not downloader:
-            print(f"[QUEUE] ✗ Unknown platform: {item['platform']}")
-            items_to_remove.append(i)
+            queue_log.error("✗ Unknown platform: %s", item["platform"], extra=item_fields)
+            items_to_remove.append(item)
             continue
         
-        result = downloader.download(
-            item["link"],
-            item["path"],
-            item["entry_name"],
-            item["episode"]
-        )
+        # Folder arguments as the entry has them now, else as they were when the item was queued
+        section, entry = retry_item_entry(item)
+        folder = (folder_context(entry, item["platform"]) if entry is not None else None) or item.get("folder")
+        download_args = {
+            "link": item["link"],
+            "entry_name": item["entry_name"],
+            "episode": item["episode"],
+            "target": item.get("target")
+        }
+        if folder:
+            download_args.update(folder, last_episode=entry.get("last_episode", 0) if entry is not None else 0)
         
-        if result.success:
-            print(f"[QUEUE] ✓ Retry successful! Removing from queue.")
-            items_to_remove.append(i)
-            
-            # Update last_episode in config
-            for section, data in config.items():
-                if section == "retry_queue":
-                    continue
-                if "entries" in data:
-                    for entry in data["entries"]:
-                        if entry["name"] == item["entry_name"]:
-                            entry["last_episode"] = item["episode"]
-                            break
+        job = Job(item["entry_name"], item["episode"], item["channel_id"], source="retry",
+                  priority=item.get("priority", 0))
+        transfer = job.attach(Transfer(f"{item['entry_name']} EP{item['episode']}", item["platform"]))
+        # Same volumes as a first attempt: an insufficient_space item may fit on a fallback path by now
+        paths = [item["path"], *(entry.get("fallback_paths", []) if entry is not None else [])]
+        ran = []
         
-        elif result.reason == "quota_exceeded":
-            # Increment attempts and schedule next retry
-            item["attempts"] += 1
-            
-            if item["attempts"] >= MAX_RETRY:
-                print(f"[QUEUE] ✗ Max retries ({MAX_RETRY}) reached. Giving up.")
-                print(f"[QUEUE] Failed item: {item['entry_name']} EP{item['episode']}")
-                print(f"[QUEUE] Channel: {item['channel_id']}, URL: {item['link']}")
-                items_to_remove.append(i)
-            else:
-                item["next_retry"] = (datetime.now() + timedelta(hours=4)).isoformat()
-                print(f"[QUEUE] Still quota limited. Next retry: {item['next_retry']}")
+        def attempt():
+            jobs.acquire(job)
+            if job.cancelled:
+                return DownloadResult(success=False, reason="cancelled")
+            ran.append(True)
+            with tracking(transfer):
+                try:
+                    result = download_to_paths(item["platform"], download_args, paths,
+                                               f"{item['entry_name']} EP{item['episode']}", queue_log)
+                finally:
+                    transfer.finished = time.monotonic()
+            result.platform = item["platform"]
+            if result.reason != "cancelled":
+                platform_stats.record(item["platform"], item["link"], transfer, result)
+            return result
         
-        else:
-            # Other error - increment and retry sooner (1 hour)
-            item["attempts"] += 1
+        try:
+            result = in_flight.run(("episode", section, item["entry_name"], item["episode"]), attempt)
+        finally:
+            jobs.release(job)
+        
+        changed = True
+        # Items are shared with reload_config() and the control API: change them under the lock
+        with config_lock:
+            if transfer.target and transfer.target != item.get("target"):
+                item["target"] = transfer.target  # resolved again, or for the first time
             
-            if item["attempts"] >= MAX_RETRY:
-                print(f"[QUEUE] ✗ Max retries ({MAX_RETRY}) reached. Giving up.")
-                print(f"[QUEUE] Failed item: {item['entry_name']} EP{item['episode']}")
-                print(f"[QUEUE] Channel: {item['channel_id']}, URL: {item['link']}")
-                items_to_remove.append(i)
-            else:
+            if result.success:
+                queue_log.info("✓ Retry successful! Removing from queue.", extra=item_fields)
+                items_to_remove.append(item)
+                
+                # Update last_episode in config
+                if entry is not None:
+                    # A newer episode may have finished meanwhile; folder multi-downloads
+                    # report their highest episode as "EP{n}"
+                    episode = item["episode"]
+                    if folder and folder.get("download_multiple") and folder.get("share_type") == "folder":
+                        match = re.search(r'EP(\d+)', result.filename or "")
+                        if match:
+                            episode = max(episode, int(match.group(1)))
+                    entry["last_episode"] = max(entry.get("last_episode", 0), episode)
+            
+            elif result.reason == "cancelled":
+                # Cancelled through the control API: not an attempt, the item stays queued
                 item["next_retry"] = (datetime.now() + timedelta(hours=1)).isoformat()
-                print(f"[QUEUE] Error: {result.reason}. Next retry in 1 hour: {item['next_retry']}")
+                queue_log.info("Retry cancelled. Next retry: %s", item["next_retry"], extra=item_fields)
+            
+            elif result.reason == "quota_exceeded":
+                # Increment attempts and schedule next retry
+                item["attempts"] += 1
+                
+                if item["attempts"] >= MAX_RETRY:
+                    queue_log.error("✗ Max retries (%d) reached. Giving up on %s EP%s",
+                                    MAX_RETRY, item["entry_name"], item["episode"], extra=item_fields)
+                    items_to_remove.append(item)
+                else:
+                    item["next_retry"] = (datetime.now() + timedelta(hours=4)).isoformat()
+                    queue_log.info("Still quota limited. Next retry: %s", item["next_retry"], extra=item_fields)
+            
+            else:
+                # Other error - increment and retry sooner (1 hour)
+                item["attempts"] += 1
+                
+                if item["attempts"] >= MAX_RETRY:
+                    queue_log.error("✗ Max retries (%d) reached. Giving up on %s EP%s",
+                                    MAX_RETRY, item["entry_name"], item["episode"], extra=item_fields)
+                    items_to_remove.append(item)
+                else:
+                    item["next_retry"] = (datetime.now() + timedelta(hours=1)).isoformat()
+                    queue_log.warning("Error: %s. Next retry in 1 hour: %s", result.reason, item["next_retry"],
+                                      extra=item_fields)
+        
+        if result.success and entry is not None and ran:  # else the trigger whose download this was moves it
+            staging_mover.submit(entry, item["episode"], item["platform"], result, paths=paths)
+    
+    # Remove completed/failed items, and save what changed on the others (a resolved
+    # target, attempts, next_retry) so a restart or reload does not lose it
+    if items_to_remove or changed:
+        with config_lock:
+            config["retry_queue"][:] = [
+                queued for queued in config.get("retry_queue", [])
+                if not any(queued is removed for removed in items_to_remove)
+            ]
+            save_config()
+        if items_to_remove:
+            queue_log.info("Removed %d items from queue", len(items_to_remove))
+
+
+class RetryScheduler:
+    """
+    Runs process_retry_queue() on a thread of its own every `interval`
+    seconds, or right away after kick(), so handling a gateway message
+    never waits for a retry download.
+    """
     
-    # Remove completed/failed items
-    for i in reversed(items_to_remove):
-        config["retry_queue"].pop(i)
+    def __init__(self, interval=None):
+        self.interval = interval or RETRY_CHECK_SECONDS
+        self._wake = threading.Event()
+        self._thread = None
     
-    if items_to_remove:
-        save_config()
-        print(f"[QUEUE] Removed {len(items_to_remove)} items from queue")
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="retry-queue", daemon=True)
+        self._thread.start()
+        return self
+    
+    def kick(self):
+        """Check the queue now instead of at the next interval."""
+        self._wake.set()
+    
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                process_retry_queue()
+            except Exception:
+                queue_log.exception("✗ Retry queue processing failed")
 
 
 # ============================================================================
-# CONFIG LOADING
+# CONFIG LOADING / HOT RELOAD
 # ============================================================================
 
-CONFIG_PATH = os.path.join(os.path.dirname(__file__), "settings.json")
-with open(CONFIG_PATH, "r") as f:
-    raw = f.read()
-    # print("=== RAW CONTENT ===")
-    # print(repr(raw))
-    # print("=== END ===")
-    config = json.loads(raw)
-    # print("Loaded JSON OK.")
+config = {"retry_queue": []}
 
+# Guards config mutation, iteration and settings.json reads/writes. Never
+# held while downloading.
+config_lock = threading.RLock()
+
+_config_text = None        # settings.json content as last loaded/written by us
+_config_snapshot = {}      # parsed copy of _config_text, to tell user edits from runtime state
+_processor_cache = {}      # id(entry) -> MessageProcessor (compiled regexes)
+_channel_index = {}        # channel_id -> [entry, ...]
+_entry_keys = {}           # id(entry) -> (section, name)
+_channel_matchers = {}     # channel_id -> ChannelMatcher, rebuilt lazily after every reload
+_channel_index_for = None  # config object the index was built from
+_file_lock_fd = None       # settings.json.lock, held while reading-merging-writing
+_file_lock_depth = 0
+
+
+def load_config(path=None):
+    """Load settings.json (CONFIG_PATH unless `path` is given) into the module-level config."""
+    global config, CONFIG_PATH, _config_text, _config_snapshot
+    with config_lock:
+        if path:
+            CONFIG_PATH = path
+        with open(CONFIG_PATH, "r") as f:
+            _config_text = f.read()
+        config = json.loads(_config_text)
+        _config_snapshot = json.loads(_config_text)
+        _processor_cache.clear()
+        _rebuild_channel_index()
+    return config
 
-    # config = json.load(f)
 
 def save_config():
-    with open(CONFIG_PATH, "w") as f:
-        json.dump(config, f, indent=4)
+    """Write config to settings.json, merging in any external edit that has not been reloaded yet."""
+    with settings_file_lock():
+        if _config_text is not None and _read_config_text() not in (None, _config_text):
+            if not reload_config():
+                config_log.warning("Not saving: settings.json has invalid edits, runtime state kept in memory")
+                return
+        _write_config()
 
 
-# ============================================================================
-# MESSAGE HANDLER
-# ============================================================================
+@contextlib.contextmanager
+def settings_file_lock():
+    """
+    Hold config_lock plus an flock on settings.json.lock, so read-merge-write
+    cycles of several processes (--workers) never interleave. Re-entrant;
+    only the thread lock is taken where fcntl is unavailable.
+    """
+    global _file_lock_fd, _file_lock_depth
+    with config_lock:
+        if _file_lock_depth == 0:
+            try:
+                import fcntl
+            except ImportError:
+                fcntl = None
+            if fcntl is not None:
+                _file_lock_fd = os.open(f"{CONFIG_PATH}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(_file_lock_fd, fcntl.LOCK_EX)
+        _file_lock_depth += 1
+        try:
+            yield
+        finally:
+            _file_lock_depth -= 1
+            if _file_lock_depth == 0 and _file_lock_fd is not None:
+                os.close(_file_lock_fd)  # releases the flock
+                _file_lock_fd = None
 
-def handle_new_message(message):
-    """Process incoming Discord message across all configured entries."""
-    content = message.get('content', '')
-    channel_id = message['channel_id']
-    
-    # Process retry queue after handling new message
-    process_retry_queue()
-    
-    # Iterate through all sections and entries
-    for section, data in config.items():
-        if section == "retry_queue":
-            continue
-        
-        if "entries" not in data:
+
+def _read_config_text():
+    try:
+        with open(CONFIG_PATH, "r") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _write_config():
+    global _config_text, _config_snapshot
+    text = json.dumps(config, indent=4)
+    # Write a temp file and rename it, so the watcher (or a crash) never sees half a file
+    tmp_path = f"{CONFIG_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, CONFIG_PATH)
+    _config_text = text
+    _config_snapshot = json.loads(text)
+
+
+def _iter_entries(cfg):
+    """Yield (section, entry) for every entry in a settings dict."""
+    for section, data in cfg.items():
+        if section == "retry_queue" or not isinstance(data, dict):
             continue
-        
-        for entry in data["entries"]:
-            if entry["channel_id"] != channel_id:
-                continue
-            
-            print(f"\n[MATCH] Channel ID: {entry['channel_id']}")
-            print(f"[MATCH] Series: {entry['name']}")
-            
-            # Use MessageProcessor for analysis
-            processor = MessageProcessor(entry)
-            episode = processor.extract_episode(content)
-            
-            if not episode:
-                continue
-            
-            print(f"[MATCH] Episode {episode} detected (last: {entry.get('last_episode', 0)})")
-            
-            # Find all platform links in the message
-            platform_links = processor.find_platform_links(content)
-            
-            if not platform_links:
-                print(f"[SKIP] No matching links found for configured platforms")
-                continue
-            
-            print(f"[FOUND] Available platforms: {list(platform_links.keys())}")
-            
-            # Try platforms in priority order
-            download_success = False
-            for platform in processor.platforms:
-                if platform not in platform_links:
-                    continue
-                
-                download_link = platform_links[platform]
-                print(f"\n[DOWNLOAD] Trying {platform.upper()}")
-                print(f"[DOWNLOAD] {entry['name']} EP{episode}")
-                print(f"[DOWNLOAD] URL: {download_link}")
-                
-                # Get appropriate downloader
-                downloader = get_downloader(platform)
-                if not downloader:
-                    print(f"[ERROR] Unknown platform: {platform}")
-                    continue
-                
-                # Get platform-specific configuration
-                share_type = processor.get_platform_share_type(platform)
-                folder_regex = processor.get_platform_folder_regex(platform)
-                download_multiple = processor.get_platform_download_multiple(platform)
-                
-                # Prepare download arguments
-                download_args = {
-                    "link": download_link,
-                    "path": entry["path"],
-                    "entry_name": entry["name"],
-                    "episode": episode
-                }
-                
-                # Add folder-specific parameters for Pixeldrain
-                if platform == "pixeldrain":
-                    download_args.update({
-                        "share_type": share_type,
-                        "folder_regex": folder_regex,
-                        "download_multiple": download_multiple,
-                        "last_episode": entry.get("last_episode", 0),
-                        "discord_regex": processor.regex
-                    })
-                
-                # Attempt download
-                result = downloader.download(**download_args)
-                
-                if result.success:
-                    print(f"[SUCCESS] {entry['name']} EP{episode} downloaded from {platform}")
-                    
-                    # For multiple downloads, extract highest episode from result
-                    if download_multiple and share_type == "folder":
-                        # result.filename contains "EP{highest}" for multiple downloads
-                        match = re.search(r'EP(\d+)', result.filename)
-                        if match:
-                            highest_ep = int(match.group(1))
-                            entry["last_episode"] = highest_ep
-                            print(f"[UPDATE] last_episode = {highest_ep}")
-                        else:
-                            entry["last_episode"] = episode
-                    else:
-                        entry["last_episode"] = episode
-                    
-                    save_config()
-                    download_success = True
-                    break  # Success, don't try other platforms
-                
-                elif result.reason == "quota_exceeded":
-                    print(f"[QUOTA] {platform} quota exceeded, adding to retry queue")
-                    add_to_retry_queue(
-                        entry["name"],
-                        episode,
-                        platform,
-                        download_link,
-                        entry["path"],
-                        channel_id,
-                        "quota_exceeded"
-                    )
-                    # Try next platform
-                    continue
-                
-                else:
-                    print(f"[FAILED] {platform} download failed: {result.reason}")
-                    # Try next platform
-                    continue
-            
-            if not download_success:
-                print(f"[FAILED] All platforms failed for {entry['name']} EP{episode}")
+        for entry in data.get("entries", []):
+            yield section, entry
 
 
-# ============================================================================
-# MESSAGE SYNC / RECOVERY
-# ============================================================================
+def _entry_fingerprint(entry):
+    """Everything that affects matching/downloading, i.e. the entry minus runtime state."""
+    return json.dumps({k: v for k, v in entry.items() if k != "last_episode"}, sort_keys=True)
 
-def get_monitored_channel_ids():
-    """Collect all unique channel IDs from config entries."""
-    channel_ids = set()
-    for section, data in config.items():
+
+def validate_config(cfg):
+    """Returns a list of problems with a parsed settings dict (empty if valid)."""
+    if not isinstance(cfg, dict):
+        return ["top level must be an object"]
+    errors = []
+    seen = set()
+    if not isinstance(cfg.get("retry_queue", []), list):
+        errors.append("retry_queue must be a list")
+    for section, data in cfg.items():
         if section == "retry_queue":
             continue
-        if "entries" not in data:
+        if not isinstance(data, dict) or not isinstance(data.get("entries"), list):
+            errors.append(f"{section}: missing 'entries' list")
             continue
-        for entry in data["entries"]:
-            channel_ids.add(entry["channel_id"])
-    return channel_ids
+        errors.extend(f"{section}: {problem}" for problem in _post_download_problems(data))
+        for n, entry in enumerate(data["entries"]):
+            where = f"{section}.entries[{n}]"
+            if not isinstance(entry, dict):
+                errors.append(f"{where}: must be an object")
+                continue
+            for field in ("name", "channel_id", "regex", "path"):
+                if not isinstance(entry.get(field), str) or not entry.get(field):
+                    errors.append(f"{where}: '{field}' must be a non-empty string")
+            if (section, entry.get("name")) in seen:
+                errors.append(f"{where}: duplicate name '{entry.get('name')}' in section")
+            seen.add((section, entry.get("name")))
+            regexes = [("regex", entry.get("regex")), ("folder_regex", entry.get("folder_regex"))]
+            for platform, overrides in (entry.get("platform_config") or {}).items():
+                if isinstance(overrides, dict):
+                    regexes.append((f"platform_config.{platform}.folder_regex", overrides.get("folder_regex")))
+            for field, pattern in regexes:
+                if not isinstance(pattern, str):
+                    continue
+                try:
+                    if re.compile(pattern).groups < 1:
+                        errors.append(f"{where}: '{field}' needs a capture group for the episode number")
+                except re.error as e:
+                    errors.append(f"{where}: '{field}' is not a valid regex: {e}")
+            unknown = [p for p in entry.get("platforms", ["mega"]) if p not in _downloaders]
+            if unknown:
+                errors.append(f"{where}: unknown platforms {unknown}")
+            errors.extend(f"{where}: {problem}" for problem in _post_download_problems(entry))
+            fallback_paths = entry.get("fallback_paths", [])
+            if not isinstance(fallback_paths, list) or not all(isinstance(p, str) for p in fallback_paths):
+                errors.append(f"{where}: 'fallback_paths' must be a list of paths")
+            if not isinstance(entry.get("last_episode", 0), int):
+                errors.append(f"{where}: 'last_episode' must be an integer")
+            if entry.get("platform_order", "static") not in ("static", "adaptive"):
+                errors.append(f"{where}: 'platform_order' must be \"static\" or \"adaptive\"")
+            if not isinstance(entry.get("hedge_min_speed_kbps", 0), (int, float)):
+                errors.append(f"{where}: 'hedge_min_speed_kbps' must be a number")
+    return errors
 
 
-def sync_missed_messages(bot_client):
+def _retry_key(item):
+    return item.get("section"), item.get("entry_name"), item.get("episode"), item.get("platform"), item.get("link")
+
+
+def _merge_retry_queue(base, mine, theirs):
     """
-    Fetch the last 50 messages from each monitored channel and process any
-    that contain episodes newer than last_episode. Covers gaps caused by
-    internet outages or bot restarts.
+    Three-way merge of retry queues: `theirs` (the file) plus what this
+    process added, changed or removed since `base` (what it last read or
+    wrote). Keeps our item objects where possible, process_retry_queue()
+    removes items by identity.
     """
-    channel_ids = get_monitored_channel_ids()
-    if not channel_ids:
-        return
+    base_items = {_retry_key(item): item for item in base}
+    my_items = {_retry_key(item): item for item in mine}
+    their_keys = set()
+    merged = []
+    for item in theirs:
+        key = _retry_key(item)
+        their_keys.add(key)
+        if key in base_items and key not in my_items:
+            continue  # we finished or dropped it
+        mine_item = my_items.get(key)
+        if mine_item is not None and (mine_item == item or mine_item != base_items.get(key)):
+            merged.append(mine_item)
+        else:
+            merged.append(item)
+    for key, item in my_items.items():
+        if key not in base_items and key not in their_keys:
+            merged.append(item)  # we added it
+    return merged
 
-    print("=" * 60)
-    print("[SYNC] Checking recent messages for missed downloads...")
-    print(f"[SYNC] Scanning {len(channel_ids)} channel(s)")
-    print("=" * 60)
 
-    total_recovered = 0
+def reload_config():
+    """
+    Re-read settings.json and merge it into the running config in place.
+
+    Entries are matched by (section, name). Unchanged entries keep their
+    cached processor; changed ones are updated in place (so in-flight
+    downloads still update the right dict) and re-compiled. Runtime state
+    wins over the file unless the file itself changed it: last_episode and
+    retry_queue are only taken from the file when they differ from what
+    the bot last wrote.
+
+    Returns True if the file was applied (or unchanged), False if invalid.
+    """
+    global _config_text, _config_snapshot
+    with settings_file_lock():
+        text = _read_config_text()
+        if text is None or text == _config_text:
+            return text is not None
 
-    for channel_id in channel_ids:
         try:
-            resp = bot_client.getMessages(channel_id, num=50)
-            if resp.status_code != 200:
-                print(f"[SYNC] Failed to fetch channel {channel_id}: HTTP {resp.status_code}")
-                continue
+            new = json.loads(text)
+        except json.JSONDecodeError as e:
+            config_log.error("✗ settings.json is not valid JSON, keeping current config: %s", e)
+            return False
+        errors = validate_config(new)
+        if errors:
+            for error in errors:
+                config_log.error("✗ %s", error)
+            config_log.error("✗ settings.json rejected (%d problems), keeping current config", len(errors))
+            return False
 
-            messages = resp.json()
-            if not messages:
+        running = {(section, entry["name"]): entry for section, entry in _iter_entries(config)}
+        previous = {(section, entry["name"]): entry for section, entry in _iter_entries(_config_snapshot)}
+        added, changed = [], []
+
+        for section, data in new.items():
+            if section == "retry_queue":
                 continue
+            for n, new_entry in enumerate(data["entries"]):
+                key = (section, new_entry["name"])
+                current = running.pop(key, None)
+                if current is None:
+                    added.append(new_entry["name"])
+                    continue
 
-            messages.sort(key=lambda m: int(m['id']))
+                old = previous.get(key, {})
+                if new_entry.get("last_episode", 0) == old.get("last_episode", 0):
+                    new_entry["last_episode"] = current.get("last_episode", 0)
+                elif new_entry.get("last_episode", 0) != current.get("last_episode", 0):
+                    config_log.info("%s: last_episode set to %s from settings.json",
+                                    new_entry["name"], new_entry.get("last_episode", 0))
 
-            count = 0
-            for msg in messages:
-                content = msg.get('content', '')
-                if not content:
-                    continue
+                if _entry_fingerprint(new_entry) != _entry_fingerprint(current):
+                    changed.append(new_entry["name"])
+                    _processor_cache.pop(id(current), None)
 
-                fake_message = {
-                    'content': content,
-                    'channel_id': channel_id
-                }
+                # Update in place, dropping stale keys afterwards so readers never see a bare dict
+                current.update(new_entry)
+                for field in [k for k in current if k not in new_entry]:
+                    del current[field]
+                data["entries"][n] = current
 
-                for section, data in config.items():
-                    if section == "retry_queue":
-                        continue
-                    if "entries" not in data:
-                        continue
+        removed = [entry["name"] for entry in running.values()]
+        for entry in running.values():
+            _processor_cache.pop(id(entry), None)
 
-                    for entry in data["entries"]:
-                        if entry["channel_id"] != channel_id:
-                            continue
+        retry_queue = config.setdefault("retry_queue", [])
+        theirs = new.get("retry_queue", [])
+        if theirs != _config_snapshot.get("retry_queue", []):
+            retry_queue[:] = _merge_retry_queue(_config_snapshot.get("retry_queue", []), retry_queue, theirs)
+            config_log.info("retry_queue changed in settings.json (%d items)", len(retry_queue))
+        new["retry_queue"] = retry_queue
 
-                        processor = MessageProcessor(entry)
-                        episode = processor.extract_episode(content)
-                        if not episode:
-                            continue
+        config.clear()
+        config.update(new)
+        _rebuild_channel_index()
 
-                        print(f"[SYNC] Found missed: {entry['name']} EP{episode}")
-                        count += 1
+        _config_text = text
+        _config_snapshot = json.loads(text)
+        if json.loads(json.dumps(config)) != _config_snapshot:
+            _write_config()  # persist the runtime state that won over the file
 
-                        platform_links = processor.find_platform_links(content)
-                        if not platform_links:
-                            print(f"[SYNC] No links found for {entry['name']} EP{episode}, skipping")
-                            continue
+        config_log.info("settings.json reloaded: %d added, %d changed, %d removed",
+                        len(added), len(changed), len(removed),
+                        extra={"added": added, "changed": changed, "removed": removed})
+        for label, names in (("+", added), ("~", changed), ("-", removed)):
+            for name in names:
+                config_log.info("  %s %s", label, name)
+        return True
 
-                        download_success = False
-                        for platform in processor.platforms:
-                            if platform not in platform_links:
-                                continue
-
-                            download_link = platform_links[platform]
-                            print(f"[SYNC] Downloading {entry['name']} EP{episode} from {platform}")
-
-                            downloader = get_downloader(platform)
-                            if not downloader:
-                                continue
-
-                            share_type = processor.get_platform_share_type(platform)
-                            folder_regex = processor.get_platform_folder_regex(platform)
-                            download_multiple = processor.get_platform_download_multiple(platform)
-
-                            download_args = {
-                                "link": download_link,
-                                "path": entry["path"],
-                                "entry_name": entry["name"],
-                                "episode": episode
-                            }
-
-                            if platform == "pixeldrain":
-                                download_args.update({
-                                    "share_type": share_type,
-                                    "folder_regex": folder_regex,
-                                    "download_multiple": download_multiple,
-                                    "last_episode": entry.get("last_episode", 0),
-                                    "discord_regex": processor.regex
-                                })
-
-                            result = downloader.download(**download_args)
-
-                            if result.success:
-                                print(f"[SYNC] SUCCESS: {entry['name']} EP{episode} from {platform}")
-                                if download_multiple and share_type == "folder":
-                                    match = re.search(r'EP(\d+)', result.filename)
-                                    if match:
-                                        entry["last_episode"] = int(match.group(1))
-                                    else:
-                                        entry["last_episode"] = episode
-                                else:
-                                    entry["last_episode"] = episode
-                                save_config()
-                                download_success = True
-                                total_recovered += 1
-                                break
-
-                            elif result.reason == "quota_exceeded":
-                                print(f"[SYNC] Quota exceeded on {platform}, adding to retry queue")
-                                add_to_retry_queue(
-                                    entry["name"], episode, platform,
-                                    download_link, entry["path"],
-                                    channel_id, "quota_exceeded"
-                                )
-                                continue
-                            else:
-                                print(f"[SYNC] {platform} failed: {result.reason}")
-                                continue
-
-                        if not download_success:
-                            print(f"[SYNC] All platforms failed for {entry['name']} EP{episode}")
 
-            if count > 0:
-                print(f"[SYNC] Channel {channel_id}: found {count} missed episode(s)")
+def _rebuild_channel_index():
+    global _channel_index, _entry_keys, _channel_index_for
+    index = {}
+    keys = {}
+    for section, entry in _iter_entries(config):
+        index.setdefault(entry["channel_id"], []).append(entry)
+        keys[id(entry)] = (section, entry["name"])
+    _channel_index = index
+    _entry_keys = keys
+    _channel_index_for = config
+    _channel_matchers.clear()
 
-        except Exception as e:
-            print(f"[SYNC] Error scanning channel {channel_id}: {e}")
 
-        time.sleep(1)
+def _check_index():
+    if _channel_index_for is not config:
+        # config was swapped wholesale (e.g. by a tool), start over
+        _processor_cache.clear()
+        _rebuild_channel_index()
 
-    if total_recovered > 0:
-        print(f"[SYNC] Recovery complete: {total_recovered} episode(s) downloaded")
-    else:
-        print("[SYNC] No missed episodes found, all caught up")
-    print("=" * 60)
 
+def entries_for_channel(channel_id):
+    """Entries listening on channel_id (a snapshot list, safe to iterate while config reloads)."""
+    with config_lock:
+        _check_index()
+        return list(_channel_index.get(channel_id, ()))
 
-# ============================================================================
-# BOT INITIALIZATION
-# ============================================================================
 
-bot = discum.Client(token=DISCORD_TOKEN, log=False)
+def is_monitored(channel_id):
+    """Whether any entry listens on channel_id. Cheap enough to call for every gateway event."""
+    with config_lock:
+        _check_index()
+        return channel_id in _channel_index
+
+
+def channel_matcher(channel_id):
+    """ChannelMatcher for the entries listening on channel_id (None if there are none)."""
+    with config_lock:
+        _check_index()
+        matcher = _channel_matchers.get(channel_id)
+        if matcher is None and channel_id in _channel_index:
+            matcher = _channel_matchers[channel_id] = ChannelMatcher(_channel_index[channel_id])
+        return matcher
+
+
+def entry_section(entry):
+    """Name of the settings.json section an entry belongs to."""
+    with config_lock:
+        _check_index()
+        return _entry_keys[id(entry)][0]
+
+
+def find_entry(section, name):
+    """The entry called `name` in `section`, or None."""
+    with config_lock:
+        for entry_section_name, entry in _iter_entries(config):
+            if entry_section_name == section and entry["name"] == name:
+                return entry
+    return None
+
+
+def retry_item_entry(item):
+    """
+    (section, entry) a retry item belongs to, or (None, None). Items queued
+    before they recorded their section match the first entry of that name.
+    """
+    with config_lock:
+        for section, entry in _iter_entries(config):
+            if entry["name"] == item["entry_name"] and item.get("section", section) == section:
+                return section, entry
+    return None, None
+
+
+def get_processor(entry):
+    """Cached MessageProcessor for an entry, with last_episode kept current."""
+    processor = _processor_cache.get(id(entry))
+    if processor is None:
+        processor = _processor_cache[id(entry)] = MessageProcessor(entry)
+    processor.last_episode = entry.get("last_episode", 0)
+    return processor
+
+
+class ConfigWatcher(threading.Thread):
+    """
+    Reloads settings.json when it changes. Uses inotify on the containing
+    directory (editors usually replace the file rather than rewrite it)
+    and falls back to polling mtime/size every `poll_interval` seconds.
+    """
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+
+    def __init__(self, path, mode="auto", poll_interval=2.0, debounce=0.5):
+        super().__init__(name="config-watcher", daemon=True)
+        self.path = os.path.abspath(path)
+        self.mode = mode  # "auto" (inotify, else polling) or "poll"
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        fd = self._inotify_open() if self.mode == "auto" else None
+        if fd is None:
+            config_log.info("Watching %s (polling every %.1fs)", self.path, self.poll_interval)
+            self._poll()
+            return
+        config_log.info("Watching %s (inotify)", self.path)
+        try:
+            self._watch_inotify(fd)
+        finally:
+            os.close(fd)
+
+    def _reload(self):
+        try:
+            reload_config()
+        except Exception:
+            config_log.exception("✗ settings.json reload failed")
+
+    def _inotify_open(self):
+        """inotify fd watching the settings directory, or None where unavailable."""
+        try:
+            import ctypes
+            import ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(os.O_CLOEXEC)
+            if fd < 0:
+                return None
+            mask = self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+            if libc.inotify_add_watch(fd, os.path.dirname(self.path).encode(), mask) < 0:
+                os.close(fd)
+                return None
+            return fd
+        except (OSError, AttributeError):
+            return None
+
+    def _watch_inotify(self, fd):
+        import select
+        import struct
+        name = os.path.basename(self.path).encode()
+        while not self._stop_event.is_set():
+            ready, _, _ = select.select([fd], [], [], 1.0)
+            if not ready:
+                continue
+            data = os.read(fd, 64 * 1024)
+            touched = False
+            offset = 0
+            while offset < len(data):
+                # struct inotify_event { int wd; uint32 mask, cookie, len; char name[len]; }
+                _, _, _, length = struct.unpack_from("iIII", data, offset)
+                touched = touched or data[offset + 16:offset + 16 + length].rstrip(b"\0") == name
+                offset += 16 + length
+            if touched:
+                self._stop_event.wait(self.debounce)  # let editors finish writing
+                self._reload()
 
-@bot.gateway.command
-def on_message(resp):
-    if resp.event.ready_supplemental:
-        print("Ready to process")
-        sync_missed_messages(bot)
-        process_retry_queue()
+    def _poll(self):
+        def stamp():
+            try:
+                st = os.stat(self.path)
+                return st.st_mtime_ns, st.st_size
+            except OSError:
+                return None
 
-    if resp.event.message:
-        msg = resp.parsed.auto()
-        handle_new_message(msg)
+        last = stamp()
+        while not self._stop_event.wait(self.poll_interval):
+            current = stamp()
+            if current != last:
+                last = current
+                self._reload()
 
 
 # ============================================================================
-# MAIN LOOP
+# POST-DOWNLOAD PIPELINE
 # ============================================================================
 
-while True:
-    try:
-        bot.gateway.run(auto_reconnect=True)
-    except Exception as e:
-        print("⚠️ Crash or disconnect:", e)
-        time.sleep(10)
\ No newline at end of file
+POST_DOWNLOAD_STEPS = ("run", "move", "notify")
+
+
+def _post_download_problems(settings):
+    """Validation messages for the "post_download" list of an entry or section."""
+    steps = settings.get("post_download", [])
+    if not isinstance(steps, list):
+        return ["'post_download' must be a list of steps"]
+    problems = []
+    for n, step in enumerate(steps):
+        kinds = [kind for kind in POST_DOWNLOAD_STEPS if isinstance(step, dict) and kind in step]
+        if len(kinds) != 1 or not isinstance(step[kinds[0]], str):
+            problems.append(f"post_download[{n}]: needs exactly one of {list(POST_DOWNLOAD_STEPS)} as a string")
+    return problems
+
+
+class PostDownloadPipeline:
+    """
+    Runs the "post_download" steps of an entry (or, if it has none, of its
+    section) for every downloaded file, on a small thread pool of its own so
+    the next download does not wait for them. Steps run in order and a
+    failing step stops the rest for that file:
+    
+        {"run": "sha256sum {file} > {file}.sha256", "timeout": 600}
+        {"move": "/media/library/{entry}/{entry} - E{episode:02d}{ext}"}
+        {"notify": "http://127.0.0.1:8096/Library/Refresh", "method": "POST"}
+    
+    Templates can use {entry}, {section}, {episode}, {platform}, {file},
+    {filename}, {stem}, {ext} and {dir}. Values are shell-quoted in "run"
+    commands. "move" updates {file} for the steps after it; relative
+    targets are relative to the download directory. "notify" sends the same
+    values as a JSON body.
+    """
+    
+    def __init__(self, workers=None):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+    
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(max_workers=self.workers or POST_DOWNLOAD_WORKERS,
+                                                    thread_name_prefix="post-download")
+            return self._executor
+    
+    def steps_for(self, entry):
+        if "post_download" in entry:
+            return entry["post_download"]
+        with config_lock:
+            return config.get(entry_section(entry), {}).get("post_download", [])
+    
+    def staged_steps(self, entry):
+        """
+        The entry's leading "run" steps (checksums, verification). With
+        STAGING_DIR set, StagingMover runs these on the staged files before
+        moving them; "move" and "notify" steps always run on the library copy.
+        """
+        return list(itertools.takewhile(lambda step: "run" in step, self.steps_for(entry)))
+    
+    def submit(self, entry, episode, platform, result, first_step=0, skip=()):
+        """
+        Queue the steps for each file of a successful DownloadResult. Returns
+        the futures. StagingMover passes the steps it already ran as
+        `first_step`, and the files one of them failed for as `skip`.
+        """
+        steps = list(self.steps_for(entry))[first_step:]
+        if not steps:
+            return []
+        return [self._get_executor().submit(self.run_steps, steps, context)
+                for filename, context in self.file_contexts(entry, episode, platform, result) if filename not in skip]
+    
+    def file_contexts(self, entry, episode, platform, result):
+        """[(filename, template values), ...] for each file of a successful DownloadResult."""
+        if result.filename == "unknown":  # mega-get does not tell us what it wrote
+            post_log.warning("⚠ %s EP%s: file name unknown (%s), skipping post_download", entry["name"], episode,
+                             platform)
+            return []
+        
+        context = {"entry": entry["name"], "section": entry_section(entry), "platform": platform}
+        contexts = []
+        for file_episode, filename in result.files or [(episode, result.filename)]:
+            file_context = dict(context, episode=file_episode)
+            file_context.update(self._file_vars(os.path.join(result.path or entry["path"], filename)))
+            contexts.append((filename, file_context))
+        return contexts
+    
+    def shutdown(self):
+        """Wait for queued steps (before a short-lived process like backfill exits)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+    
+    @staticmethod
+    def _file_vars(filepath):
+        stem, ext = os.path.splitext(os.path.basename(filepath))
+        return {"file": filepath, "filename": os.path.basename(filepath), "stem": stem, "ext": ext,
+                "dir": os.path.dirname(filepath)}
+    
+    def run_steps(self, steps, context):
+        label = f"{context['entry']} EP{context['episode']}"
+        for n, step in enumerate(steps):
+            kind = next(kind for kind in POST_DOWNLOAD_STEPS if kind in step)
+            try:
+                ok = getattr(self, f"_step_{kind}")(step, context)
+            except Exception:
+                post_log.exception("✗ %s: step %d (%s) crashed", label, n + 1, kind)
+                ok = False
+            if not ok:
+                post_log.error("✗ %s: post_download stopped at step %d (%s)", label, n + 1, kind,
+                               extra={"entry": context["entry"], "episode": context["episode"], "step": n + 1})
+                return False
+        post_log.info("✓ %s: %d post_download step(s) done", label, len(steps))
+        return True
+    
+    def _step_run(self, step, context):
+        import shlex
+        command = step["run"].format_map({k: shlex.quote(str(v)) if isinstance(v, str) else v
+                                          for k, v in context.items()})
+        post_log.info("Running: %s", command)
+        completed = subprocess.run(command, shell=True, cwd=context["dir"], capture_output=True, text=True,
+                                   timeout=step.get("timeout", 3600))
+        if completed.returncode != 0:
+            post_log.error("✗ Exit code %d: %s", completed.returncode, completed.stderr.strip())
+            return False
+        return True
+    
+    def _step_move(self, step, context):
+        target = os.path.join(context["dir"], step["move"].format_map(context))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(context["file"], target)
+        post_log.info("Moved %s -> %s", context["file"], target)
+        context.update(self._file_vars(target))
+        return True
+    
+    def _step_notify(self, step, context):
+        import requests
+        url = step["notify"].format_map(context)
+        try:
+            response = requests.request(step.get("method", "POST"), url, json=context, timeout=step.get("timeout", 10))
+        except requests.exceptions.RequestException as e:
+            post_log.error("✗ Notify %s: %s", url, e)
+            return False
+        if response.status_code >= 400:
+            post_log.error("✗ Notify %s: HTTP %s", url, response.status_code)
+            return False
+        post_log.info("Notified %s", url)
+        return True
+
+
+post_download = PostDownloadPipeline()
+
+
+# ============================================================================
+# STAGING
+# ============================================================================
+
+MOVE_CHUNK_SIZE = 8 * 1024 * 1024  # cross-filesystem moves copy this much per read/write
+STAGING_MANIFEST = ".autodl-staging.json"  # in each job directory: owner pid, label, destination paths
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # someone else's process
+    return True
+
+
+class StagingMover:
+    """
+    Every staged download gets a directory of its own under STAGING_DIR,
+    with a manifest naming the process that owns it and the library paths
+    the files are headed for. Once the download succeeded, the entry's
+    leading "run" post_download steps (checksums, verification) run on the
+    staged files, then everything in the job directory is moved to the
+    first of those paths with room for it, on a thread pool of its own
+    (MOVE_WORKERS threads) so the next download does not wait for a slow
+    library volume, and the rest of the steps are queued.
+    
+    A move is a rename when staging and library share a filesystem;
+    otherwise each file is copied in MOVE_CHUNK_SIZE chunks to
+    "<file>.move.part" under a disk reservation, synced, renamed into place
+    and only then deleted from staging. Job directories of processes that
+    are gone (a crash, a failed move) are handled by recover() on the next
+    start; those of running processes, e.g. a backfill, are left alone.
+    """
+    
+    def __init__(self, workers=None):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+    
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(max_workers=self.workers or MOVE_WORKERS,
+                                                    thread_name_prefix="move")
+            return self._executor
+    
+    @staticmethod
+    def job_dir(paths, label):
+        """A new, empty staging directory for one download headed for `paths`."""
+        import tempfile
+        root = os.path.abspath(STAGING_DIR)
+        os.makedirs(root, exist_ok=True)
+        job_dir = tempfile.mkdtemp(prefix=f"{os.getpid()}-", dir=root)
+        with open(os.path.join(job_dir, STAGING_MANIFEST), "w") as f:
+            json.dump({"pid": os.getpid(), "label": label, "paths": [os.path.abspath(path) for path in paths]}, f)
+        return job_dir
+    
+    @staticmethod
+    def discard(job_dir):
+        """Delete a job directory whose download failed."""
+        shutil.rmtree(job_dir, ignore_errors=True)
+    
+    def submit(self, entry, episode, platform, result, paths=None):
+        """
+        Queue the staged steps and the move of a successful, staged
+        DownloadResult to the first of `paths` (default: the entry's path and
+        fallback_paths) with room for it, followed by the rest of its
+        post_download steps. Results that were not staged go straight to
+        post_download. Returns the futures.
+        """
+        if not result.staged:
+            return post_download.submit(entry, episode, platform, result)
+        paths = paths or [entry["path"], *entry.get("fallback_paths", [])]
+        return [self._get_executor().submit(self._move_result, entry, episode, platform, result, paths)]
+    
+    def recover(self):
+        """
+        Queue the moves of job directories whose process is gone, each to the
+        paths in its manifest (no post_download steps: the download may not
+        have finished them). Partial files are dropped. Returns the number of
+        job directories found.
+        """
+        if not STAGING_DIR or not os.path.isdir(STAGING_DIR):
+            return 0
+        found = 0
+        for name in os.listdir(STAGING_DIR):
+            job_dir = os.path.join(os.path.abspath(STAGING_DIR), name)
+            try:
+                with open(os.path.join(job_dir, STAGING_MANIFEST)) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                continue  # not a job directory
+            if _pid_alive(manifest["pid"]):
+                continue
+            found += 1
+            move_log.info("Found %s staged by process %d, which is gone", job_dir, manifest["pid"])
+            self._get_executor().submit(self._move_job, job_dir, manifest["paths"], manifest["label"])
+        return found
+    
+    def shutdown(self):
+        """Wait for queued moves (before a short-lived process like backfill exits)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+    
+    def _move_result(self, entry, episode, platform, result, paths):
+        label = f"{entry['name']} EP{episode}"
+        try:
+            steps = post_download.staged_steps(entry)
+            failed = set()
+            if steps and result.filename != "unknown":  # post_download.submit() warns about unknown names
+                for filename, context in post_download.file_contexts(entry, episode, platform, result):
+                    if not post_download.run_steps(steps, context):
+                        failed.add(filename)
+            destination = self._move_job(result.path, paths, label)
+        except Exception:
+            move_log.exception("✗ %s: move crashed, files stay in %s", label, result.path)
+            return False
+        if destination is None:
+            return False
+        result.path = destination
+        result.staged = False
+        post_download.submit(entry, episode, platform, result, first_step=len(steps), skip=failed)
+        return True
+    
+    def _move_job(self, job_dir, paths, label):
+        """
+        Move the complete files of `job_dir` (and their subdirectories) to
+        the first of `paths` they fit in and delete it. Returns that path, or
+        None (files left staged).
+        """
+        names = []
+        for directory, _, filenames in os.walk(job_dir):
+            for filename in filenames:
+                if filename != STAGING_MANIFEST and not filename.endswith(".part"):
+                    names.append(os.path.relpath(os.path.join(directory, filename), job_dir))
+        if not names:
+            move_log.info("%s: nothing to move from %s", label, job_dir)
+            self.discard(job_dir)
+            return None
+        try:
+            size = sum(os.path.getsize(os.path.join(job_dir, name)) for name in names)
+            transfer = Transfer(f"move {label}")
+            with tracking(transfer):
+                destination, reservation = self._destination(job_dir, paths, size)
+                if destination is None:
+                    move_log.error("✗ %s: no room for %.1f MB in %s, files stay in %s (moved on the next start)",
+                                   label, size / (1024 * 1024), ", ".join(paths), job_dir,
+                                   extra={"label": label, "size": size, "staged": job_dir})
+                    return None
+                started = time.monotonic()
+                with reservation:
+                    for name in names:
+                        self._move(os.path.join(job_dir, name), os.path.join(destination, name), transfer)
+            elapsed = time.monotonic() - started
+        except OSError as e:
+            if _is_disk_full(e):
+                move_log.error("✗ %s: disk full while moving to the library, files stay in %s", label, job_dir)
+            else:
+                move_log.error("✗ %s: move failed, files stay in %s: %s", label, job_dir, e)
+            return None
+        self.discard(job_dir)
+        move_log.info("✓ %s: %d file(s) moved to %s (%.1f MB copied in %.1fs)", label, len(names), destination,
+                      transfer.bytes / (1024 * 1024), elapsed,
+                      extra={"label": label, "destination": destination, "copied": transfer.bytes,
+                             "seconds": round(elapsed, 3)})
+        return destination
+    
+    @staticmethod
+    def _destination(staged, paths, size):
+        """
+        (path, reservation) for the first of `paths` that can take `size`
+        bytes. Same-filesystem paths need no room and get a no-op reservation.
+        """
+        device = os.stat(staged).st_dev
+        for path in paths:
+            try:
+                if os.stat(path).st_dev == device:
+                    return path, contextlib.nullcontext()
+            except FileNotFoundError:
+                move_log.warning("⚠ %s does not exist", path)
+                continue
+            reservation = disk_space.reserve(path, size, move_log)
+            if reservation is not None:
+                return path, reservation
+        return None, None
+    
+    @staticmethod
+    def _move(source, target, transfer):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.replace(source, target)
+            return
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+        part_path = f"{target}.move.part"
+        buffer = bytearray(MOVE_CHUNK_SIZE)
+        view = memoryview(buffer)
+        try:
+            with open(source, "rb") as src, open(part_path, "wb") as dst:
+                while True:
+                    n = src.readinto(buffer)
+                    if not n:
+                        break
+                    dst.write(view[:n])
+                    transfer.update(n)
+                dst.flush()
+                os.fsync(dst.fileno())
+            shutil.copystat(source, part_path)
+            os.replace(part_path, target)
+        except BaseException:
+            _remove_partial(part_path)
+            raise
+        os.remove(source)
+
+
+staging_mover = StagingMover()
+
+
+# ============================================================================
+# MESSAGE HANDLER
+# ============================================================================
+
+def folder_context(entry, platform):
+    """
+    The folder arguments (share_type, folder_regex, download_multiple,
+    discord_regex) an entry's downloads pass to `platform`, or None for
+    platforms that take none. Retry items keep a copy.
+    """
+    if platform != "pixeldrain":
+        return None
+    processor = get_processor(entry)
+    return {
+        "share_type": processor.get_platform_share_type(platform),
+        "folder_regex": processor.get_platform_folder_regex(platform),
+        "download_multiple": processor.get_platform_download_multiple(platform),
+        "discord_regex": processor.regex
+    }
+
+
+def download_to_paths(platform, download_args, paths, label, log=download_log):
+    """
+    Run `platform`'s downloader with `download_args` into the first of
+    `paths` the file fits in (DiskReservations decides per volume), or,
+    with STAGING_DIR set, into a staging job directory headed for them.
+    Sets the result's path and staged flag.
+    """
+    if STAGING_DIR:
+        # A directory of its own in staging; the mover picks the volume once the download is complete
+        paths = [staging_mover.job_dir(paths, label)]
+    for n, path in enumerate(paths):
+        download_args["path"] = path
+        result = get_downloader(platform).download(**download_args)
+        if result.reason != "insufficient_space" or n + 1 == len(paths):
+            break
+        log.warning("%s does not fit in %s, trying %s", label, path, paths[n + 1],
+                    extra={"platform": platform, "path": path})
+    result.path = download_args["path"]
+    result.staged = bool(STAGING_DIR)
+    if result.staged and not result.success:
+        staging_mover.discard(result.path)
+    return result
+
+
+def _attempt_download(entry, episode, platform, link, transfer, log=download_log):
+    """Run one platform's downloader for an episode, reporting progress to `transfer`."""
+    fields = {"entry": entry["name"], "episode": episode, "platform": platform, "link": link}
+    log.info("Trying %s for %s EP%s: %s", platform.upper(), entry["name"], episode, link, extra=fields)
+    
+    # Prepare download arguments
+    download_args = {
+        "link": link,
+        "path": entry["path"],
+        "entry_name": entry["name"],
+        "episode": episode
+    }
+    
+    # Add folder-specific parameters for Pixeldrain
+    folder = folder_context(entry, platform)
+    if folder:
+        download_args.update(folder, last_episode=entry.get("last_episode", 0))
+    
+    # Volumes to use, in order, when the file does not fit
+    paths = [entry["path"], *entry.get("fallback_paths", [])]
+    with tracking(transfer):
+        try:
+            result = download_to_paths(platform, download_args, paths, f"{entry['name']} EP{episode}", log)
+        finally:
+            transfer.finished = time.monotonic()
+    result.target = transfer.target
+    if result.reason != "cancelled":  # a cancelled hedge leg says nothing about the platform
+        platform_stats.record(platform, link, transfer, result)
+    return result
+
+
+def _hedge_min_speed(entry):
+    """Hedging threshold in bytes/sec for an entry (0 = hedging off)."""
+    return float(entry.get("hedge_min_speed_kbps", HEDGE_MIN_SPEED_KBPS)) * 1024
+
+
+def _hedged_download(entry, episode, primary, remaining, platform_links, min_speed, job, log=download_log):
+    """
+    Download from `primary`; if it is still below `min_speed` bytes/sec after
+    HEDGE_WARMUP_SECONDS, start the next platform of `remaining` (taking it
+    off that list) in parallel. The first success wins and the other leg is
+    cancelled, which deletes its partial file.
+    
+    Returns [(platform, DownloadResult), ...] for every leg, winner first.
+    """
+    label = f"{entry['name']} EP{episode}"
+    legs = {}
+    finished = queue.SimpleQueue()
+    
+    def start(platform):
+        transfer = legs[platform] = job.attach(Transfer(label, platform))
+        def run():
+            try:
+                result = _attempt_download(entry, episode, platform, platform_links[platform], transfer, log)
+            except Exception:
+                log.exception("✗ %s download crashed", platform)
+                result = DownloadResult(success=False, reason="download_error")
+            finished.put((platform, result))
+        threading.Thread(target=run, name=f"hedge-{platform}", daemon=True).start()
+    
+    start(primary)
+    outcomes = []
+    while len(outcomes) < len(legs):
+        try:
+            platform, result = finished.get(timeout=1)
+        except queue.Empty:
+            transfer = legs[primary]
+            if (len(legs) == 1 and remaining and transfer.measured and not transfer.paused
+                    and time.monotonic() - transfer.started >= HEDGE_WARMUP_SECONDS
+                    and transfer.speed() < min_speed):
+                hedge = remaining.pop(0)
+                log.warning("%s at %.0f KB/s after %ds, also starting %s", primary, transfer.speed() / 1024,
+                            HEDGE_WARMUP_SECONDS, hedge,
+                            extra={"entry": entry["name"], "episode": episode, "platform": hedge,
+                                   "slow_platform": primary})
+                start(hedge)
+            continue
+        
+        outcomes.append((platform, result))
+        if result.success:
+            for other, transfer in legs.items():
+                if other != platform:
+                    log.info("%s finished first, cancelling %s", platform, other)
+                    transfer.cancel()
+            while len(outcomes) < len(legs):
+                outcomes.append(finished.get())
+            break
+    
+    outcomes.sort(key=lambda outcome: not outcome[1].success)
+    return outcomes
+
+
+def _mark_downloaded(entry, episode, result, log=download_log):
+    """Raise the entry's last_episode for a successful result and save settings.json."""
+    processor = get_processor(entry)
+    download_multiple = (processor.get_platform_download_multiple(result.platform)
+                         and processor.get_platform_share_type(result.platform) == "folder")
+    with config_lock:
+        if download_multiple:
+            # result.filename contains "EP{highest}" for multiple downloads
+            match = re.search(r'EP(\d+)', result.filename or "")
+            if match:
+                highest_ep = int(match.group(1))
+                entry["last_episode"] = max(entry.get("last_episode", 0), highest_ep)
+                log.info("last_episode = %d", entry["last_episode"])
+            else:
+                entry["last_episode"] = max(entry.get("last_episode", 0), episode)
+        else:
+            # max(): backfill jobs finish out of order
+            entry["last_episode"] = max(entry.get("last_episode", 0), episode)
+        
+        save_config()
+
+
+def download_episode(entry, episode, platform_links, channel_id, log=download_log):
+    """
+    Try the entry's platforms in priority order until one succeeds. Updates
+    last_episode on success and queues quota failures for retry, and
+    stalled transfers once no other platform delivered. With hedging
+    enabled a slow platform gets the next one started alongside it.
+    
+    A trigger for an episode that is already downloading waits for that
+    download and reports its outcome instead of trying platforms itself.
+    
+    Returns True if the episode was downloaded.
+    """
+    processor = get_processor(entry)
+    platforms = []
+    for platform in processor.platforms:
+        if platform not in platform_links:
+            continue
+        # Get appropriate downloader
+        if not get_downloader(platform):
+            log.error("Unknown platform: %s", platform)
+            continue
+        platforms.append(platform)
+    
+    if entry.get("platform_order") == "adaptive" and len(platforms) > 1:
+        ordered = platform_stats.order(platforms, platform_links)
+        if ordered != platforms:
+            log.info("Adaptive platform order for %s: %s", entry["name"], ordered,
+                     extra={"entry": entry["name"], "platforms": ordered})
+        platforms = ordered
+    
+    min_speed = _hedge_min_speed(entry)
+    section = entry_section(entry)
+    job = Job(entry["name"], episode, channel_id)
+    outcomes = []  # (platform, DownloadResult) of every attempt, when this trigger runs the download
+    
+    def run():
+        """All platforms in order. Returns the successful result, else the last failure."""
+        stalled = None  # first (platform, link, result) whose transfer stalled
+        while platforms:
+            platform = platforms.pop(0)
+            share_type = processor.get_platform_share_type(platform)
+            download_multiple = processor.get_platform_download_multiple(platform)
+            
+            jobs.acquire(job)  # the first platform waits for a download slot, the rest keep it
+            if job.cancelled:
+                attempts = [(platform, DownloadResult(success=False, reason="cancelled"))]
+            elif min_speed and platforms and not (download_multiple and share_type == "folder"):
+                attempts = _hedged_download(entry, episode, platform, platforms, platform_links, min_speed, job, log)
+            else:
+                transfer = job.attach(Transfer(f"{entry['name']} EP{episode}", platform))
+                attempts = [(platform, _attempt_download(entry, episode, platform, platform_links[platform],
+                                                         transfer, log))]
+            outcomes.extend(attempts)
+            
+            for platform, result in attempts:
+                result.platform = platform
+                download_link = platform_links[platform]
+                fields = {"entry": entry["name"], "episode": episode, "platform": platform, "link": download_link}
+                
+                if result.success:
+                    log.info("%s EP%s downloaded from %s", entry["name"], episode, platform, extra=fields)
+                    _mark_downloaded(entry, episode, result, log)
+                    staging_mover.submit(entry, episode, platform, result)
+                    return result  # Success, don't try other platforms
+                
+                elif result.reason == "quota_exceeded":
+                    log.warning("%s quota exceeded, adding to retry queue", platform, extra=fields)
+                    add_to_retry_queue(
+                        entry["name"],
+                        episode,
+                        platform,
+                        download_link,
+                        entry["path"],
+                        channel_id,
+                        "quota_exceeded",
+                        target=result.target,
+                        folder=folder_context(entry, platform),
+                        section=section
+                    )
+                
+                elif result.reason == "insufficient_space":
+                    # Every platform writes the same file to the same place: wait for space instead
+                    log.warning("No space for %s EP%s, deferring to retry queue", entry["name"], episode,
+                                extra=fields)
+                    add_to_retry_queue(
+                        entry["name"],
+                        episode,
+                        platform,
+                        download_link,
+                        entry["path"],
+                        channel_id,
+                        "insufficient_space",
+                        target=result.target,
+                        folder=folder_context(entry, platform),
+                        section=section
+                    )
+                    return result
+                
+                else:
+                    log.warning("%s download failed: %s", platform, result.reason,
+                                extra=dict(fields, reason=result.reason))
+                    if result.reason == "stalled" and stalled is None:
+                        stalled = (platform, download_link, result)
+            
+            if job.cancelled:
+                log.info("%s EP%s cancelled", entry["name"], episode,
+                         extra={"entry": entry["name"], "episode": episode})
+                return outcomes[-1][1]
+            # Try next platform
+        
+        log.error("All platforms failed for %s EP%s", entry["name"], episode,
+                  extra={"entry": entry["name"], "episode": episode})
+        if stalled:
+            # The link worked but the host was crawling: worth another try later
+            platform, download_link, result = stalled
+            add_to_retry_queue(entry["name"], episode, platform, download_link, entry["path"], channel_id,
+                               "stalled", hours=1, target=result.target, folder=folder_context(entry, platform),
+                               section=section)
+        return outcomes[-1][1] if outcomes else DownloadResult(success=False, reason="no_platforms")
+    
+    try:
+        # Another trigger may already be downloading this episode: share its result
+        result = in_flight.run(("episode", section, entry["name"], episode), run)
+        if outcomes:
+            return result.success
+        
+        # Attached: the other trigger tried its platforms, saved last_episode and queued any retries
+        fields = {"entry": entry["name"], "episode": episode, "platform": result.platform}
+        if result.success:
+            log.info("%s EP%s downloaded from %s by another trigger", entry["name"], episode, result.platform,
+                     extra=fields)
+            _mark_downloaded(entry, episode, result, log)
+        else:
+            log.warning("%s EP%s: the download this trigger waited for failed (%s: %s)", entry["name"], episode,
+                        result.platform, result.reason, extra=dict(fields, reason=result.reason))
+        return result.success
+    finally:
+        jobs.release(job)
+
+
+def dispatch_episode(entry, episode, platform_links, channel_id, log=download_log):
+    """
+    Download here, or hand the job to the worker process that owns the
+    entry when running with --workers. Returns download_episode()'s
+    result, or None if the job was queued for a worker.
+    """
+    if _worker_pool is None:
+        return download_episode(entry, episode, platform_links, channel_id, log)
+    _worker_pool.submit(entry, episode, platform_links, channel_id)
+    return None
+
+
+def handle_new_message(message):
+    """Process incoming Discord message across all configured entries."""
+    handle_message_batch(message['channel_id'], [message])
+
+
+def handle_message_batch(channel_id, messages):
+    """
+    Process messages from one channel as a unit. Identical reposts are
+    matched once, and an episode announced in several messages (one per
+    host, or the same link pasted twice) is dispatched once with the
+    platform links of all of them; the first link seen for a platform wins.
+    """
+    matcher = channel_matcher(channel_id)
+    if matcher is None:
+        return
+    
+    episodes = {}  # (id(entry), episode) -> (entry, episode, {platform: link})
+    seen = set()   # (id(entry), episode, link)
+    contents = set()
+    duplicates = 0
+    for message in messages:
+        content = message.get('content', '')
+        if content in contents:
+            duplicates += 1
+            continue
+        contents.add(content)
+        
+        # One pass over the message for all entries of the channel
+        scan = MessageScan(content)
+        for entry, episode in matcher.match(content):
+            key = (id(entry), episode)
+            if key not in episodes:
+                match_log.info("%s: episode %s detected (last: %s)", entry["name"], episode,
+                               entry.get("last_episode", 0),
+                               extra={"entry": entry["name"], "episode": episode, "channel_id": channel_id})
+            
+            # Find all platform links in the message
+            processor = get_processor(entry)
+            platform_links = processor.find_platform_links(content, scan)
+            merged = episodes.setdefault(key, (entry, episode, {}))[2]
+            for platform, link in platform_links.items():
+                if (key, link) in seen:
+                    duplicates += 1
+                    continue
+                seen.add((key, link))
+                merged.setdefault(platform, link)
+    
+    if len(messages) > 1:
+        match_log.info("Coalesced %d message(s) in channel %s into %d episode(s), %d duplicate(s) dropped",
+                       len(messages), channel_id, len(episodes), duplicates,
+                       extra={"channel_id": channel_id, "messages": len(messages), "episodes": len(episodes),
+                              "duplicates": duplicates})
+    
+    for entry, episode, platform_links in episodes.values():
+        if not platform_links:
+            match_log.info("No matching links found for configured platforms")
+            continue
+        
+        match_log.info("Available platforms: %s", list(platform_links.keys()))
+        
+        dispatch_episode(entry, episode, platform_links, channel_id)
+
+
+class MessageBatcher:
+    """
+    Holds gateway messages for `window` seconds after the first one of a
+    channel arrives, then hands everything that channel sent meanwhile to
+    handle_message_batch(). Bursts (a release posted once per host, edits
+    reposted, several entries at once) then cost one match and one download
+    per episode. A channel that sends `max_messages` before the window ends
+    is flushed right away, so a flood does not pile up in memory.
+    
+    The batcher thread only collects and flushes; each flushed batch runs on
+    a thread of its own, so a long download from one channel does not hold
+    back the batches of every other channel.
+    """
+    
+    def __init__(self, window=None, max_messages=None):
+        self.window = window or MESSAGE_BATCH_SECONDS
+        self.max_messages = max_messages or MESSAGE_BATCH_MAX
+        self._cond = threading.Condition()
+        self._pending = {}  # channel_id -> (deadline, [message, ...])
+        self._thread = None
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="message-batcher", daemon=True)
+        self._thread.start()
+        return self
+    
+    def add(self, message):
+        with self._cond:
+            channel_id = message['channel_id']
+            if channel_id not in self._pending:
+                self._pending[channel_id] = (time.monotonic() + self.window, [])
+                self._cond.notify()
+            messages = self._pending[channel_id][1]
+            messages.append(message)
+            if len(messages) < self.max_messages:
+                return
+            del self._pending[channel_id]
+        self._dispatch(channel_id, messages)
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    due = [channel_id for channel_id, (deadline, _) in self._pending.items() if deadline <= now]
+                    if due:
+                        break
+                    wake = min((deadline for deadline, _ in self._pending.values()), default=now + 60)
+                    self._cond.wait(wake - now)
+                batches = [(channel_id, self._pending.pop(channel_id)[1]) for channel_id in due]
+            for channel_id, messages in batches:
+                self._dispatch(channel_id, messages)
+    
+    def _dispatch(self, channel_id, messages):
+        threading.Thread(target=self._process, args=(channel_id, messages),
+                         name=f"message-batch-{channel_id}", daemon=True).start()
+    
+    @staticmethod
+    def _process(channel_id, messages):
+        try:
+            handle_message_batch(channel_id, messages)
+        except Exception:
+            gateway_log.exception("✗ Failed to process %d message(s) from channel %s", len(messages), channel_id)
+
+
+# Set in main() when MESSAGE_BATCH_SECONDS > 0
+_message_batcher = None
+
+
+def handle_gateway_message(resp):
+    """
+    MESSAGE_CREATE from the gateway. Nearly all of them come from channels
+    nobody monitors, so the raw channel_id is checked before discum parses
+    the payload or any other work is done.
+    """
+    if not is_monitored(resp.raw["d"].get("channel_id")):
+        return
+    if _message_batcher is not None:
+        _message_batcher.add(resp.parsed.auto())
+    else:
+        handle_new_message(resp.parsed.auto())
+
+
+# ============================================================================
+# MESSAGE SYNC / RECOVERY
+# ============================================================================
+
+def get_monitored_channel_ids():
+    """Collect all unique channel IDs from config entries."""
+    with config_lock:
+        return {entry["channel_id"] for _, entry in _iter_entries(config)}
+
+
+def subscribe_monitored_guilds(gateway):
+    """
+    Send a lazy-guild subscription (op 14) for each guild that has a
+    monitored channel, covering just those channels and without typing,
+    activity or thread events. Guilds without monitored channels get no
+    subscription. Uses the guild list from the gateway's READY session.
+    
+    This only trims member-list, typing and presence traffic. MESSAGE_CREATE
+    still arrives from every guild the account is in, subscribed or not;
+    handle_gateway_message() drops those by channel_id before parsing.
+    """
+    monitored = get_monitored_channel_ids()
+    subscribed = 0
+    for guild_id, guild in gateway.session.guilds.items():
+        channel_ids = [channel_id for channel_id in guild.get("channels", {}) if channel_id in monitored]
+        if not channel_ids:
+            continue
+        gateway.request.lazyGuild(guild_id, channel_ranges={channel_id: [[0, 99]] for channel_id in channel_ids},
+                                  typing=False, threads=False, activities=False)
+        subscribed += 1
+    gateway_log.info("Subscribed to %d of %d guild(s) (those with monitored channels)", subscribed,
+                     len(gateway.session.guilds))
+
+
+def sync_missed_messages(bot_client):
+    """
+    Fetch the last 50 messages from each monitored channel and process any
+    that contain episodes newer than last_episode. Covers gaps caused by
+    internet outages or bot restarts.
+    """
+    channel_ids = get_monitored_channel_ids()
+    if not channel_ids:
+        return
+
+    sync_log.info("Checking recent messages for missed downloads in %d channel(s)...", len(channel_ids))
+
+    total_recovered = 0
+    total_queued = 0
+
+    for channel_id in channel_ids:
+        try:
+            resp = bot_client.getMessages(channel_id, num=50)
+            if resp.status_code != 200:
+                sync_log.warning("Failed to fetch channel %s: HTTP %s", channel_id, resp.status_code)
+                continue
+
+            messages = resp.json()
+            if not messages:
+                continue
+
+            messages.sort(key=lambda m: int(m['id']))
+
+            count = 0
+            for msg in messages:
+                content = msg.get('content', '')
+                if not content:
+                    continue
+
+                matcher = channel_matcher(channel_id)
+                if matcher is None:
+                    break
+
+                scan = MessageScan(content)
+                for entry, episode in matcher.match(content):
+                    sync_log.info("Found missed: %s EP%s", entry["name"], episode,
+                                  extra={"entry": entry["name"], "episode": episode, "channel_id": channel_id})
+                    count += 1
+
+                    processor = get_processor(entry)
+                    platform_links = processor.find_platform_links(content, scan)
+                    if not platform_links:
+                        sync_log.info("No links found for %s EP%s, skipping", entry["name"], episode)
+                        continue
+
+                    downloaded = dispatch_episode(entry, episode, platform_links, channel_id, log=sync_log)
+                    if downloaded:
+                        total_recovered += 1
+                    elif downloaded is None:
+                        total_queued += 1
+
+            if count > 0:
+                sync_log.info("Channel %s: found %d missed episode(s)", channel_id, count)
+
+        except Exception:
+            sync_log.exception("Error scanning channel %s", channel_id)
+
+        time.sleep(1)
+
+    if total_queued > 0:
+        sync_log.info("Recovery complete: %d episode(s) handed to workers", total_queued)
+    elif total_recovered > 0:
+        sync_log.info("Recovery complete: %d episode(s) downloaded", total_recovered)
+    else:
+        sync_log.info("No missed episodes found, all caught up")
+
+
+# ============================================================================
+# BACKFILL
+# ============================================================================
+
+DISCORD_EPOCH_MS = 1420070400000
+BACKFILL_PAGE_SIZE = 100  # Discord's maximum for GET /channels/{id}/messages
+
+
+def to_snowflake(value):
+    """Message ID bound from a message ID or an ISO date ("2024-05-01", "2024-05-01T18:00+02:00")."""
+    value = str(value).strip()
+    if value.isdigit():
+        return int(value)
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.astimezone()  # naive dates are local time
+    return (int(moment.timestamp() * 1000) - DISCORD_EPOCH_MS) << 22
+
+
+def fetch_channel_history(bot_client, channel_id, after=None, before=None, log=backfill_log):
+    """
+    Yield a channel's messages newest first, paging back from `before`
+    (or the latest message) until `after` or the start of the channel.
+    Waits out 429s and empty rate-limit buckets instead of failing.
+    """
+    cursor = before
+    while True:
+        resp = bot_client.getMessages(channel_id, num=BACKFILL_PAGE_SIZE, beforeDate=cursor)
+        if resp.status_code == 429:
+            try:
+                retry_after = float(resp.json().get("retry_after", 1))
+            except ValueError:
+                retry_after = float(resp.headers.get("Retry-After", 1))
+            log.debug("Rate limited on channel %s, waiting %.1fs", channel_id, retry_after)
+            time.sleep(retry_after)
+            continue
+        if resp.status_code != 200:
+            raise RuntimeError(f"Failed to fetch channel {channel_id}: HTTP {resp.status_code}")
+
+        page = resp.json()
+        for msg in page:
+            if after is not None and int(msg["id"]) <= after:
+                return
+            yield msg
+        if len(page) < BACKFILL_PAGE_SIZE:
+            return
+        cursor = min(int(msg["id"]) for msg in page)
+
+        if resp.headers.get("X-RateLimit-Remaining") == "0":
+            time.sleep(float(resp.headers.get("X-RateLimit-Reset-After", 1)))
+
+
+def build_backfill_plan(bot_client, channel_ids, after=None, before=None, entry_names=None, log=backfill_log):
+    """
+    Match every message in the range against the channel's entries and
+    return one job per (entry, episode), oldest episode first. Reposts are
+    merged: the newest message's links win, older ones fill in platforms
+    it lacks. Episodes at or below last_episode are left out like live.
+    Returns (plan, messages scanned).
+    """
+    jobs = {}
+    scanned = 0
+    for channel_id in sorted(channel_ids):
+        matcher = channel_matcher(channel_id)
+        if matcher is None:
+            log.warning("No entries listen on channel %s, skipping", channel_id)
+            continue
+        channel_scanned = 0
+        for msg in fetch_channel_history(bot_client, channel_id, after, before, log):
+            channel_scanned += 1
+            content = msg.get("content", "")
+            if not content:
+                continue
+            scan = MessageScan(content)
+            for entry, episode in matcher.match(content):
+                if entry_names and entry["name"] not in entry_names:
+                    continue
+                links = get_processor(entry).find_platform_links(content, scan)
+                if not links:
+                    continue
+                key = (entry_section(entry), entry["name"], episode)
+                job = jobs.get(key)
+                if job is None:
+                    jobs[key] = {"section": key[0], "entry": entry["name"], "episode": episode,
+                                 "channel_id": channel_id, "message_id": msg["id"], "links": links,
+                                 "status": "pending"}
+                else:
+                    for platform, link in links.items():
+                        job["links"].setdefault(platform, link)
+        log.info("Channel %s: %d message(s) scanned", channel_id, channel_scanned)
+        scanned += channel_scanned
+
+    plan = sorted(jobs.values(), key=lambda job: (job["section"], job["entry"], job["episode"]))
+    return plan, scanned
+
+
+class BackfillProgress:
+    """
+    The plan of a backfill and the status of each job ("pending", "done",
+    "failed"), saved to a JSON file after every finished job so an
+    interrupted run continues where it stopped. `scope` records what was
+    asked for (channels, range, entries); a plan is only reused for the
+    same scope.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.scope = None
+        self.plan = []
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                data = json.load(f)
+            self.scope = data.get("scope")
+            self.plan = data.get("plan", [])
+
+    @staticmethod
+    def key(job):
+        return (job["section"], job["entry"], job["episode"])
+
+    def replace_plan(self, scope, plan):
+        """Start a new plan, keeping "done" for jobs the previous one already finished."""
+        done = {self.key(job) for job in self.plan if job["status"] == "done"}
+        for job in plan:
+            if self.key(job) in done:
+                job["status"] = "done"
+        self.scope = scope
+        self.plan = plan
+        self.save()
+
+    def mark(self, job, status):
+        with self._lock:
+            job["status"] = status
+            self._write()
+
+    def save(self):
+        with self._lock:
+            self._write()
+
+    def _write(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"scope": self.scope, "plan": self.plan}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def pending(self):
+        return [job for job in self.plan if job["status"] != "done"]
+
+    def highest_done(self, section, name):
+        """Highest episode of an entry this plan finished (0 if none)."""
+        with self._lock:
+            return max((job["episode"] for job in self.plan if job["status"] == "done"
+                        and job["section"] == section and job["entry"] == name), default=0)
+
+
+def print_backfill_plan(plan, scanned=None, details=False):
+    """Dry-run view of a plan: per-entry summary, and every job with `details`."""
+    flush_logging()  # the scan's log lines come first, not in the middle of the plan
+    todo = [job for job in plan if job["status"] != "done"]
+    header = f"Backfill plan: {len(plan)} episode(s), {len(todo)} to download"
+    if scanned is not None:
+        header += f", {scanned} message(s) scanned"
+    print(header)
+
+    by_entry = {}
+    for job in plan:
+        by_entry.setdefault((job["section"], job["entry"]), []).append(job)
+    for (section, name), jobs in by_entry.items():
+        episodes = [job["episode"] for job in jobs]
+        platforms = {}
+        for job in jobs:
+            for platform in job["links"]:
+                platforms[platform] = platforms.get(platform, 0) + 1
+        done = sum(job["status"] == "done" for job in jobs)
+        print(f"  [{section}] {name}: {len(jobs)} episode(s) EP{min(episodes)}-EP{max(episodes)}, "
+              f"{done} done ({', '.join(f'{p} {n}' for p, n in platforms.items())})")
+        if details:
+            for job in jobs:
+                print(f"      EP{job['episode']:<5} {job['status']:<8} {', '.join(job['links'])}"
+                      f"  (message {job['message_id']})")
+
+
+def run_backfill(progress, jobs=3, log=backfill_log):
+    """Download every job of the plan that is not done yet on `jobs` threads. Returns (done, failed)."""
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    todo = progress.pending()
+    counts = {"done": 0, "failed": 0, "skipped": 0}
+
+    def run(job):
+        entry = find_entry(job["section"], job["entry"])
+        if entry is None:
+            log.warning("%s is no longer in settings.json, skipping EP%s", job["entry"], job["episode"])
+            return "failed"
+        # The bot may have got it since the plan was made. A last_episode raised by this plan's own
+        # finished jobs does not count: a failed job resumed after later ones finished is still wanted.
+        with config_lock:
+            last_episode = entry.get("last_episode", 0)
+        if job["episode"] <= last_episode and last_episode > progress.highest_done(job["section"], job["entry"]):
+            log.info("%s EP%s already downloaded (last_episode %d), skipping", job["entry"], job["episode"],
+                     last_episode, extra={"entry": job["entry"], "episode": job["episode"]})
+            return "skipped"
+        ok = download_episode(entry, job["episode"], job["links"], job["channel_id"], log=log)
+        return "done" if ok else "failed"
+
+    log.info("Backfilling %d episode(s) with %d parallel download(s)", len(todo), jobs)
+    executor = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="backfill")
+    try:
+        futures = {executor.submit(run, job): job for job in todo}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                status = future.result()
+            except Exception:
+                log.exception("Backfill of %s EP%s crashed", job["entry"], job["episode"])
+                status = "failed"
+            progress.mark(job, "done" if status == "skipped" else status)
+            counts[status] += 1
+            log.info("[%d/%d] %s EP%s %s", sum(counts.values()), len(todo), job["entry"],
+                     job["episode"], status, extra={"entry": job["entry"], "episode": job["episode"]})
+    except KeyboardInterrupt:
+        log.warning("Interrupted, waiting for running downloads. Progress is saved in %s", progress.path)
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    executor.shutdown(wait=True)
+    return counts["done"], counts["failed"]
+
+
+def backfill_main(argv=None):
+    """`downloader.py backfill`: download a channel's history instead of waiting for new messages."""
+    import argparse
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(
+        prog="downloader.py backfill",
+        description="Download the episodes found in the full history (or a range) of monitored channels.")
+    parser.add_argument("--settings", help="Path to settings.json (default: $SETTINGS_PATH or next to this file)")
+    parser.add_argument("--channel", action="append", help="Channel ID (repeatable, default: all monitored)")
+    parser.add_argument("--entry", action="append", help="Only this entry name (repeatable)")
+    parser.add_argument("--after", help="Only messages after this message ID or date (e.g. 2024-05-01)")
+    parser.add_argument("--before", help="Only messages before this message ID or date")
+    parser.add_argument("--jobs", type=int, default=3, help="Parallel downloads (default: 3)")
+    parser.add_argument("--progress", help="Progress file (default: backfill_progress.json next to settings.json)")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Fetch the history again even if the progress file has a plan for this scope")
+    parser.add_argument("--dry-run", action="store_true", help="Show the plan and exit")
+    parser.add_argument("--yes", action="store_true", help="Start without asking")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    load_env()
+    setup_logging()
+    load_config(args.settings)
+
+    monitored = get_monitored_channel_ids()
+    if args.channel:
+        channel_ids = set(args.channel)
+    elif args.entry:
+        with config_lock:
+            channel_ids = {entry["channel_id"] for _, entry in _iter_entries(config) if entry["name"] in args.entry}
+    else:
+        channel_ids = monitored
+    unknown = channel_ids - monitored
+    if unknown:
+        parser.error(f"No entries listen on channel(s) {', '.join(sorted(unknown))}")
+    if not channel_ids:
+        parser.error("Nothing to backfill: no matching channels")
+
+    scope = {
+        "channels": sorted(channel_ids),
+        "after": args.after,
+        "before": args.before,
+        "entries": sorted(args.entry or []),
+    }
+    progress = BackfillProgress(args.progress or os.path.join(os.path.dirname(CONFIG_PATH),
+                                                              "backfill_progress.json"))
+    scanned = None
+    if progress.scope == scope and progress.plan and not args.refresh:
+        backfill_log.info("Resuming plan from %s", progress.path)
+    else:
+        import discum
+        bot = discum.Client(token=DISCORD_TOKEN, log=False)
+        after = to_snowflake(args.after) if args.after else None
+        before = to_snowflake(args.before) if args.before else None
+        plan, scanned = build_backfill_plan(bot, channel_ids, after, before, set(args.entry or ()))
+        progress.replace_plan(scope, plan)
+
+    print_backfill_plan(progress.plan, scanned, details=args.dry_run)
+    if args.dry_run or not progress.pending():
+        return 0
+    if not args.yes:
+        flush_logging()
+        if not sys.stdin.isatty():
+            print("Run again with --yes to start the downloads.")
+            return 1
+        if input(f"Download {len(progress.pending())} episode(s)? [y/N] ").strip().lower() not in ("y", "yes"):
+            return 1
+
+    try:
+        done, failed = run_backfill(progress, max(1, args.jobs))
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        staging_mover.shutdown()  # queues post_download steps
+        post_download.shutdown()
+    if failed:
+        backfill_log.warning("Backfill finished: %d downloaded, %d failed (run again to retry them)", done, failed)
+        return 1
+    backfill_log.info("Backfill finished: %d downloaded", done)
+    return 0
+
+
+# ============================================================================
+# CONTROL API
+# ============================================================================
+
+JOB_ACTIONS = ("pause", "resume", "cancel", "priority")
+RETRY_ACTIONS = ("pause", "resume", "cancel", "priority", "retry")
+
+
+def retry_item_id(item):
+    """Stable id of a retry queue item (its section, entry, episode, platform and link)."""
+    return f"{zlib.crc32(json.dumps(_retry_key(item)).encode()):08x}"
+
+
+def retry_item_snapshot(item):
+    return {
+        "id": retry_item_id(item),
+        "section": item.get("section"),
+        "entry": item["entry_name"],
+        "episode": item["episode"],
+        "platform": item["platform"],
+        "reason": item.get("reason"),
+        "attempts": item.get("attempts"),
+        "next_retry": item.get("next_retry"),
+        "paused": bool(item.get("paused")),
+        "priority": item.get("priority", 0),
+    }
+
+
+def parse_control_address(address):
+    """'unix:/path' -> ("unix", path); 'host:port' or 'port' -> ("tcp", (host, port)), host defaults to 127.0.0.1."""
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return "tcp", (host or "127.0.0.1", int(port))
+
+
+def worker_control_address(address, index):
+    """Control address of worker `index`: the next ports after the gateway's, or the socket path plus .N."""
+    kind, where = parse_control_address(address)
+    if kind == "unix":
+        return f"unix:{where}.{index}"
+    return f"{where[0]}:{where[1] + 1 + index}"
+
+
+class ControlServer:
+    """
+    Local HTTP control API, on a TCP port or a Unix socket:
+    
+        GET  /jobs                  downloads of this process and the retry queue
+        GET  /jobs/{id}
+        POST /jobs/{id}/{action}    pause, resume, cancel, priority ({"priority": n})
+        GET  /retry
+        POST /retry/{id}/{action}   pause, resume, cancel, priority, retry (due now)
+    
+    There is no authentication: bind it to localhost or a socket only the
+    bot's user can open.
+    """
+    
+    def __init__(self, address, retry_scheduler=None):
+        self.address = address
+        self.retry_scheduler = retry_scheduler
+        self._server = None
+    
+    def start(self):
+        import socketserver
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        control = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def log_message(self, format, *args):
+                control_log.debug(format, *args)
+            
+            def do_GET(self):
+                self._dispatch("GET")
+            
+            def do_POST(self):
+                self._dispatch("POST")
+            
+            def _dispatch(self, method):
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    raw = self.rfile.read(length) if length else b""
+                    try:
+                        body = json.loads(raw) if raw else {}
+                    except ValueError:
+                        status, data = 400, {"error": "body is not valid JSON"}
+                    else:
+                        status, data = control.handle(method, self.path, body)
+                except Exception:
+                    control_log.exception("✗ Control request failed: %s %s", method, self.path)
+                    status, data = 500, {"error": "internal error"}
+                payload = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+        
+        kind, where = parse_control_address(self.address)
+        if kind == "unix":
+            if os.path.exists(where):
+                os.remove(where)  # left over from a previous run
+            self._server = socketserver.ThreadingUnixStreamServer(where, Handler)
+            os.chmod(where, 0o600)
+        else:
+            self._server = ThreadingHTTPServer(where, Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="control-api", daemon=True).start()
+        control_log.info("Control API listening on %s", self.address)
+        return self
+    
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+    
+    def handle(self, method, path, body):
+        """Route one request. Returns (HTTP status, JSON-able dict)."""
+        parts = [part for part in path.split("?", 1)[0].split("/") if part]
+        if method == "GET" and parts == ["jobs"]:
+            return 200, {"jobs": [job.snapshot() for job in jobs.list()], "retry_queue": self._retry_items()}
+        if method == "GET" and parts == ["retry"]:
+            return 200, {"retry_queue": self._retry_items()}
+        if parts[:1] == ["jobs"] and len(parts) in (2, 3):
+            job = jobs.get(int(parts[1])) if parts[1].isdigit() else None
+            if job is None:
+                return 404, {"error": f"no running or queued job {parts[1]}"}
+            if method == "GET" and len(parts) == 2:
+                return 200, job.snapshot()
+            if method == "POST" and len(parts) == 3:
+                return self._job_action(job, parts[2], body)
+        if method == "POST" and parts[:1] == ["retry"] and len(parts) == 3:
+            return self._retry_action(parts[1], parts[2], body)
+        return 404, {"error": f"no route for {method} {path}"}
+    
+    @staticmethod
+    def _priority(body):
+        priority = body.get("priority") if isinstance(body, dict) else None
+        if isinstance(priority, bool) or not isinstance(priority, int):
+            return None
+        return priority
+    
+    def _job_action(self, job, action, body):
+        if action not in JOB_ACTIONS:
+            return 400, {"error": f"unknown action {action!r}, expected one of {list(JOB_ACTIONS)}"}
+        if action == "priority":
+            priority = self._priority(body)
+            if priority is None:
+                return 400, {"error": 'expected {"priority": <integer>}'}
+            job.priority = priority
+        else:
+            getattr(job, action)()
+        jobs.changed()
+        control_log.info("Job %d (%s EP%s): %s", job.id, job.entry_name, job.episode, action,
+                         extra={"job": job.id, "entry": job.entry_name, "episode": job.episode, "action": action})
+        return 200, job.snapshot()
+    
+    def _retry_items(self):
+        with config_lock:
+            return [retry_item_snapshot(item) for item in config.get("retry_queue", []) if owns_retry_item(item)]
+    
+    def _retry_action(self, item_id, action, body):
+        if action not in RETRY_ACTIONS:
+            return 400, {"error": f"unknown action {action!r}, expected one of {list(RETRY_ACTIONS)}"}
+        priority = self._priority(body)
+        if action == "priority" and priority is None:
+            return 400, {"error": 'expected {"priority": <integer>}'}
+        
+        with settings_file_lock():
+            retry_queue = config.setdefault("retry_queue", [])
+            item = next((queued for queued in retry_queue if retry_item_id(queued) == item_id), None)
+            if item is None:
+                return 404, {"error": f"no retry queue item {item_id}"}
+            if action == "cancel":
+                retry_queue[:] = [queued for queued in retry_queue if queued is not item]
+            elif action == "pause":
+                item["paused"] = True
+            elif action == "resume":
+                item.pop("paused", None)
+            elif action == "priority":
+                item["priority"] = priority
+            else:  # retry
+                item.pop("paused", None)
+                item["next_retry"] = datetime.now().isoformat()
+            save_config()
+        
+        control_log.info("Retry item %s (%s EP%s): %s", item_id, item["entry_name"], item["episode"], action,
+                         extra={"entry": item["entry_name"], "episode": item["episode"], "action": action})
+        if action == "retry" and self.retry_scheduler is not None:
+            self.retry_scheduler.kick()
+        return 200, retry_item_snapshot(item)
+
+
+# ============================================================================
+# WORKER PROCESSES
+# ============================================================================
+
+# Both set only in --workers mode: the pool lives in the gateway process,
+# _shard = (index, count, shard_by) in each worker process.
+_worker_pool = None
+_shard = None
+
+WORKER_IDLE_SECONDS = 60  # how often an idle worker checks that the gateway process is alive
+
+
+def shard_for(section, channel_id, count, shard_by="channel"):
+    """Worker index for an entry. Uses crc32 so every process agrees (hash() is salted per process)."""
+    key = section if shard_by == "section" else channel_id
+    return zlib.crc32(str(key).encode()) % count
+
+
+def owns_retry_item(item):
+    """Whether this process retries `item`: always, unless it is a worker and the item is another shard's."""
+    if _shard is None:
+        return True
+    index, count, shard_by = _shard
+    section = retry_item_entry(item)[0] if shard_by == "section" else None
+    return shard_for(section, item["channel_id"], count, shard_by) == index
+
+
+class WorkerPool:
+    """
+    Gateway side of --workers. Matched episodes are sent to one worker
+    process per shard, each with its own queue, so a worker stuck on a slow
+    transfer only delays the entries it owns. Workers share settings.json
+    (last_episode, retry_queue) through settings_file_lock().
+    """
+
+    def __init__(self, count, shard_by="channel"):
+        import multiprocessing
+        if shard_by not in ("channel", "section"):
+            raise ValueError(f"shard_by must be 'channel' or 'section', not {shard_by!r}")
+        self.count = count
+        self.shard_by = shard_by
+        # spawn, not fork: the gateway already runs logging and watcher threads
+        self._ctx = multiprocessing.get_context("spawn")
+        self._queues = [self._ctx.Queue() for _ in range(count)]
+        self._procs = [None] * count
+
+    def start(self):
+        for index in range(self.count):
+            self._spawn(index)
+        gateway_log.info("Started %d worker processes (sharded by %s)", self.count, self.shard_by)
+
+    def _spawn(self, index):
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self.count, self.shard_by, CONFIG_PATH, self._queues[index], os.getpid()),
+            name=f"autodl-worker-{index}",
+            daemon=True,
+        )
+        proc.start()
+        self._procs[index] = proc
+
+    def submit(self, entry, episode, platform_links, channel_id):
+        """Queue a download for the worker that owns the entry."""
+        section = entry_section(entry)
+        index = shard_for(section, channel_id, self.count, self.shard_by)
+        proc = self._procs[index]
+        if not proc.is_alive():
+            gateway_log.warning("⚠ Worker %d exited (code %s), restarting", index, proc.exitcode)
+            self._spawn(index)
+        self._queues[index].put({
+            "section": section,
+            "entry_name": entry["name"],
+            "episode": episode,
+            "links": platform_links,
+            "channel_id": channel_id,
+        })
+        gateway_log.info("%s EP%s queued for worker %d", entry["name"], episode, index,
+                         extra={"entry": entry["name"], "episode": episode, "worker": index})
+
+    def stop(self, timeout=10):
+        for jobs in self._queues:
+            jobs.put(None)
+        for proc in self._procs:
+            if proc is None:
+                continue
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.terminate()
+
+
+def _worker_main(index, count, shard_by, settings_path, jobs, parent_pid):
+    """Worker process: download jobs from the gateway and retry this shard's items."""
+    global _shard
+    load_env()
+    setup_logging()
+    load_config(settings_path)
+    _shard = (index, count, shard_by)
+    install_profiler()
+    if CONFIG_WATCH != "off":
+        ConfigWatcher(CONFIG_PATH, mode=CONFIG_WATCH, poll_interval=CONFIG_POLL_INTERVAL).start()
+
+    log = logging.getLogger(f"autodl.worker{index}")
+    log.info("Worker %d/%d ready (pid %d)", index + 1, count, os.getpid())
+    # Retries run beside the job loop, so a slow retry never holds up fresh episodes
+    retry_scheduler = RetryScheduler().start()
+    if CONTROL_ADDR:
+        ControlServer(worker_control_address(CONTROL_ADDR, index), retry_scheduler).start()
+
+    while True:
+        try:
+            job = jobs.get(timeout=WORKER_IDLE_SECONDS)
+        except queue.Empty:
+            job = {}
+        if job is None:
+            break
+        if os.getppid() != parent_pid:
+            log.warning("⚠ Gateway process is gone, exiting")
+            break
+
+        if not job:
+            continue
+        try:
+            # Pick up last_episode written by other processes even without a ConfigWatcher
+            # (CONFIG_WATCH=off): reads the file under its lock, parses it only if it changed
+            reload_config()
+            entry = find_entry(job["section"], job["entry_name"])
+            if entry is None:
+                log.warning("%s is no longer in settings.json, dropping EP%s", job["entry_name"], job["episode"])
+            elif job["episode"] <= entry.get("last_episode", 0):
+                # Another trigger (sync, repost) already got it while this job was queued
+                log.info("%s EP%s already downloaded, skipping", job["entry_name"], job["episode"])
+            else:
+                download_episode(entry, job["episode"], job["links"], job["channel_id"], log=log)
+        except Exception:
+            log.exception("✗ Job failed: %s", job)
+
+
+# ============================================================================
+# PROFILING
+# ============================================================================
+
+# Module functions install_profiler() wraps; reports are named after them
+PROFILED_FUNCTIONS = ("handle_new_message", "handle_message_batch", "sync_missed_messages", "process_retry_queue")
+
+
+class Profiler:
+    """
+    Sampled cProfile + tracemalloc around single calls. wrap(func) returns
+    a function that profiles one call in `every` and writes a text report
+    (top functions by cumulative time, top allocating lines) to
+    `directory`, deleting the oldest reports once they take more than
+    `max_bytes`. cProfile only sees the calling thread; tracemalloc sees
+    allocations from every thread. One call is profiled at a time, calls
+    overlapping it run unprofiled.
+    """
+    
+    def __init__(self, directory, every=1, max_bytes=100 * 1024 * 1024, top=30, frames=1):
+        self.directory = directory
+        self.every = every
+        self.max_bytes = max_bytes
+        self.top = top
+        self.frames = frames
+        self._lock = threading.Lock()
+        self._reports = itertools.count(1)
+    
+    def wrap(self, func):
+        calls = itertools.count()
+        
+        @functools.wraps(func)
+        def profiled(*args, **kwargs):
+            if next(calls) % self.every or not self._lock.acquire(blocking=False):
+                return func(*args, **kwargs)
+            try:
+                return self._profile(func, args, kwargs)
+            finally:
+                self._lock.release()
+        
+        return profiled
+    
+    def _profile(self, func, args, kwargs):
+        import cProfile
+        import tracemalloc
+        own_tracing = not tracemalloc.is_tracing()
+        if own_tracing:
+            tracemalloc.start(self.frames)
+        tracemalloc.reset_peak()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # another profiler is active, e.g. python -m cProfile
+            if own_tracing:
+                tracemalloc.stop()
+            return func(*args, **kwargs)
+        
+        started = time.perf_counter()
+        outcome = "returned"
+        try:
+            return func(*args, **kwargs)
+        except BaseException as e:
+            outcome = f"raised {type(e).__name__}: {e}"
+            raise
+        finally:
+            profile.disable()
+            seconds = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            if own_tracing:
+                tracemalloc.stop()
+            try:
+                self._write_report(func.__name__, args, seconds, outcome, profile, snapshot, peak)
+            except Exception:
+                profile_log.exception("✗ Could not write profile report for %s", func.__name__)
+    
+    def _write_report(self, name, args, seconds, outcome, profile, snapshot, peak):
+        import io
+        import pstats
+        import tracemalloc
+        stats_text = io.StringIO()
+        stats = pstats.Stats(profile, stream=stats_text)
+        stats.sort_stats("cumulative").print_stats(self.top)
+        
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+        allocations = snapshot.statistics("lineno")
+        
+        now = datetime.now()
+        filename = f"{now:%Y%m%d-%H%M%S}-{name}-{os.getpid()}-{next(self._reports)}.txt"
+        path = os.path.join(self.directory, filename)
+        call = ", ".join(repr(arg) for arg in args)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"{name}({call[:300]}{'...' if len(call) > 300 else ''})\n")
+            f.write(f"{now:%Y-%m-%d %H:%M:%S}  pid {os.getpid()}  thread {threading.current_thread().name}\n")
+            f.write(f"{outcome} after {seconds:.3f}s, traced memory peak {peak / 1024:.1f} KiB, "
+                    f"{sum(stat.size for stat in allocations) / 1024:.1f} KiB still allocated at return\n")
+            f.write("\n== Top functions (cumulative time) ==\n")
+            f.write(stats_text.getvalue())
+            f.write("\n== Top allocations by line (still allocated at return, all threads) ==\n")
+            for stat in allocations[:self.top]:
+                f.write(f"{stat}\n")
+        
+        profile_log.info("%s took %.3fs, report: %s", name, seconds, path,
+                         extra={"function": name, "seconds": round(seconds, 3), "report": path})
+        self._rotate(path)
+    
+    def _rotate(self, keep):
+        """Delete the oldest reports until the directory is back under max_bytes (never `keep`)."""
+        reports = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".txt") and entry.is_file():
+                    stat = entry.stat()
+                    reports.append((stat.st_mtime, entry.path, stat.st_size))
+        total = sum(size for _, _, size in reports)
+        for _, path, size in sorted(reports):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            _remove_partial(path)
+            total -= size
+
+
+def install_profiler(directory=None):
+    """
+    Wrap PROFILED_FUNCTIONS with a Profiler writing to `directory`
+    (default PROFILE_DIR). Without a directory nothing is wrapped, so
+    profiling costs nothing unless enabled.
+    """
+    directory = directory or PROFILE_DIR
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    profiler = Profiler(directory, PROFILE_EVERY, PROFILE_MAX_MB * 1024 * 1024)
+    module = globals()
+    for name in PROFILED_FUNCTIONS:
+        module[name] = profiler.wrap(getattr(module[name], "__wrapped__", module[name]))
+    profile_log.info("Profiling %s (one call in %d) into %s", ", ".join(PROFILED_FUNCTIONS), PROFILE_EVERY,
+                     directory)
+    return profiler
+
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main(argv=None):
+    """Entry point: load .env and settings.json, connect to Discord and run forever."""
+    global _worker_pool, _message_batcher
+    import argparse
+    from dotenv import load_dotenv
+
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["backfill"]:
+        sys.exit(backfill_main(argv[1:]))
+
+    parser = argparse.ArgumentParser(description="Monitor Discord channels and auto-download new episodes.")
+    parser.add_argument("--settings", help="Path to settings.json (default: $SETTINGS_PATH or next to this file)")
+    parser.add_argument("--workers", type=int, help="Download in N worker processes (default: $WORKERS or 0)")
+    parser.add_argument("--shard-by", choices=["channel", "section"],
+                        help="How entries are assigned to workers (default: $SHARD_BY or channel)")
+    parser.add_argument("--control", help="Control API address, host:port or unix:/path (default: $CONTROL_ADDR)")
+    parser.add_argument("--profile", metavar="DIR",
+                        help="Write profiling reports of message, sync and retry handling to DIR "
+                             "(default: $PROFILE_DIR)")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    load_env()
+    setup_logging()
+    load_config(args.settings)
+    if CONFIG_WATCH != "off":
+        ConfigWatcher(CONFIG_PATH, mode=CONFIG_WATCH, poll_interval=CONFIG_POLL_INTERVAL).start()
+
+    control_addr = args.control if args.control is not None else CONTROL_ADDR
+    if control_addr:
+        os.environ["CONTROL_ADDR"] = control_addr  # read by spawned workers in load_env()
+
+    if args.profile:
+        os.environ["PROFILE_DIR"] = args.profile  # likewise
+    install_profiler(args.profile)
+
+    # Before any download can stage new files
+    staging_mover.recover()
+
+    workers = args.workers if args.workers is not None else WORKERS
+    if workers > 0:
+        _worker_pool = WorkerPool(workers, args.shard_by or SHARD_BY)
+        _worker_pool.start()
+
+    # Workers retry their own share of the queue
+    retry_scheduler = RetryScheduler().start() if _worker_pool is None else None
+
+    if control_addr:
+        ControlServer(control_addr, retry_scheduler).start()
+
+    if MESSAGE_BATCH_SECONDS > 0:
+        _message_batcher = MessageBatcher().start()
+
+    import discum
+    bot = discum.Client(token=DISCORD_TOKEN, log=False)
+
+    @bot.gateway.command
+    def on_message(resp):
+        if resp.event.message:
+            handle_gateway_message(resp)
+
+        elif resp.event.ready_supplemental:
+            gateway_log.info("Ready to process")
+            if GATEWAY_SUBSCRIBE == "monitored":
+                subscribe_monitored_guilds(bot.gateway)
+            sync_missed_messages(bot)
+            if retry_scheduler is not None:
+                retry_scheduler.kick()
+
+    while True:
+        try:
+            bot.gateway.run(auto_reconnect=True)
+        except Exception:
+            gateway_log.exception("⚠️ Crash or disconnect")
+            time.sleep(10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,668 @@
+"""
+Local stand-in servers for Pixeldrain, Google Drive, Mega and Discord REST.
+
+They speak just enough of each service's HTTP surface for the downloaders
+and sync code to run against them without network access, with
+configurable time-to-first-byte and bandwidth so throughput can be
+benchmarked (see bench_throughput.py).
+
+    with FakePixeldrain(latency=0.05, bandwidth=20 * 1024 * 1024) as pd:
+        file_id = pd.add_file("Show - 01.mkv", 64 * 1024 * 1024)
+        PixeldrainDownloader(base_url=pd.url).download(f"{pd.url}/u/{file_id}", ...)
+
+Run standalone to keep a populated set of servers up for manual testing:
+
+    python fake_servers.py --files 20 --size 8M
+"""
+
+import re
+import json
+import time
+import random
+import string
+import zipfile
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+CHUNK_SIZE = 64 * 1024
+_PATTERN = bytes(range(256)) * (CHUNK_SIZE // 256 + 1)  # byte N of every payload is N % 256
+
+
+def random_id(length=8):
+    return "".join(random.choices(string.ascii_letters + string.digits, k=length))
+
+
+_SIZE_RE = re.compile(r"(\d+(?:\.\d*)?|\.\d+)\s*(?:([KMG])(?:I?B)?|B)?", re.IGNORECASE)
+SIZE_FORMAT = "bytes, or with a K/M/G, KB/MB/GB or KiB/MiB/GiB suffix (all powers of 1024)"
+
+
+def parse_size(text):
+    """'512', '64K', '16MB', '1.5GiB' -> bytes. Every suffix is binary, so 16M, 16MB and 16MiB agree."""
+    match = _SIZE_RE.fullmatch(str(text).strip())
+    if match is None:
+        raise ValueError(f"invalid size {text!r}: expected {SIZE_FORMAT}")
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** ("KMG".index(unit.upper()) + 1 if unit else 0))
+
+
+# ============================================================================
+# SERVER BASE
+# ============================================================================
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def _dispatch(self):
+        parts = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        self.server.app.requests += 1
+        if self.server.app.latency:
+            time.sleep(self.server.app.latency)
+        try:
+            self.server.app.handle(self, parts.path, query)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class FakeServer:
+    """
+    Threaded HTTP server on 127.0.0.1 with an ephemeral port.
+
+    Args:
+        latency: Seconds to wait before answering each request (TTFB)
+        bandwidth: Bytes/sec cap per response body, 0 for unlimited
+        stall_after: Bytes into a response body after which it trickles
+            one byte per second, for the next `stalls` payload responses
+        ranges: Honour `Range: bytes=N-` (False answers 200 with the whole body)
+    """
+
+    def __init__(self, latency=0.0, bandwidth=0, port=0, stall_after=None, stalls=1, ranges=True):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.stall_after = stall_after
+        self.stalls = stalls
+        self.ranges = ranges
+        self.requests = 0
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.app = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handle(self, handler, path, query):
+        raise NotImplementedError
+
+    # Response helpers
+
+    def send_json(self, handler, data, status=200, headers=None):
+        body = json.dumps(data).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            handler.send_header(key, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def send_html(self, handler, html, status=200):
+        body = html.encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "text/html; charset=utf-8")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def send_not_found(self, handler):
+        self.send_json(handler, {"success": False, "value": "not_found"}, status=404)
+
+    def read_json(self, handler):
+        length = int(handler.headers.get("Content-Length") or 0)
+        return json.loads(handler.rfile.read(length) or b"null")
+
+    def send_payload(self, handler, size, filename=None, content_type="application/octet-stream", cipher=None):
+        """
+        Stream `size` deterministic bytes, honouring `Range: bytes=N-`, the
+        bandwidth cap and stall knobs. cipher(start), if given, returns an
+        object whose encrypt() is applied to the bytes from `start` on.
+        """
+        start = 0
+        status = 200
+        range_match = re.match(r"bytes=(\d+)-$", handler.headers.get("Range", ""))
+        if self.ranges and range_match and int(range_match.group(1)) < size:
+            start = int(range_match.group(1))
+            status = 206
+
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(size - start))
+        handler.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            handler.send_header("Content-Range", f"bytes {start}-{size - 1}/{size}")
+        if filename:
+            handler.send_header("Content-Disposition", f'attachment; filename="{filename}"')
+        handler.end_headers()
+
+        stall_at = None
+        if self.stall_after is not None and self.stalls > 0:
+            self.stalls -= 1
+            stall_at = self.stall_after
+
+        encryptor = cipher(start) if cipher else None
+        sent = 0
+        remaining = size - start
+        began = time.monotonic()
+        while remaining > 0:
+            length = min(CHUNK_SIZE, remaining)
+            if stall_at is not None:
+                if sent >= stall_at:
+                    length = 1
+                    handler.wfile.flush()
+                    time.sleep(1)
+                else:
+                    length = min(length, stall_at - sent)
+            offset = (start + sent) % 256
+            chunk = _PATTERN[offset:offset + length]
+            if encryptor is not None:
+                chunk = encryptor.encrypt(chunk)
+            handler.wfile.write(chunk)
+            remaining -= len(chunk)
+            sent += len(chunk)
+            if self.bandwidth:
+                ahead = sent / self.bandwidth - (time.monotonic() - began)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+
+# ============================================================================
+# PIXELDRAIN
+# ============================================================================
+
+class _ThrottledWriter:
+    """Write-only stream over handler.wfile that honours the bandwidth cap (and has no tell())."""
+
+    def __init__(self, wfile, bandwidth):
+        self.wfile = wfile
+        self.bandwidth = bandwidth
+        self.sent = 0
+        self.began = time.monotonic()
+
+    def write(self, data):
+        self.wfile.write(data)
+        self.sent += len(data)
+        if self.bandwidth:
+            ahead = self.sent / self.bandwidth - (time.monotonic() - self.began)
+            if ahead > 0:
+                time.sleep(ahead)
+        return len(data)
+
+    def flush(self):
+        self.wfile.flush()
+
+
+class FakePixeldrain(FakeServer):
+    """
+    Serves /api/file/{id}, /api/file/{id}/info, /api/list/{id}, the
+    /api/list/{id}/zip archive and the /l/{id} viewer page with its
+    embedded window.viewer_data.
+
+    Args:
+        archive_compression: zipfile.ZIP_STORED or ZIP_DEFLATED for list archives
+    """
+
+    def __init__(self, archive_compression=zipfile.ZIP_STORED, **kwargs):
+        super().__init__(**kwargs)
+        self.archive_compression = archive_compression
+        self.files = {}
+        self.lists = {}
+        self.quota_exceeded = set()
+
+    def add_file(self, name, size, uploaded=None, file_id=None):
+        file_id = file_id or random_id()
+        uploaded = uploaded or datetime.now(timezone.utc)
+        date = uploaded.isoformat().replace("+00:00", "Z")
+        # Same fields as the real /info response, so list pages have a realistic size
+        self.files[file_id] = {
+            "id": file_id,
+            "name": name,
+            "size": size,
+            "views": 0,
+            "bandwidth_used": 0,
+            "bandwidth_used_paid": 0,
+            "downloads": 0,
+            "date_upload": date,
+            "date_last_view": date,
+            "mime_type": "video/x-matroska",
+            "thumbnail_href": f"/file/{file_id}/thumbnail",
+            "hash_sha256": "%064x" % random.getrandbits(256),
+            "delete_after_date": "0001-01-01T00:00:00Z",
+            "delete_after_downloads": 0,
+            "availability": "",
+            "availability_message": "",
+            "abuse_type": "",
+            "abuse_reporter_name": "",
+            "can_edit": False,
+            "can_download": True,
+            "show_ads": True,
+            "allow_video_player": True,
+            "download_speed_limit": 0,
+        }
+        return file_id
+
+    def add_list(self, file_ids, title="Batch", list_id=None):
+        list_id = list_id or random_id()
+        self.lists[list_id] = {"title": title, "files": list(file_ids)}
+        return list_id
+
+    def _list_response(self, list_id):
+        data = self.lists[list_id]
+        files = [dict(self.files[f], detail_href=f"/file/{f}/info") for f in data["files"]]
+        return {"success": True, "id": list_id, "title": data["title"],
+                "file_count": len(files), "files": files}
+
+    def send_archive(self, handler, list_id):
+        """
+        Stream the list as a zip built on the fly: no Content-Length, no
+        Range support, sizes and CRCs in data descriptors after each member.
+        """
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/zip")
+        handler.send_header("Content-Disposition", f'attachment; filename="{self.lists[list_id]["title"]}.zip"')
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        handler.close_connection = True
+        with zipfile.ZipFile(_ThrottledWriter(handler.wfile, self.bandwidth), "w",
+                             self.archive_compression) as archive:
+            for file_id in self.lists[list_id]["files"]:
+                meta = self.files[file_id]
+                with archive.open(meta["name"], "w", force_zip64=meta["size"] >= 0x7FFFFFFF) as member:
+                    written = 0
+                    while written < meta["size"]:
+                        offset = written % 256
+                        chunk = _PATTERN[offset:offset + min(CHUNK_SIZE, meta["size"] - written)]
+                        member.write(chunk)
+                        written += len(chunk)
+
+    def handle(self, handler, path, query):
+        match = re.match(r"^/api/file/([^/]+)(/info)?$", path)
+        if match:
+            file_id, info = match.groups()
+            if file_id not in self.files:
+                return self.send_not_found(handler)
+            if info:
+                return self.send_json(handler, self.files[file_id])
+            if file_id in self.quota_exceeded:
+                return self.send_json(handler, {
+                    "success": False,
+                    "value": "file_rate_limited_captcha_required",
+                    "message": "This file has exceeded its download quota",
+                }, status=200)
+            meta = self.files[file_id]
+            return self.send_payload(handler, meta["size"], meta["name"], meta["mime_type"])
+
+        match = re.match(r"^/api/list/([^/]+)(/zip)?$", path)
+        if match:
+            list_id, zip_ = match.groups()
+            if list_id not in self.lists:
+                return self.send_not_found(handler)
+            if zip_:
+                return self.send_archive(handler, list_id)
+            return self.send_json(handler, self._list_response(list_id))
+
+        match = re.match(r"^/l/([^/]+)$", path)
+        if match:
+            if match.group(1) not in self.lists:
+                return self.send_not_found(handler)
+            viewer_data = {"type": "list", "api_response": self._list_response(match.group(1))}
+            return self.send_html(handler, (
+                "<!DOCTYPE html><html><head><title>pixeldrain</title>\n"
+                f"<script>window.viewer_data = {json.dumps(viewer_data)};</script>\n"
+                "</head><body><div id=\"body\"></div></body></html>"
+            ))
+
+        self.send_not_found(handler)
+
+
+# ============================================================================
+# GOOGLE DRIVE
+# ============================================================================
+
+class FakeGoogleDrive(FakeServer):
+    """
+    Serves both the drive.usercontent.google.com `/download` endpoint and
+    the legacy drive.google.com `/uc` endpoint, so point both
+    GoogleDriveDownloader URLs at `url`.
+
+    Each file has a mode:
+        direct:    /download returns the file straight away
+        confirm_t: /download returns the virus-scan interstitial until confirm=t
+        legacy:    only the token from the /uc interstitial unlocks the file
+        quota:     every request returns the quota exceeded page
+    """
+
+    MODES = ("direct", "confirm_t", "legacy", "quota")
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.files = {}
+
+    def add_file(self, name, size, mode="direct", file_id=None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown mode: {mode}")
+        file_id = file_id or random_id(33)
+        self.files[file_id] = {"name": name, "size": size, "mode": mode, "token": random_id(12)}
+        return file_id
+
+    def _interstitial(self, file_id):
+        name = self.files[file_id]["name"]
+        return (
+            "<!DOCTYPE html><html><head><title>Google Drive - Virus scan warning</title></head><body>"
+            "<p>Google Drive can't scan this file for viruses.</p>"
+            f"<p>{name} is too large for Google to scan for viruses. Would you still like to download this file?</p>"
+            f"<form id=\"download-form\" action=\"/download\" method=\"get\">"
+            f"<input type=\"hidden\" name=\"id\" value=\"{file_id}\">"
+            "<input type=\"hidden\" name=\"export\" value=\"download\">"
+            "<input type=\"submit\" value=\"Download anyway\"></form></body></html>"
+        )
+
+    def _legacy_interstitial(self, file_id):
+        token = self.files[file_id]["token"]
+        return (
+            "<!DOCTYPE html><html><head><title>Google Drive - Virus scan warning</title></head><body>"
+            "<p>Google Drive can't scan this file for viruses.</p>"
+            f"<a id=\"uc-download-link\" href=\"/uc?export=download&amp;confirm={token}&amp;id={file_id}\">"
+            "Download anyway</a></body></html>"
+        )
+
+    def _quota_page(self):
+        return (
+            "<!DOCTYPE html><html><head><title>Google Drive - Quota exceeded</title></head><body>"
+            "<p>Sorry, you can't view or download this file at this time.</p>"
+            "<p>Too many users have viewed or downloaded this file recently. Please try accessing the file "
+            "again later. If the file you are trying to access is particularly large or is shared with many "
+            "people, it may take up to 24 hours to be able to view or download the file. "
+            "download quota exceeded</p></body></html>"
+        )
+
+    def handle(self, handler, path, query):
+        if path not in ("/download", "/uc"):
+            return self.send_not_found(handler)
+        file_id = query.get("id")
+        meta = self.files.get(file_id)
+        if not meta:
+            return self.send_html(handler, "<html><body>Not Found</body></html>", status=404)
+
+        mode = meta["mode"]
+        confirm = query.get("confirm")
+        if mode == "quota":
+            return self.send_html(handler, self._quota_page(), status=403)
+        if mode == "direct":
+            return self.send_payload(handler, meta["size"], meta["name"])
+        if mode == "confirm_t":
+            if confirm:
+                return self.send_payload(handler, meta["size"], meta["name"])
+            return self.send_html(handler, self._interstitial(file_id))
+        # legacy
+        if confirm == meta["token"]:
+            return self.send_payload(handler, meta["size"], meta["name"])
+        if path == "/uc":
+            return self.send_html(handler, self._legacy_interstitial(file_id))
+        return self.send_html(handler, self._interstitial(file_id))
+
+
+# ============================================================================
+# MEGA
+# ============================================================================
+
+def _mega_b64encode(data):
+    import base64
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+class FakeMega(FakeServer):
+    """
+    Serves the Mega API's `g` command on POST /cs and the encrypted file
+    bodies on /dl/{handle}, so point MegaDownloader(api_url=...) at `url`
+    and use the links add_file() returns. Needs pycryptodome. Files in
+    `quota_exceeded` answer 509 like an exhausted transfer quota; with
+    `corrupt` set, bodies are encrypted with the wrong key.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        from Crypto.Cipher import AES
+        self._aes = AES
+        self.files = {}
+        self.quota_exceeded = set()
+        self.corrupt = False
+
+    def add_file(self, name, size, handle=None):
+        """Add a file of `size` pattern bytes. Returns its public link."""
+        AES = self._aes
+        handle = handle or random_id(8)
+        key, nonce = random.randbytes(16), random.randbytes(8)
+
+        # Mega's chunked CBC-MAC over the plaintext: 128K, 256K ... 1M, then 1M chunks
+        file_mac = AES.new(key, AES.MODE_CBC, iv=bytes(16))
+        mac = bytes(16)
+        pos, chunk_size = 0, 0x20000
+        while pos < size:
+            length = min(chunk_size, size - pos)
+            data = b"".join(_PATTERN[(pos + n) % 256:(pos + n) % 256 + min(CHUNK_SIZE, length - n)]
+                            for n in range(0, length, CHUNK_SIZE))
+            data += b"\0" * (-len(data) % 16)
+            chunk_mac = AES.new(key, AES.MODE_CBC, iv=nonce * 2).encrypt(data)[-16:]
+            mac = file_mac.encrypt(chunk_mac)
+            pos += length
+            chunk_size = min(chunk_size + 0x20000, 0x100000)
+        meta_mac = bytes(a ^ b for a, b in zip(mac[0:4], mac[4:8])) + bytes(a ^ b for a, b in zip(mac[8:12], mac[12:16]))
+
+        link_key = bytes(a ^ b for a, b in zip(key, nonce + meta_mac)) + nonce + meta_mac
+        attributes = b"MEGA" + json.dumps({"n": name}).encode()
+        attributes += b"\0" * (-len(attributes) % 16)
+        self.files[handle] = {
+            "name": name,
+            "size": size,
+            "key": key,
+            "nonce": nonce,
+            "at": _mega_b64encode(AES.new(key, AES.MODE_CBC, iv=bytes(16)).encrypt(attributes)),
+        }
+        return f"https://mega.nz/file/{handle}#{_mega_b64encode(link_key)}"
+
+    def _cipher(self, meta):
+        AES = self._aes
+        key = bytes(16) if self.corrupt else meta["key"]
+
+        def at(start):
+            ctr = AES.new(key, AES.MODE_CTR, nonce=meta["nonce"], initial_value=start // 16)
+            ctr.encrypt(bytes(start % 16))
+            return ctr
+        return at
+
+    def handle(self, handler, path, query):
+        if handler.command == "POST" and path == "/cs":
+            commands = self.read_json(handler) or []
+            results = []
+            for command in commands:
+                meta = self.files.get(command.get("p"))
+                if command.get("a") != "g" or meta is None:
+                    results.append(-9)  # ENOENT
+                    continue
+                results.append({"s": meta["size"], "at": meta["at"], "msd": 1,
+                                "g": f"{self.url}/dl/{command['p']}"})
+            return self.send_json(handler, results)
+
+        match = re.match(r"^/dl/([^/]+)$", path)
+        if match and match.group(1) in self.files:
+            if match.group(1) in self.quota_exceeded:
+                return self.send_json(handler, {"error": "bandwidth limit exceeded"}, status=509)
+            meta = self.files[match.group(1)]
+            return self.send_payload(handler, meta["size"], cipher=self._cipher(meta))
+
+        self.send_not_found(handler)
+
+
+# ============================================================================
+# DISCORD REST
+# ============================================================================
+
+class FakeDiscord(FakeServer):
+    """
+    Serves GET /api/v9/channels/{id}/messages with limit/before/after
+    paging (newest first, like Discord) and per-channel rate-limit
+    buckets that answer 429 once `rate_limit` requests are made within
+    `rate_window` seconds.
+    """
+
+    def __init__(self, rate_limit=5, rate_window=5.0, **kwargs):
+        super().__init__(**kwargs)
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.channels = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._next_id = 1300000000000000000
+
+    def add_message(self, channel_id, content, timestamp=None):
+        with self._lock:
+            self._next_id += 1
+            message_id = str(self._next_id)
+        message = {
+            "id": message_id,
+            "type": 0,
+            "channel_id": str(channel_id),
+            "content": content,
+            "author": {"id": "600000000000000001", "username": "uploader"},
+            "timestamp": (timestamp or datetime.now(timezone.utc)).isoformat(),
+        }
+        self.channels.setdefault(str(channel_id), []).append(message)
+        return message
+
+    def _rate_limit_headers(self, channel_id):
+        """Returns (headers, retry_after); retry_after is None if the request may proceed."""
+        now = time.monotonic()
+        with self._lock:
+            reset_at, remaining = self._buckets.get(channel_id, (now + self.rate_window, self.rate_limit))
+            if now >= reset_at:
+                reset_at, remaining = now + self.rate_window, self.rate_limit
+            limited = remaining <= 0
+            if not limited:
+                remaining -= 1
+            self._buckets[channel_id] = (reset_at, remaining)
+        reset_after = max(0.0, reset_at - now)
+        headers = {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset": f"{time.time() + reset_after:.3f}",
+            "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+            "X-RateLimit-Bucket": f"fake-{channel_id}",
+        }
+        return headers, (reset_after if limited else None)
+
+    def handle(self, handler, path, query):
+        match = re.match(r"^/api/v\d+/channels/(\d+)/messages$", path)
+        if not match:
+            return self.send_json(handler, {"message": "404: Not Found", "code": 0}, status=404)
+        channel_id = match.group(1)
+
+        headers, retry_after = self._rate_limit_headers(channel_id)
+        if retry_after is not None:
+            headers["Retry-After"] = str(max(1, int(retry_after + 0.999)))
+            return self.send_json(handler, {"message": "You are being rate limited.",
+                                            "retry_after": round(retry_after, 3), "global": False},
+                                  status=429, headers=headers)
+
+        if channel_id not in self.channels:
+            return self.send_json(handler, {"message": "Unknown Channel", "code": 10003},
+                                  status=404, headers=headers)
+
+        limit = max(1, min(100, int(query.get("limit", 50))))
+        messages = self.channels[channel_id]
+        if "before" in query:
+            before = int(query["before"])
+            page = [m for m in messages if int(m["id"]) < before][-limit:]
+        elif "after" in query:
+            after = int(query["after"])
+            page = [m for m in messages if int(m["id"]) > after][:limit]
+        else:
+            page = messages[-limit:]
+        self.send_json(handler, list(reversed(page)), headers=headers)
+
+
+# ============================================================================
+# STANDALONE
+# ============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run fake Pixeldrain / Google Drive / Discord servers.")
+    parser.add_argument("--files", type=int, default=10, help="Files to create on each platform")
+    parser.add_argument("--size", default="8M", help=f"Size of each file: {SIZE_FORMAT}")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each response")
+    parser.add_argument("--bandwidth", default="0", help="Per-response bytes/sec cap (e.g. 10M, same format as "
+                                                           "--size), 0 = unlimited")
+    parser.add_argument("--pixeldrain-port", type=int, default=0)
+    parser.add_argument("--gdrive-port", type=int, default=0)
+    parser.add_argument("--discord-port", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    size = parse_size(args.size)
+    common = {"latency": args.latency, "bandwidth": parse_size(args.bandwidth)}
+    pixeldrain = FakePixeldrain(port=args.pixeldrain_port, **common).start()
+    gdrive = FakeGoogleDrive(port=args.gdrive_port, **common).start()
+    discord = FakeDiscord(port=args.discord_port, **common).start()
+
+    now = datetime.now(timezone.utc)
+    pd_ids = [pixeldrain.add_file(f"Series - {i:02d} (1080p).mkv", size, uploaded=now - timedelta(days=i))
+              for i in range(1, args.files + 1)]
+    list_id = pixeldrain.add_list(pd_ids)
+    gd_ids = [gdrive.add_file(f"Series - {i:02d} (1080p).mkv", size, mode=gdrive.MODES[i % 3])
+              for i in range(1, args.files + 1)]
+    for i in range(1, args.files + 1):
+        discord.add_message("900000000000000000",
+                            f"Series - {i:02d} (1080p)\n[1080p](<{pixeldrain.url}/u/{pd_ids[i - 1]}>)")
+
+    print(f"Pixeldrain: {pixeldrain.url}  (list: {pixeldrain.url}/l/{list_id})")
+    print(f"Drive:      {gdrive.url}  (first file: {gdrive.url}/uc?id={gd_ids[0]})")
+    print(f"Discord:    {discord.url}/api/v9/channels/900000000000000000/messages")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in (pixeldrain, gdrive, discord):
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import json
+
+import pytest
+
+import downloader as dl
+
+
+def entry(name, channel_id="100", last_episode=0, regex=r"Show (\d+)"):
+    return {"name": name, "channel_id": channel_id, "regex": regex, "path": "/tmp/autodl-test",
+            "platforms": ["pixeldrain"], "last_episode": last_episode}
+
+
+def retry_item(episode, attempts=0, entry_name="Show", platform="pixeldrain"):
+    return {"section": "anime", "entry_name": entry_name, "episode": episode, "platform": platform,
+            "link": f"https://pixeldrain.com/u/{entry_name}{episode}", "attempts": attempts}
+
+
+@pytest.fixture
+def settings(tmp_path):
+    path = tmp_path / "settings.json"
+    path.write_text(json.dumps({"anime": {"entries": [entry("Show", last_episode=3)]}, "retry_queue": []}))
+    dl.load_config(str(path))
+    return path
+
+
+def edit(path, change):
+    data = json.loads(path.read_text())
+    change(data)
+    path.write_text(json.dumps(data))
+
+
+def test_reload_keeps_running_config_after_invalid_json(settings):
+    running = dl.find_entry("anime", "Show")
+    settings.write_text('{"anime": {"entries": [')
+    
+    assert dl.reload_config() is False
+    assert dl.find_entry("anime", "Show") is running
+    assert dl.is_monitored("100")
+
+
+def test_save_does_not_overwrite_invalid_edit(settings):
+    settings.write_text("{not json")
+    dl.find_entry("anime", "Show")["last_episode"] = 4
+    dl.save_config()
+    assert settings.read_text() == "{not json"
+
+
+def test_reload_applies_fixed_file_after_invalid_json(settings):
+    good = json.loads(settings.read_text())
+    settings.write_text("{broken")
+    assert dl.reload_config() is False
+    
+    good["anime"]["entries"].append(entry("Other", channel_id="200"))
+    settings.write_text(json.dumps(good))
+    assert dl.reload_config() is True
+    assert dl.find_entry("anime", "Other") is not None
+    assert dl.is_monitored("200")
+
+
+def test_reload_rejects_invalid_regex(settings):
+    edit(settings, lambda data: data["anime"]["entries"][0].update(regex="Show ("))
+    assert dl.reload_config() is False
+    assert dl.find_entry("anime", "Show")["regex"] == r"Show (\d+)"
+
+
+def test_reload_keeps_runtime_last_episode_unless_file_changed_it(settings):
+    running = dl.find_entry("anime", "Show")
+    running["last_episode"] = 5
+    edit(settings, lambda data: data["anime"]["entries"].append(entry("Other", channel_id="200")))
+    assert dl.reload_config() is True
+    assert running["last_episode"] == 5
+    assert dl.find_entry("anime", "Show") is running
+    
+    edit(settings, lambda data: data["anime"]["entries"][0].update(last_episode=1))
+    assert dl.reload_config() is True
+    assert running["last_episode"] == 1
+
+
+def test_merge_keeps_additions_from_both_sides():
+    base = [retry_item(1)]
+    mine = [base[0], retry_item(2)]
+    theirs = [retry_item(1), retry_item(3)]
+    merged = dl._merge_retry_queue(base, mine, theirs)
+    assert sorted(item["episode"] for item in merged) == [1, 2, 3]
+    assert mine[1] in merged
+
+
+def test_merge_drops_items_either_side_removed():
+    base = [retry_item(1), retry_item(2)]
+    mine = [base[1]]                # we finished EP1
+    theirs = [retry_item(1)]        # another process finished EP2
+    assert dl._merge_retry_queue(base, mine, theirs) == []
+
+
+def test_merge_conflict_prefers_our_change():
+    base = [retry_item(1, attempts=1)]
+    mine = [retry_item(1, attempts=2)]
+    theirs = [retry_item(1, attempts=5)]
+    merged = dl._merge_retry_queue(base, mine, theirs)
+    assert len(merged) == 1
+    assert merged[0] is mine[0]
+
+
+def test_merge_conflict_takes_their_change_when_ours_is_unchanged():
+    base = [retry_item(1, attempts=1)]
+    mine = [retry_item(1, attempts=1)]
+    theirs = [retry_item(1, attempts=4)]
+    assert dl._merge_retry_queue(base, mine, theirs) == [theirs[0]]
+
+
+def test_merge_their_removal_wins_over_our_change():
+    base = [retry_item(1, attempts=1)]
+    mine = [retry_item(1, attempts=2)]
+    assert dl._merge_retry_queue(base, mine, []) == []
+
+
+def test_merge_keeps_same_episode_of_different_sections_apart():
+    ours = retry_item(1)
+    theirs = dict(retry_item(1), section="drama")
+    merged = dl._merge_retry_queue([], [ours], [theirs])
+    assert merged == [theirs, ours]
+
+
+def test_reload_merges_retry_queue_edits(settings):
+    queue = dl.config["retry_queue"]
+    queue.append(retry_item(7))
+    edit(settings, lambda data: data["retry_queue"].append(retry_item(8)))
+    assert dl.reload_config() is True
+    assert dl.config["retry_queue"] is queue
+    assert sorted(item["episode"] for item in queue) == [7, 8]
@@ -0,0 +1,179 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+
+import pytest
+
+import downloader as dl
+
+
+class TricklingDownloader:
+    """Reports a byte every few milliseconds until `done` is set, honouring pause and cancel."""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.paused = threading.Event()
+        self.resumed = threading.Event()
+    
+    def download(self, link, path, entry_name, episode, **kwargs):
+        transfer = dl.current_transfer()
+        while not self.done.wait(0.01):
+            try:
+                transfer.update(1)
+            except dl.TransferPaused:
+                self.paused.set()
+                try:
+                    transfer.wait_resumed()
+                except dl.DownloadCancelled:
+                    return dl.DownloadResult(success=False, reason="cancelled")
+                self.resumed.set()
+            except dl.DownloadCancelled:
+                return dl.DownloadResult(success=False, reason="cancelled")
+        return dl.DownloadResult(success=True, filename=f"{entry_name} - {episode:02d}.mkv")
+
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+    entry = {"name": "Show", "channel_id": "100", "regex": r"Show (\d+)", "path": str(tmp_path),
+             "platforms": ["pixeldrain"], "last_episode": 0, "post_download": []}
+    item = {"section": "anime", "entry_name": "Show", "episode": 9, "platform": "pixeldrain",
+            "link": "https://pixeldrain.com/u/abc", "path": str(tmp_path), "channel_id": "100",
+            "attempts": 1, "next_retry": (datetime.now() + timedelta(hours=1)).isoformat(), "reason": "error"}
+    path = tmp_path / "settings.json"
+    path.write_text(json.dumps({"anime": {"entries": [entry]}, "retry_queue": [item]}))
+    dl.load_config(str(path))
+    monkeypatch.setattr(dl, "STAGING_DIR", "")
+    monkeypatch.setattr(dl, "HEDGE_MIN_SPEED_KBPS", 0)
+    monkeypatch.setattr(dl.staging_mover, "submit", lambda *args, **kwargs: None)
+    return path
+
+
+@pytest.fixture
+def control():
+    server = dl.ControlServer("127.0.0.1:0").start()
+    host, port = server._server.server_address
+    
+    def request(method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(f"http://{host}:{port}{path}", data=data, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=10) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+    
+    yield request
+    server.stop()
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + 10
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def start_download(monkeypatch, episode):
+    downloader = TricklingDownloader()
+    monkeypatch.setitem(dl._downloaders, "pixeldrain", downloader)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(
+        dl.download_episode(dl.find_entry("anime", "Show"), episode, {"pixeldrain": "https://pixeldrain.com/u/x"},
+                            "100")))
+    thread.start()
+    wait_until(lambda: [job for job in dl.jobs.list() if job.episode == episode and job.transfers])
+    job = next(job for job in dl.jobs.list() if job.episode == episode)
+    return downloader, job, thread, results
+
+
+def test_pause_resume_and_finish_a_job(settings, control, monkeypatch):
+    downloader, job, thread, results = start_download(monkeypatch, 1)
+    
+    status, listing = control("GET", "/jobs")
+    assert status == 200
+    assert [(j["id"], j["state"]) for j in listing["jobs"]] == [(job.id, "running")]
+    assert [item["episode"] for item in listing["retry_queue"]] == [9]
+    
+    status, snapshot = control("POST", f"/jobs/{job.id}/pause")
+    assert (status, snapshot["state"]) == (200, "paused")
+    assert downloader.paused.wait(10)
+    
+    status, snapshot = control("POST", f"/jobs/{job.id}/resume")
+    assert (status, snapshot["state"]) == (200, "running")
+    assert downloader.resumed.wait(10)
+    
+    downloader.done.set()
+    thread.join(10)
+    assert results == [True]
+    assert dl.find_entry("anime", "Show")["last_episode"] == 1
+    assert control("GET", f"/jobs/{job.id}")[0] == 404
+
+
+def test_cancel_a_job(settings, control, monkeypatch):
+    downloader, job, thread, results = start_download(monkeypatch, 2)
+    
+    status, snapshot = control("POST", f"/jobs/{job.id}/cancel")
+    assert (status, snapshot["state"]) == (200, "cancelling")
+    thread.join(10)
+    assert results == [False]
+    assert dl.find_entry("anime", "Show")["last_episode"] == 0
+    assert dl.config["retry_queue"][0]["episode"] == 9  # nothing added for a cancelled download
+
+
+def test_bad_requests(settings, control, monkeypatch):
+    downloader, job, thread, results = start_download(monkeypatch, 3)
+    try:
+        assert control("POST", f"/jobs/{job.id}/explode")[0] == 400
+        assert control("POST", f"/jobs/{job.id}/priority", {"priority": "high"})[0] == 400
+        assert control("POST", "/jobs/999999/pause")[0] == 404
+        assert control("GET", "/nowhere")[0] == 404
+    finally:
+        downloader.done.set()
+        thread.join(10)
+
+
+def test_queued_jobs_start_by_priority(monkeypatch):
+    monkeypatch.setattr(dl, "MAX_ACTIVE_DOWNLOADS", 1)
+    board = dl.JobBoard()
+    running = dl.Job("Show", 1)
+    board.acquire(running)
+    started = []
+    
+    def acquire(job):
+        board.acquire(job)
+        started.append(job.episode)
+        board.release(job)
+    
+    threads = []
+    for job in (dl.Job("Show", 2), high := dl.Job("Show", 3)):  # 2 queues first
+        threads.append(threading.Thread(target=acquire, args=(job,)))
+        threads[-1].start()
+        wait_until(lambda: len(board.list()) == len(threads) + 1)
+    high.priority = 5
+    board.changed()
+    board.release(running)
+    for thread in threads:
+        thread.join(10)
+    assert started == [3, 2]
+
+
+def test_retry_item_actions(settings, control):
+    status, listing = control("GET", "/retry")
+    item_id = listing["retry_queue"][0]["id"]
+    
+    status, snapshot = control("POST", f"/retry/{item_id}/pause")
+    assert (status, snapshot["paused"]) == (200, True)
+    status, snapshot = control("POST", f"/retry/{item_id}/priority", {"priority": 3})
+    assert (status, snapshot["priority"]) == (200, 3)
+    status, snapshot = control("POST", f"/retry/{item_id}/retry")
+    assert (status, snapshot["paused"]) == (200, False)
+    assert datetime.fromisoformat(snapshot["next_retry"]) <= datetime.now()
+    saved = json.loads(settings.read_text())["retry_queue"]
+    assert (saved[0]["priority"], "paused" in saved[0]) == (3, False)
+    
+    assert control("POST", f"/retry/{item_id}/cancel")[0] == 200
+    assert json.loads(settings.read_text())["retry_queue"] == []
+    assert control("POST", f"/retry/{item_id}/pause")[0] == 404
@@ -0,0 +1,87 @@
+import os
+from collections import namedtuple
+
+import pytest
+
+import downloader as dl
+from fake_servers import FakePixeldrain
+
+
+Usage = namedtuple("Usage", "total used free")
+
+
+@pytest.fixture
+def free(monkeypatch):
+    """Free bytes reported per directory (default 1000), instead of the real disk usage."""
+    space = {}
+    monkeypatch.setattr(dl.shutil, "disk_usage", lambda path: Usage(0, 0, space.get(str(path), 1000)))
+    monkeypatch.setattr(dl, "MIN_FREE_SPACE_MB", 0)
+    return space
+
+
+def test_reservation_larger_than_free_space_is_refused(free, tmp_path):
+    reservations = dl.DiskReservations()
+    assert reservations.reserve(str(tmp_path), 1001) is None
+    with reservations.reserve(str(tmp_path), 1000) as reservation:
+        assert reservation.remaining() == 1000
+
+
+def test_running_downloads_hold_their_space_until_released(free, tmp_path):
+    reservations = dl.DiskReservations()
+    first = reservations.reserve(str(tmp_path), 600)
+    assert reservations.reserve(str(tmp_path), 600) is None
+    with first:
+        pass
+    assert reservations.reserve(str(tmp_path), 600) is not None
+
+
+def test_reservation_shrinks_as_the_download_writes(free, tmp_path):
+    reservations = dl.DiskReservations()
+    transfer = dl.Transfer()
+    with dl.tracking(transfer):
+        first = reservations.reserve(str(tmp_path), 600)
+    # The bytes written are in the disk's free space already
+    transfer.update(300)
+    free[str(tmp_path)] = 700
+    assert first.remaining() == 300
+    assert reservations.reserve(str(tmp_path), 400) is not None
+    assert reservations.reserve(str(tmp_path), 1) is None
+
+
+def test_min_free_space_is_kept(free, tmp_path, monkeypatch):
+    monkeypatch.setattr(dl, "MIN_FREE_SPACE_MB", 1)
+    free[str(tmp_path)] = 1024 * 1024 + 100
+    reservations = dl.DiskReservations()
+    assert reservations.reserve(str(tmp_path), 101) is None
+    assert reservations.reserve(str(tmp_path), None) is not None  # unknown size: only the minimum
+
+
+def test_download_goes_to_the_first_path_with_room(free, tmp_path, monkeypatch):
+    full, spare = tmp_path / "full", tmp_path / "spare"
+    full.mkdir()
+    spare.mkdir()
+    free[str(full)] = 10
+    free[str(spare)] = 10 ** 6
+    monkeypatch.setattr(dl, "STAGING_DIR", "")
+    with FakePixeldrain() as server:
+        file_id = server.add_file("Show - 01.mkv", 5000)
+        monkeypatch.setitem(dl._downloaders, "pixeldrain", dl.PixeldrainDownloader(base_url=server.url))
+        args = {"link": f"https://pixeldrain.com/u/{file_id}", "path": str(full), "entry_name": "Show", "episode": 1}
+        result = dl.download_to_paths("pixeldrain", args, [str(full), str(spare)], "Show EP1")
+    
+    assert result.success
+    assert result.path == str(spare)
+    assert os.listdir(full) == []
+    assert os.path.getsize(spare / "Show - 01.mkv") == 5000
+
+
+def test_download_reports_insufficient_space_when_nothing_fits(free, tmp_path, monkeypatch):
+    free[str(tmp_path)] = 10
+    monkeypatch.setattr(dl, "STAGING_DIR", "")
+    with FakePixeldrain() as server:
+        file_id = server.add_file("Show - 01.mkv", 5000)
+        result = dl.PixeldrainDownloader(base_url=server.url).download(
+            f"https://pixeldrain.com/u/{file_id}", str(tmp_path), "Show", 1)
+    
+    assert (result.success, result.reason) == (False, "insufficient_space")
+    assert os.listdir(tmp_path) == []
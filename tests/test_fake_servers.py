@@ -0,0 +1,26 @@
+import pytest
+
+from fake_servers import parse_size
+
+
+@pytest.mark.parametrize("text, size", [
+    ("512", 512),
+    ("512B", 512),
+    ("64K", 64 << 10),
+    ("64kb", 64 << 10),
+    ("64KiB", 64 << 10),
+    ("16M", 16 << 20),
+    ("16MB", 16 << 20),
+    (" 16 MiB ", 16 << 20),
+    ("1.5GiB", 3 << 29),
+    ("2G", 2 << 30),
+    ("0", 0),
+])
+def test_parse_size(text, size):
+    assert parse_size(text) == size
+
+
+@pytest.mark.parametrize("text", ["", "M", "16X", "16MBB", "-1", "1e3"])
+def test_parse_size_rejects(text):
+    with pytest.raises(ValueError, match="invalid size"):
+        parse_size(text)
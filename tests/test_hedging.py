@@ -0,0 +1,101 @@
+import json
+import time
+
+import pytest
+
+import downloader as dl
+
+
+class SlowDownloader:
+    """Trickles a few bytes until its transfer is cancelled (or `limit` seconds pass)."""
+    
+    def __init__(self, limit=10):
+        self.limit = limit
+        self.calls = 0
+        self.cancelled = False
+    
+    def download(self, link, path, entry_name, episode, **kwargs):
+        self.calls += 1
+        transfer = dl.current_transfer()
+        deadline = time.monotonic() + self.limit
+        while time.monotonic() < deadline:
+            if transfer.cancelled:
+                self.cancelled = True
+                return dl.DownloadResult(success=False, reason="cancelled")
+            transfer.update(1)
+            time.sleep(0.05)
+        return dl.DownloadResult(success=True, filename=f"{entry_name} - {episode:02d}.mkv")
+
+
+class FastDownloader:
+    def __init__(self, success=True):
+        self.success = success
+        self.calls = 0
+    
+    def download(self, link, path, entry_name, episode, **kwargs):
+        self.calls += 1
+        if not self.success:
+            return dl.DownloadResult(success=False, reason="download_error")
+        dl.current_transfer().update(1 << 20)
+        return dl.DownloadResult(success=True, filename=f"{entry_name} - {episode:02d}.mkv")
+
+
+LINKS = {"pixeldrain": "https://pixeldrain.com/u/abc", "gdrive": "https://drive.google.com/file/d/abc/view"}
+
+
+@pytest.fixture
+def entry(tmp_path, monkeypatch):
+    entry = {"name": "Show", "channel_id": "100", "regex": r"Show (\d+)", "path": str(tmp_path),
+             "platforms": ["pixeldrain", "gdrive"], "last_episode": 0, "post_download": [],
+             "hedge_min_speed_kbps": 100}
+    path = tmp_path / "settings.json"
+    path.write_text(json.dumps({"anime": {"entries": [entry]}, "retry_queue": []}))
+    dl.load_config(str(path))
+    monkeypatch.setattr(dl, "STAGING_DIR", "")
+    monkeypatch.setattr(dl, "HEDGE_WARMUP_SECONDS", 0)
+    monkeypatch.setattr(dl.staging_mover, "submit", lambda *args, **kwargs: None)
+    return dl.find_entry("anime", "Show")
+
+
+def use(monkeypatch, **downloaders):
+    for platform, downloader in downloaders.items():
+        monkeypatch.setitem(dl._downloaders, platform, downloader)
+
+
+def test_slow_primary_gets_the_next_platform_started_and_the_first_success_wins(entry, monkeypatch):
+    slow, fast = SlowDownloader(), FastDownloader()
+    use(monkeypatch, pixeldrain=slow, gdrive=fast)
+    
+    assert dl.download_episode(entry, 3, LINKS, "100")
+    assert (slow.calls, fast.calls) == (1, 1)
+    assert slow.cancelled
+    assert entry["last_episode"] == 3
+    assert dl.config["retry_queue"] == []
+
+
+def test_fast_primary_is_not_hedged(entry, monkeypatch):
+    primary, secondary = FastDownloader(), FastDownloader()
+    use(monkeypatch, pixeldrain=primary, gdrive=secondary)
+    
+    assert dl.download_episode(entry, 3, LINKS, "100")
+    assert (primary.calls, secondary.calls) == (1, 0)
+
+
+def test_slow_primary_keeps_going_when_the_hedge_fails(entry, monkeypatch):
+    slow, failing = SlowDownloader(limit=1.5), FastDownloader(success=False)
+    use(monkeypatch, pixeldrain=slow, gdrive=failing)
+    
+    assert dl.download_episode(entry, 3, LINKS, "100")
+    assert (slow.calls, failing.calls) == (1, 1)
+    assert not slow.cancelled
+    assert entry["last_episode"] == 3
+
+
+def test_hedging_is_off_without_a_threshold(entry, monkeypatch):
+    del entry["hedge_min_speed_kbps"]
+    monkeypatch.setattr(dl, "HEDGE_MIN_SPEED_KBPS", 0)
+    slow, fast = SlowDownloader(limit=1.5), FastDownloader()
+    use(monkeypatch, pixeldrain=slow, gdrive=fast)
+    
+    assert dl.download_episode(entry, 3, LINKS, "100")
+    assert (slow.calls, fast.calls) == (1, 0)
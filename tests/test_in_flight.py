@@ -0,0 +1,161 @@
+import json
+import threading
+import time
+
+import pytest
+
+import downloader as dl
+
+
+def run_together(count, target, *args):
+    results = [None] * count
+    
+    def run(n):
+        results[n] = target(*args)
+    
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def wait_for_waiters(in_flight, key, count):
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        with in_flight._lock:
+            job = in_flight._jobs.get(key)
+            if job is not None and job.waiters == count:
+                return
+        time.sleep(0.01)
+    raise AssertionError(f"never saw {count} waiter(s) on {key}")
+
+
+def test_concurrent_runs_of_one_key_download_once():
+    in_flight = dl.InFlightDownloads()
+    release = threading.Event()
+    calls = []
+    result = dl.DownloadResult(success=True, filename="Show - 01.mkv")
+    
+    def download():
+        calls.append(threading.current_thread().name)
+        release.wait(10)
+        return result
+    
+    key = ("episode", "anime", "Show", 1)
+    threads, results = run_together(5, in_flight.run, key, download)
+    wait_for_waiters(in_flight, key, 4)
+    release.set()
+    for thread in threads:
+        thread.join(10)
+    
+    assert len(calls) == 1
+    assert all(r is result for r in results)
+    assert in_flight.active() == []
+
+
+def test_different_keys_run_side_by_side():
+    in_flight = dl.InFlightDownloads()
+    barrier = threading.Barrier(2, timeout=10)
+    
+    def download():
+        barrier.wait()  # only passes if both downloads run at the same time
+        return dl.DownloadResult(success=True)
+    
+    results = []
+    threads = [threading.Thread(target=lambda key=key: results.append(in_flight.run(key, download)))
+               for key in (("episode", "anime", "Show", 1), ("episode", "drama", "Show", 1))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert [r.success for r in results] == [True, True]
+
+
+def test_waiters_get_a_failure_when_the_download_raises():
+    in_flight = dl.InFlightDownloads()
+    release = threading.Event()
+    key = ("pixeldrain", "abc", "/tmp")
+    
+    def download():
+        release.wait(10)
+        raise RuntimeError("boom")
+    
+    owner_errors = []
+    
+    def own():
+        try:
+            in_flight.run(key, download)
+        except RuntimeError as e:
+            owner_errors.append(e)
+    
+    owner = threading.Thread(target=own)
+    owner.start()
+    while key not in in_flight.active():
+        time.sleep(0.01)
+    threads, results = run_together(2, in_flight.run, key, download)
+    wait_for_waiters(in_flight, key, 2)
+    release.set()
+    for thread in [owner, *threads]:
+        thread.join(10)
+    
+    assert [str(e) for e in owner_errors] == ["boom"]
+    assert [(r.success, r.reason) for r in results] == [(False, "download_error")] * 2
+    # Nothing is cached: the next run downloads again
+    assert in_flight.run(key, lambda: dl.DownloadResult(success=True)).success
+
+
+class BlockingDownloader:
+    """Pixeldrain stand-in whose downloads wait for `release`."""
+    
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = 0
+    
+    def download(self, link, path, entry_name, episode, **kwargs):
+        self.calls += 1
+        self.release.wait(10)
+        return dl.DownloadResult(success=True, filename=f"{entry_name} - {episode:02d}.mkv")
+
+
+@pytest.fixture
+def entries(tmp_path, monkeypatch):
+    def entry(name):
+        return {"name": name, "channel_id": "100", "regex": r"Show (\d+)", "path": str(tmp_path),
+                "platforms": ["pixeldrain"], "last_episode": 0, "post_download": []}
+    path = tmp_path / "settings.json"
+    path.write_text(json.dumps({"anime": {"entries": [entry("Show")]}, "drama": {"entries": [entry("Show")]},
+                                "retry_queue": []}))
+    dl.load_config(str(path))
+    monkeypatch.setattr(dl, "STAGING_DIR", "")
+    monkeypatch.setattr(dl, "HEDGE_MIN_SPEED_KBPS", 0)
+    monkeypatch.setattr(dl.staging_mover, "submit", lambda *args, **kwargs: None)
+    return dl.find_entry("anime", "Show"), dl.find_entry("drama", "Show")
+
+
+def test_concurrent_triggers_for_an_episode_download_it_once(entries, monkeypatch):
+    downloader = BlockingDownloader()
+    monkeypatch.setitem(dl._downloaders, "pixeldrain", downloader)
+    entry = entries[0]
+    links = {"pixeldrain": "https://pixeldrain.com/u/abc"}
+    
+    threads, results = run_together(3, dl.download_episode, entry, 7, links, "100")
+    wait_for_waiters(dl.in_flight, ("episode", "anime", "Show", 7), 2)
+    downloader.release.set()
+    for thread in threads:
+        thread.join(10)
+    
+    assert downloader.calls == 1
+    assert results == [True, True, True]
+    assert entry["last_episode"] == 7
+
+
+def test_same_name_in_two_sections_is_not_coalesced(entries, monkeypatch):
+    downloader = BlockingDownloader()
+    downloader.release.set()
+    monkeypatch.setitem(dl._downloaders, "pixeldrain", downloader)
+    links = {"pixeldrain": "https://pixeldrain.com/u/abc"}
+    
+    assert dl.download_episode(entries[0], 7, links, "100")
+    assert dl.download_episode(entries[1], 7, links, "100")
+    assert downloader.calls == 2
+    assert [entry["last_episode"] for entry in entries] == [7, 7]
@@ -0,0 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(code, **env):
+    return subprocess.run([sys.executable, "-c", "import downloader as dl\n" + code], cwd=ROOT, capture_output=True,
+                          text=True, timeout=60, env=dict(os.environ, **env), check=True).stdout
+
+
+def test_last_line_is_written_at_exit():
+    out = run("dl.setup_logging('INFO')\n"
+              "dl.backfill_log.warning('Backfill finished: 1 downloaded, 2 failed')\n")
+    assert "Backfill finished: 1 downloaded, 2 failed" in out
+
+
+def test_queued_lines_are_all_written_at_exit():
+    out = run("dl.setup_logging('INFO')\n"
+              "for n in range(2000):\n"
+              "    dl.queue_log.info('line %d', n)\n")
+    assert out.splitlines()[-1].endswith("line 1999")
+    assert len(out.splitlines()) == 2000
+
+
+def test_lines_logged_after_stop_are_written():
+    out = run("dl.setup_logging('INFO')\n"
+              "dl.stop_logging()\n"
+              "dl.queue_log.info('after stop')\n")
+    assert "after stop" in out
+
+
+def test_backfill_plan_is_printed_after_queued_lines():
+    out = run("dl.setup_logging('INFO')\n"
+              "for n in range(2000):\n"
+              "    dl.backfill_log.info('scanned %d', n)\n"
+              "dl.print_backfill_plan([{'section': 'anime', 'entry': 'Show', 'episode': 1, 'status': 'pending',\n"
+              "                         'links': {'pixeldrain': 'x'}, 'message_id': '1'}], 2000)\n")
+    lines = out.splitlines()
+    assert lines[2000:] == ["Backfill plan: 1 episode(s), 1 to download, 2000 message(s) scanned",
+                            "  [anime] Show: 1 episode(s) EP1-EP1, 0 done (pixeldrain 1)"]
+
+
+@pytest.mark.parametrize("fmt", ["text", "json"])
+def test_arguments_are_rendered_when_logged(fmt):
+    out = run(f"dl.setup_logging('INFO', '{fmt}')\n"
+              "job = {'episode': 1}\n"
+              "dl.queue_log.info('job %s', job)\n"
+              "job['episode'] = 2\n")
+    line = out.splitlines()[0]
+    message = json.loads(line)["msg"] if fmt == "json" else line
+    assert message.endswith("job {'episode': 1}")
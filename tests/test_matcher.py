@@ -0,0 +1,81 @@
+import random
+
+import pytest
+
+import downloader as dl
+
+
+REGEXES = [
+    r"Show - (\d+)",
+    r"Show - 2nd Season - (\d+)",
+    r"Sh(\d+)",                                 # literal too short, always checked
+    r"(?i)Quiet Story (\d+)",                   # case-insensitive, always checked
+    r"Quiet Story (\d+)",
+    r"Cat Cafe\s+EP(\d+)",
+    r"(?:Alpha|Beta) Saga (\d+)",
+    r"Gamma (?:Saga )?(\d+)",
+    r"\[Sub\] Night\.Watch E(\d{2})",
+    r"Über Koch (\d+)",
+    r"(?x) Spaced \  Out \  (\d+)",
+    r"Show - (\d+)v2",
+]
+
+TITLES = ["Show - ", "Show - 2nd Season - ", "Sh", "quiet story ", "Quiet Story ", "Cat Cafe  EP",
+          "Alpha Saga ", "Beta Saga ", "Gamma ", "Gamma Saga ", "[Sub] Night.Watch E", "Über Koch ", "Spaced Out ",
+          "Show -", "Cat Cafe EP", "Über ", "Saga "]
+
+
+def corpus(count=3000, seed=7):
+    rng = random.Random(seed)
+    messages = ["", "no titles here", "Show - 2nd Season - 12 and Show - 3", "Show - 5v2"]
+    for _ in range(count):
+        parts = []
+        for _ in range(rng.randint(1, 3)):
+            parts.append(rng.choice(TITLES) + str(rng.randint(0, 40)) + rng.choice(["", " ", "v2", "\n"]))
+        messages.append(rng.choice(["", "New: ", "**"]).join([""] + parts))
+    return messages
+
+
+@pytest.fixture
+def entries():
+    dl._processor_cache.clear()
+    made = [{"name": f"entry{n}", "channel_id": "1", "regex": regex, "last_episode": n % 3}
+            for n, regex in enumerate(REGEXES)]
+    yield made
+    dl._processor_cache.clear()
+
+
+def test_matches_same_as_per_entry_regexes(entries):
+    matcher = dl.ChannelMatcher(entries)
+    processors = [dl.MessageProcessor(entry) for entry in entries]
+    for content in corpus():
+        expected = [(entry, processor.extract_episode(content))
+                    for entry, processor in zip(entries, processors) if processor.extract_episode(content)]
+        assert matcher.match(content) == expected, content
+
+
+def test_follows_last_episode_changes(entries):
+    matcher = dl.ChannelMatcher(entries)
+    assert matcher.match("Show - 4") == [(entries[0], 4)]
+    entries[0]["last_episode"] = 4
+    assert matcher.match("Show - 4") == []
+
+
+def test_literal_prefixes_of_other_literals_are_checked(entries):
+    matcher = dl.ChannelMatcher(entries)
+    content = "Show - 2nd Season - 9"
+    assert [entry["regex"] for entry, _ in matcher.match(content)] == [r"Show - (\d+)", r"Show - 2nd Season - (\d+)"]
+
+
+@pytest.mark.parametrize("regex, literal", [
+    (r"Show - (\d+)", "Show - "),
+    (r"Cat Cafe\s+EP(\d+)", "Cat Cafe"),
+    (r"\[Sub\] Night\.Watch E(\d{2})", "[Sub] Night.Watch E"),
+    (r"(?:Alpha|Beta) Saga (\d+)", " Saga "),
+    (r"Sh(\d+)", None),
+    (r"(?i)Quiet Story (\d+)", None),
+    (r"Gamma Saga (\d+)|Delta Saga (\d+)", None),
+    (r"Show (", None),
+])
+def test_required_literal(regex, literal):
+    assert dl._required_literal(regex) == literal
@@ -0,0 +1,107 @@
+import errno
+import io
+import random
+
+import pytest
+
+import downloader as dl
+
+
+AES = dl.load_aes()
+needs_aes = pytest.mark.skipif(AES is None, reason="needs pycryptodome")
+
+KEY = bytes(range(16))
+NONCE = bytes.fromhex("0123456789abcdef")
+
+
+def reference_meta_mac(key, nonce, plain):
+    """Mega's file MAC written out block by block, as the SDKs do it."""
+    ecb = AES.new(key, AES.MODE_ECB)
+    file_mac = bytes(16)
+    pos, chunk_size = 0, 0x20000
+    while pos < len(plain):
+        chunk = plain[pos:pos + chunk_size]
+        chunk += b"\0" * (-len(chunk) % 16)
+        mac = nonce * 2
+        for i in range(0, len(chunk), 16):
+            mac = ecb.encrypt(dl._xor(mac, chunk[i:i + 16]))
+        file_mac = ecb.encrypt(dl._xor(file_mac, mac))
+        pos += chunk_size
+        chunk_size = min(chunk_size + 0x20000, 0x100000)
+    return dl._xor(file_mac[0:4], file_mac[4:8]) + dl._xor(file_mac[8:12], file_mac[12:16])
+
+
+def link_key(key, nonce, meta_mac):
+    return dl._xor(key, nonce + meta_mac) + nonce + meta_mac
+
+
+def encrypt(key, nonce, plain):
+    return AES.new(key, AES.MODE_CTR, nonce=nonce, initial_value=0).encrypt(plain)
+
+
+def feed(stream, data, rng):
+    pos = 0
+    while pos < len(data):
+        step = rng.choice([1, 15, 16, 17, 4096, 65536, 300000])
+        stream.write(data[pos:pos + step])
+        pos += step
+
+
+@needs_aes
+def test_known_vector():
+    # 300000 bytes: one full 128 KiB chunk and part of the 256 KiB one
+    plain = bytes(i % 251 for i in range(300000))
+    meta_mac = bytes.fromhex("2a663b0291e5cba7")
+    assert reference_meta_mac(KEY, NONCE, plain) == meta_mac
+    
+    out = io.BytesIO()
+    stream = dl.MegaStream(out, link_key(KEY, NONCE, meta_mac), AES)
+    stream.write(encrypt(KEY, NONCE, plain))
+    assert out.getvalue() == plain
+    assert stream.verify()
+
+
+@needs_aes
+@pytest.mark.parametrize("size", [0, 1, 16, 0x20000, 0x20000 + 1, 0x60000 - 5, 0x480000 + 0x100000 + 33])
+def test_mac_matches_reference_across_chunk_boundaries(size):
+    rng = random.Random(size)
+    plain = rng.randbytes(size)
+    out = io.BytesIO()
+    stream = dl.MegaStream(out, link_key(KEY, NONCE, reference_meta_mac(KEY, NONCE, plain)), AES)
+    feed(stream, encrypt(KEY, NONCE, plain), rng)
+    assert out.getvalue() == plain
+    assert stream.verify()
+
+
+@needs_aes
+def test_corrupted_data_fails_verify():
+    plain = bytes(200000)
+    cipher = bytearray(encrypt(KEY, NONCE, plain))
+    cipher[150000] ^= 1
+    stream = dl.MegaStream(io.BytesIO(), link_key(KEY, NONCE, reference_meta_mac(KEY, NONCE, plain)), AES)
+    stream.write(bytes(cipher))
+    assert not stream.verify()
+
+
+@needs_aes
+def test_rewind_starts_over():
+    plain = random.Random(1).randbytes(0x30000)
+    cipher = encrypt(KEY, NONCE, plain)
+    out = io.BytesIO()
+    stream = dl.MegaStream(out, link_key(KEY, NONCE, reference_meta_mac(KEY, NONCE, plain)), AES)
+    stream.write(cipher[:100000])
+    stream.seek(0)
+    stream.write(cipher)
+    assert out.getvalue() == plain
+    assert stream.verify()
+    with pytest.raises(ValueError):
+        stream.seek(10)
+
+
+def test_disk_full_before_the_file_name_is_known(monkeypatch, tmp_path):
+    def full(self, command):
+        raise OSError(errno.ENOSPC, "No space left on device")
+    monkeypatch.setattr(dl.MegaDownloader, "_api", full)
+    result = dl.MegaDownloader()._download_native("handle", bytes(32), str(tmp_path), AES)
+    assert not result.success
+    assert result.reason == "insufficient_space"
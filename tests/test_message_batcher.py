@@ -0,0 +1,47 @@
+import queue
+import time
+
+import pytest
+
+import downloader as dl
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    """Batches handed to handle_message_batch(), as (channel_id, [content, ...], monotonic time)."""
+    flushed = queue.SimpleQueue()
+    monkeypatch.setattr(dl, "handle_message_batch", lambda channel_id, messages: flushed.put(
+        (channel_id, [message["content"] for message in messages], time.monotonic())))
+    return flushed
+
+
+def message(channel_id, content):
+    return {"channel_id": channel_id, "content": content}
+
+
+def test_batch_is_flushed_when_the_window_ends(batches):
+    batcher = dl.MessageBatcher(window=0.3, max_messages=10).start()
+    started = time.monotonic()
+    batcher.add(message("100", "a"))
+    batcher.add(message("100", "b"))
+    batcher.add(message("200", "c"))
+    
+    flushed = sorted([batches.get(timeout=5), batches.get(timeout=5)])
+    assert [(channel_id, contents) for channel_id, contents, _ in flushed] == [("100", ["a", "b"]), ("200", ["c"])]
+    assert all(at - started >= 0.3 for _, _, at in flushed)
+    
+    # The next message opens a new batch
+    batcher.add(message("100", "d"))
+    assert batches.get(timeout=5)[:2] == ("100", ["d"])
+
+
+def test_full_batch_is_flushed_before_the_window_ends(batches):
+    batcher = dl.MessageBatcher(window=60, max_messages=3).start()
+    for content in "abcd":
+        batcher.add(message("100", content))
+    batcher.add(message("200", "x"))
+    
+    assert batches.get(timeout=5)[:2] == ("100", ["a", "b", "c"])
+    # The fourth message and the other channel wait for their own window
+    with pytest.raises(queue.Empty):
+        batches.get(timeout=0.3)
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+import downloader as dl
+from fake_servers import FakePixeldrain
+
+
+SIZE = 50000
+
+
+@pytest.fixture
+def server():
+    with FakePixeldrain() as server:
+        yield server
+
+
+@pytest.fixture
+def pixeldrain(server, monkeypatch):
+    monkeypatch.setattr(dl, "PIXELDRAIN_ARCHIVE_MIN_FILES", 2)
+    monkeypatch.setattr(dl, "PIXELDRAIN_ARCHIVE_MIN_SHARE", 0)
+    return dl.PixeldrainDownloader(base_url=server.url)
+
+
+def folder(server):
+    ids = [server.add_file(f"Show - {n:02d}.mkv", SIZE) for n in range(1, 5)]
+    files = [dl.FolderFile(file_id, f"Show - {n:02d}.mkv", SIZE, n, None) for n, file_id in enumerate(ids, 1)]
+    return server.add_list(ids), files
+
+
+def test_archive_then_stop_on_fail_keeps_later_episodes(server, pixeldrain, tmp_path):
+    list_id, files = folder(server)
+    # EP2 fails in the archive (size differs from the listing) and on its own (quota)
+    files[1].size = SIZE + 1
+    server.quota_exceeded.add(files[1].id)
+    
+    result = pixeldrain._download_multiple_episodes(files, str(tmp_path), 0, list_id, 4 * SIZE)
+    assert result.success
+    assert result.filename == "EP1"
+    assert result.files == [(1, "Show - 01.mkv")]
+    assert sorted(os.listdir(tmp_path)) == ["Show - 01.mkv", "Show - 03.mkv", "Show - 04.mkv"]
+    
+    # The next attempt only fetches EP2 and reports the kept episodes in order
+    files[1].size = SIZE
+    server.quota_exceeded.clear()
+    requests_before = server.requests
+    result = pixeldrain._download_multiple_episodes(files, str(tmp_path), 1, list_id, 4 * SIZE)
+    assert result.success
+    assert result.filename == "EP4"
+    assert result.files == [(2, "Show - 02.mkv"), (3, "Show - 03.mkv"), (4, "Show - 04.mkv")]
+    assert server.requests - requests_before == 1
+    assert sorted(os.listdir(tmp_path)) == [f"Show - {n:02d}.mkv" for n in range(1, 5)]
+
+
+def test_file_of_other_size_is_downloaded_again(server, pixeldrain, tmp_path):
+    list_id, files = folder(server)
+    (tmp_path / "Show - 01.mkv").write_bytes(b"partial")
+    result = pixeldrain._download_multiple_episodes(files[:1], str(tmp_path), 0, list_id, 4 * SIZE)
+    assert result.success
+    assert os.path.getsize(tmp_path / "Show - 01.mkv") == SIZE
@@ -0,0 +1,81 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import downloader as dl
+
+
+class FakeDownloader:
+    """Resolves the link to a file, then fails or succeeds as told."""
+    
+    def __init__(self, success):
+        self.success = success
+        self.calls = []
+    
+    def download(self, link, path, entry_name, episode, target=None, **folder):
+        self.calls.append(target)
+        dl.current_transfer().target = {"file_id": "abc", "filename": "Show - 05.mkv", "size": 10}
+        if self.success:
+            return dl.DownloadResult(success=True, filename="Show - 05.mkv")
+        return dl.DownloadResult(success=False, reason="download_error")
+
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+    item = {"section": "anime", "entry_name": "Show", "episode": 5, "platform": "pixeldrain",
+            "link": "https://pixeldrain.com/u/abc", "path": str(tmp_path), "channel_id": "100",
+            "attempts": 1, "next_retry": (datetime.now() - timedelta(minutes=1)).isoformat(), "reason": "error"}
+    entry = {"name": "Show", "channel_id": "100", "regex": r"Show (\d+)", "path": str(tmp_path),
+             "platforms": ["pixeldrain"], "last_episode": 3, "post_download": []}
+    path = tmp_path / "settings.json"
+    path.write_text(json.dumps({"anime": {"entries": [entry]}, "retry_queue": [item]}))
+    dl.load_config(str(path))
+    monkeypatch.setattr(dl, "STAGING_DIR", "")
+    return path
+
+
+def use(monkeypatch, downloader):
+    monkeypatch.setitem(dl._downloaders, "pixeldrain", downloader)
+    return downloader
+
+
+def test_failed_retry_saves_resolved_target_and_attempts(settings, monkeypatch):
+    use(monkeypatch, FakeDownloader(success=False))
+    dl.process_retry_queue()
+    
+    saved = json.loads(settings.read_text())["retry_queue"]
+    assert len(saved) == 1
+    assert saved[0]["target"] == {"file_id": "abc", "filename": "Show - 05.mkv", "size": 10}
+    assert saved[0]["attempts"] == 2
+    assert datetime.fromisoformat(saved[0]["next_retry"]) > datetime.now()
+
+
+def test_saved_target_is_reused_after_reload(settings, monkeypatch):
+    use(monkeypatch, FakeDownloader(success=False))
+    dl.process_retry_queue()
+    
+    dl.load_config(str(settings))
+    dl.config["retry_queue"][0]["next_retry"] = datetime.now().isoformat()
+    downloader = use(monkeypatch, FakeDownloader(success=False))
+    dl.process_retry_queue()
+    assert downloader.calls == [{"file_id": "abc", "filename": "Show - 05.mkv", "size": 10}]
+
+
+def test_successful_retry_is_removed_and_saved(settings, monkeypatch):
+    use(monkeypatch, FakeDownloader(success=True))
+    monkeypatch.setattr(dl.staging_mover, "submit", lambda *args, **kwargs: None)
+    dl.process_retry_queue()
+    
+    saved = json.loads(settings.read_text())
+    assert saved["retry_queue"] == []
+    assert saved["anime"]["entries"][0]["last_episode"] == 5
+
+
+def test_items_not_due_are_left_alone(settings, monkeypatch):
+    downloader = use(monkeypatch, FakeDownloader(success=False))
+    dl.config["retry_queue"][0]["next_retry"] = (datetime.now() + timedelta(hours=1)).isoformat()
+    before = settings.read_text()
+    dl.process_retry_queue()
+    assert downloader.calls == []
+    assert settings.read_text() == before
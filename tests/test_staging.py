@@ -0,0 +1,104 @@
+import errno
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import downloader as dl
+
+
+@pytest.fixture
+def staging(tmp_path, monkeypatch):
+    monkeypatch.setattr(dl, "STAGING_DIR", str(tmp_path / "staging"))
+    mover = dl.StagingMover(workers=1)
+    yield mover
+    mover.shutdown()
+
+
+@pytest.fixture
+def library(tmp_path):
+    path = tmp_path / "library"
+    path.mkdir()
+    return path
+
+
+def staged_result(library, filename="Show - 01.mkv", data=b"episode"):
+    job_dir = dl.StagingMover.job_dir([str(library)], "Show EP1")
+    with open(os.path.join(job_dir, filename), "wb") as f:
+        f.write(data)
+    result = dl.DownloadResult(success=True, filename=filename)
+    result.path = job_dir
+    result.staged = True
+    return result
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_staged_download_runs_run_steps_then_moves_to_the_library(staging, library, tmp_path):
+    entry = {"name": "Show", "channel_id": "100", "regex": r"Show (\d+)", "path": str(library),
+             "platforms": ["pixeldrain"], "last_episode": 0, "post_download": [{"run": "echo {dir} > {file}.dir"}]}
+    (tmp_path / "settings.json").write_text(json.dumps({"anime": {"entries": [entry]}, "retry_queue": []}))
+    dl.load_config(str(tmp_path / "settings.json"))
+    entry = dl.find_entry("anime", "Show")
+    result = staged_result(library)
+    job_dir = result.path
+    
+    assert [future.result(10) for future in staging.submit(entry, 1, "pixeldrain", result)] == [True]
+    assert (library / "Show - 01.mkv").read_bytes() == b"episode"
+    assert (library / "Show - 01.mkv.dir").read_text().strip() == job_dir  # ran before the move
+    assert not os.path.exists(job_dir)
+    assert (result.path, result.staged) == (str(library), False)
+
+
+def test_move_across_filesystems_copies_and_deletes_the_staged_file(staging, library, monkeypatch):
+    replace = os.replace
+    
+    def cross_device(source, target):
+        if str(source).startswith(dl.STAGING_DIR):
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        replace(source, target)
+    
+    monkeypatch.setattr(dl.os, "replace", cross_device)
+    data = os.urandom(3 * 1024 + 1)
+    monkeypatch.setattr(dl, "MOVE_CHUNK_SIZE", 1024)
+    result = staged_result(library, data=data)
+    
+    assert staging._move_job(result.path, [str(library)], "Show EP1") == str(library)
+    assert (library / "Show - 01.mkv").read_bytes() == data
+    assert os.listdir(library) == ["Show - 01.mkv"]
+    assert not os.path.exists(result.path)
+
+
+def test_files_stay_staged_without_a_usable_destination(staging, tmp_path):
+    result = staged_result(tmp_path / "missing")
+    
+    assert staging._move_job(result.path, [str(tmp_path / "missing")], "Show EP1") is None
+    assert sorted(os.listdir(result.path)) == [dl.STAGING_MANIFEST, "Show - 01.mkv"]
+
+
+def test_recover_moves_job_directories_of_dead_processes(staging, library):
+    orphan = staged_result(library).path
+    open(os.path.join(orphan, "Show - 02.mkv.pixeldrain.part"), "wb").close()
+    manifest = os.path.join(orphan, dl.STAGING_MANIFEST)
+    with open(manifest) as f:
+        data = json.load(f)
+    with open(manifest, "w") as f:
+        json.dump(dict(data, pid=dead_pid()), f)
+    running = staged_result(library, "Show - 03.mkv").path  # owned by this process
+    
+    assert staging.recover() == 1
+    staging.shutdown()
+    assert os.listdir(library) == ["Show - 01.mkv"]
+    assert not os.path.exists(orphan)
+    assert sorted(os.listdir(running)) == [dl.STAGING_MANIFEST, "Show - 03.mkv"]
+
+
+def test_recover_without_staging_dir(monkeypatch):
+    monkeypatch.setattr(dl, "STAGING_DIR", "")
+    assert dl.StagingMover().recover() == 0
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+import downloader as dl
+from fake_servers import FakePixeldrain
+
+
+SIZE = 200000
+STALL_AFTER = 70000
+
+
+@pytest.fixture(autouse=True)
+def watchdog(monkeypatch):
+    # Anything under 10 KB/s over one second counts as stalled
+    monkeypatch.setattr(dl, "STALL_MIN_SPEED_KBPS", 10)
+    monkeypatch.setattr(dl, "STALL_WINDOW_SECONDS", 1)
+    monkeypatch.setattr(dl, "STALL_MAX_RESTARTS", 2)
+
+
+def download(server, tmp_path):
+    file_id = server.add_file("Show - 01.mkv", SIZE)
+    transfer = dl.Transfer("Show EP1", "pixeldrain")
+    with dl.tracking(transfer):
+        result = dl.PixeldrainDownloader(base_url=server.url)._transfer_file(file_id, "Show - 01.mkv",
+                                                                             str(tmp_path), SIZE)
+    return result, transfer
+
+
+def payload(size):
+    return bytes(n % 256 for n in range(size))
+
+
+def test_stalled_transfer_resumes_where_it_stopped(tmp_path):
+    with FakePixeldrain(stall_after=STALL_AFTER, stalls=1) as server:
+        result, transfer = download(server, tmp_path)
+        assert server.requests == 2
+    
+    assert result.success
+    assert (tmp_path / "Show - 01.mkv").read_bytes() == payload(SIZE)
+    # Only the bytes after the stall were sent again
+    assert transfer.bytes == SIZE
+    assert not transfer.stalled
+
+
+def test_stalled_transfer_starts_over_without_range_support(tmp_path):
+    with FakePixeldrain(stall_after=STALL_AFTER, stalls=1, ranges=False) as server:
+        result, transfer = download(server, tmp_path)
+    
+    assert result.success
+    assert (tmp_path / "Show - 01.mkv").read_bytes() == payload(SIZE)
+    assert transfer.bytes == SIZE
+
+
+def test_transfer_gives_up_after_max_restarts(tmp_path, monkeypatch):
+    monkeypatch.setattr(dl, "STALL_MAX_RESTARTS", 1)
+    with FakePixeldrain(stall_after=STALL_AFTER, stalls=2) as server:
+        result, transfer = download(server, tmp_path)
+        assert server.requests == 2
+    
+    assert (result.success, result.reason) == (False, "stalled")
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from downloader import iter_viewer_files
+
+
+FILES = [{"id": "a1", "name": "Show - 01.mkv", "size": 10},
+         {"id": "b2", "name": "Show - 02.mkv", "size": 20}]
+
+
+def page(viewer_data):
+    return f"<html><script>window.viewer_data = {json.dumps(viewer_data)};</script></html>"
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 7, 64, 100000])
+def test_yields_api_response_files(size):
+    text = page({"type": "list", "api_response": {"id": "L", "files": FILES}})
+    assert list(iter_viewer_files(chunked(text, size))) == FILES
+
+
+@pytest.mark.parametrize("size", [1, 5, 100000])
+def test_ignores_decoy_files_keys(size):
+    decoy = [{"id": "zz", "name": "decoy.mkv", "size": 1}]
+    viewer_data = {
+        "type": "list",
+        "files": decoy,
+        "embed": {"files": decoy, "count": 12345},
+        "api_response": {"title": "files", "meta": {"files": decoy}, "count": 2, "files": FILES},
+        "after": {"files": decoy},
+    }
+    assert list(iter_viewer_files(chunked(page(viewer_data), size))) == FILES
+
+
+def test_empty_files_list():
+    assert list(iter_viewer_files([page({"api_response": {"files": []}})])) == []
+
+
+def test_missing_api_response_files():
+    with pytest.raises(ValueError, match="not found"):
+        list(iter_viewer_files([page({"type": "list", "files": FILES, "api_response": {"id": "L"}})]))
+    with pytest.raises(ValueError, match="not found"):
+        list(iter_viewer_files(["<html>no viewer data here</html>"]))
+
+
+def test_truncated_page():
+    text = page({"api_response": {"files": FILES}})
+    with pytest.raises(ValueError, match="truncated"):
+        list(iter_viewer_files([text[:text.index("b2")]]))
@@ -0,0 +1,85 @@
+import json
+import os
+import queue
+import threading
+
+import pytest
+
+import downloader as dl
+
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+    path = tmp_path / "settings.json"
+    entry = {"name": "Show", "channel_id": "100", "regex": r"Show (\d+)", "path": str(tmp_path),
+             "platforms": ["pixeldrain"], "last_episode": 0}
+    path.write_text(json.dumps({"anime": {"entries": [entry]}, "retry_queue": []}))
+    monkeypatch.setenv("SETTINGS_PATH", str(path))
+    monkeypatch.setenv("CONFIG_WATCH", "off")
+    monkeypatch.setenv("CONTROL_ADDR", "")
+    monkeypatch.setenv("RETRY_CHECK_SECONDS", "600")
+    monkeypatch.setattr(dl, "_shard", None)
+    return path
+
+
+def job(episode):
+    return {"section": "anime", "entry_name": "Show", "episode": episode, "links": {}, "channel_id": "100"}
+
+
+def test_worker_rereads_last_episode_without_config_watch(settings, monkeypatch):
+    downloaded = []
+    first_done = threading.Event()
+    
+    def download_episode(entry, episode, *args, **kwargs):
+        downloaded.append(episode)
+        first_done.set()
+    
+    monkeypatch.setattr(dl, "download_episode", download_episode)
+    jobs = queue.Queue()
+    jobs.put(job(1))
+    worker = threading.Thread(target=dl._worker_main, args=(0, 1, "channel", str(settings), jobs, os.getppid()))
+    worker.start()
+    assert first_done.wait(30)
+    
+    # Another process records EP4 while this worker waits for jobs
+    data = json.loads(settings.read_text())
+    data["anime"]["entries"][0]["last_episode"] = 4
+    settings.write_text(json.dumps(data))
+    for episode in (3, 4, 5):
+        jobs.put(job(episode))
+    jobs.put(None)
+    worker.join(timeout=30)
+    
+    assert not worker.is_alive()
+    assert downloaded == [1, 5]
+
+
+@pytest.mark.parametrize("shard_by", ["channel", "section"])
+def test_each_retry_item_belongs_to_exactly_one_worker(tmp_path, monkeypatch, shard_by):
+    sections = {}
+    items = []
+    for s in range(3):
+        entries = sections.setdefault(f"section{s}", {"entries": []})["entries"]
+        for n in range(5):
+            channel_id = str(1000 + 7 * s + n)
+            entries.append({"name": f"Show {s}-{n}", "channel_id": channel_id, "regex": r"(\d+)",
+                            "path": str(tmp_path), "platforms": ["pixeldrain"], "last_episode": 0})
+            items.append({"section": f"section{s}", "entry_name": f"Show {s}-{n}", "episode": 1,
+                          "platform": "pixeldrain", "link": "https://pixeldrain.com/u/abc", "channel_id": channel_id})
+    del items[0]["section"]  # queued before items recorded their section
+    path = tmp_path / "settings.json"
+    path.write_text(json.dumps(dict(sections, retry_queue=items)))
+    dl.load_config(str(path))
+    
+    count = 4
+    for item in items:
+        owners = []
+        for index in range(count):
+            monkeypatch.setattr(dl, "_shard", (index, count, shard_by))
+            if dl.owns_retry_item(item):
+                owners.append(index)
+        # The worker WorkerPool.submit() sends the entry's downloads to
+        assert owners == [dl.shard_for(item.get("section", "section0"), item["channel_id"], count, shard_by)]
+    
+    monkeypatch.setattr(dl, "_shard", None)
+    assert all(dl.owns_retry_item(item) for item in items)
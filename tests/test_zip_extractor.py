@@ -0,0 +1,121 @@
+import io
+import logging
+import os
+import struct
+import zipfile
+
+import pytest
+
+import downloader as dl
+
+
+log = logging.getLogger("autodl.test")
+
+MEMBERS = {
+    "Show - 01.mkv": bytes(range(256)) * 300,
+    "Show - 02.mkv": b"PK\x07\x08" + os.urandom(5000) + b"PK\x07\x08" + bytes(16),  # fake descriptor signatures
+    "empty.mkv": b"",
+    "notes.txt": b"not wanted\n" * 50,
+}
+
+
+class _Unseekable:
+    """Makes zipfile write data descriptors, as servers streaming an archive do."""
+    
+    def __init__(self):
+        self.buffer = io.BytesIO()
+    
+    def write(self, data):
+        return self.buffer.write(data)
+    
+    def flush(self):
+        pass
+
+
+def make_zip(compression, descriptors=False, zip64=False):
+    out = _Unseekable() if descriptors else io.BytesIO()
+    with zipfile.ZipFile(out, "w", compression=compression) as zf:
+        for name, data in MEMBERS.items():
+            with zf.open(name, "w", force_zip64=zip64) as member:
+                member.write(data)
+    return (out.buffer if descriptors else out).getvalue()
+
+
+def extract(tmp_path, archive, wanted=None, chunk=65536):
+    wanted = {name: len(data) for name, data in MEMBERS.items() if name != "notes.txt"} if wanted is None else wanted
+    extractor = dl.ZipExtractor(str(tmp_path), wanted, lambda filepath: filepath + ".part", log)
+    for pos in range(0, len(archive), chunk):
+        extractor.write(archive[pos:pos + chunk])
+    return extractor
+
+
+def assert_extracted(tmp_path, extractor):
+    assert extractor.complete
+    assert extractor.extracted == {"Show - 01.mkv", "Show - 02.mkv", "empty.mkv"}
+    assert sorted(os.listdir(tmp_path)) == ["Show - 01.mkv", "Show - 02.mkv", "empty.mkv"]
+    for name in extractor.extracted:
+        assert (tmp_path / name).read_bytes() == MEMBERS[name]
+
+
+@pytest.mark.parametrize("compression", [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+@pytest.mark.parametrize("descriptors", [False, True])
+@pytest.mark.parametrize("chunk", [1, 7, 4096, 1 << 20])
+def test_extracts_members(tmp_path, compression, descriptors, chunk):
+    archive = make_zip(compression, descriptors)
+    flags = struct.unpack_from("<H", archive, 6)[0]
+    assert bool(flags & 0x08) == descriptors
+    assert_extracted(tmp_path, extract(tmp_path, archive, chunk=chunk))
+
+
+@pytest.mark.parametrize("compression", [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+def test_zip64_descriptors(tmp_path, compression):
+    archive = make_zip(compression, descriptors=True, zip64=True)
+    assert_extracted(tmp_path, extract(tmp_path, archive, chunk=5))
+
+
+@pytest.mark.parametrize("zip64", [False, True])
+def test_stored_descriptors_without_signature(tmp_path, zip64):
+    archive = make_zip(zipfile.ZIP_STORED, descriptors=True, zip64=zip64)
+    # Drop the optional signature of every real descriptor (they end where a header follows)
+    for name in MEMBERS:
+        header = archive.rindex(b"PK\x03\x04", 0, archive.index(name.encode()))
+        name_length, extra_length = struct.unpack_from("<HH", archive, header + 26)
+        start = header + 30 + name_length + extra_length
+        descriptor = start + len(MEMBERS[name])
+        assert archive[descriptor:descriptor + 4] == b"PK\x07\x08"
+        archive = archive[:descriptor] + archive[descriptor + 4:]
+    assert_extracted(tmp_path, extract(tmp_path, archive, chunk=3))
+
+
+def test_crc_mismatch_is_not_kept(tmp_path):
+    archive = bytearray(make_zip(zipfile.ZIP_STORED))
+    archive[archive.index(MEMBERS["Show - 01.mkv"][:64]) + 100] ^= 0xFF
+    extractor = extract(tmp_path, bytes(archive))
+    assert extractor.complete
+    assert "Show - 01.mkv" not in extractor.extracted
+    assert not (tmp_path / "Show - 01.mkv").exists()
+    assert not (tmp_path / "Show - 01.mkv.part").exists()
+
+
+def test_size_mismatch_is_not_kept(tmp_path):
+    extractor = extract(tmp_path, make_zip(zipfile.ZIP_DEFLATED), wanted={"Show - 01.mkv": 10, "empty.mkv": None})
+    assert extractor.extracted == {"empty.mkv"}
+    assert os.listdir(tmp_path) == ["empty.mkv"]
+
+
+def test_rewind_keeps_extracted_members(tmp_path):
+    archive = make_zip(zipfile.ZIP_DEFLATED, descriptors=True)
+    extractor = dl.ZipExtractor(str(tmp_path), {"Show - 01.mkv": None, "Show - 02.mkv": None},
+                                lambda filepath: filepath + ".part", log)
+    extractor.write(archive[:archive.index(b"Show - 02.mkv") + 20])
+    assert extractor.extracted == {"Show - 01.mkv"}
+    extractor.seek(0)
+    assert not (tmp_path / "Show - 02.mkv.part").exists()
+    extractor.write(archive)
+    assert extractor.complete
+    assert extractor.extracted == {"Show - 01.mkv", "Show - 02.mkv"}
+
+
+def test_rejects_garbage(tmp_path):
+    with pytest.raises(ValueError, match="bad zip header"):
+        extract(tmp_path, b"<html>not a zip</html>")